@@ -0,0 +1,128 @@
+"""
+Load test of the local HiPS tile server against the former FileHandler.
+
+Writes a fake HiPS of random tiles, then fetches tiles with many concurrent
+clients, the way a pan in the ESASky view does, and reports requests/second.
+
+Usage: python benchmarks/bench_hips_server.py [n_requests] [concurrency]
+"""
+import asyncio
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+import tornado.web
+from tornado.ioloop import IOLoop
+
+from pyesasky.hips_server import HiPSFileHandler, start_server
+
+N_TILES = 768
+TILE_SIZE = 20 * 1024
+
+
+class ReferenceFileHandler(tornado.web.RequestHandler):
+    """The former handler reading every tile fully, kept only for comparison.
+    Its per-request print(host) is left out."""
+
+    def initialize(self, base_url):
+        self.base_url = base_url
+
+    def get(self, path):
+        file_location = os.path.abspath(os.path.join(self.base_url, path))
+        if not os.path.isfile(file_location):
+            raise tornado.web.HTTPError(status_code=404)
+        with open(file_location, "rb") as source_file:
+            self.write(source_file.read())
+
+
+def make_hips(directory):
+    tiles = []
+    tile_dir = os.path.join(directory, "Norder3", "Dir0")
+    os.makedirs(tile_dir)
+    for pixel in range(N_TILES):
+        name = f"Norder3/Dir0/Npix{pixel}.png"
+        with open(os.path.join(directory, name), "wb") as f:
+            f.write(os.urandom(TILE_SIZE))
+        tiles.append(name)
+    return tiles
+
+
+def serve(directory, connection):
+    """Runs the server in its own process, so the client does not share its GIL"""
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    app, server, port = start_server()
+    app.add_handlers(
+        r".*",
+        [
+            (r"/new/(.*)", HiPSFileHandler, dict(base_url=directory)),
+            (r"/old/(.*)", ReferenceFileHandler, dict(base_url=directory)),
+        ],
+    )
+    connection.send(port)
+    IOLoop.current().start()
+
+
+async def fetch(reader, writer, path, etag=None):
+    """GET on a keep-alive connection, returns the status and the ETag"""
+    request = f"GET {path} HTTP/1.1\r\nHost: localhost\r\n"
+    if etag:
+        request += f"If-None-Match: {etag}\r\n"
+    writer.write((request + "\r\n").encode("latin-1"))
+
+    head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+    headers = dict(line.split(": ", 1) for line in head[1:] if line)
+    length = int(headers.get("Content-Length", 0))
+    if length:
+        await reader.readexactly(length)
+    return int(head[0].split()[1]), headers.get("Etag")
+
+
+async def load(port, prefix, tiles, n_requests, concurrency, revalidate=False):
+    # Browsers keep a few connections per host open, so do the clients
+    queue = [random.choice(tiles) for _ in range(n_requests)]
+    etags = {}
+
+    async def client():
+        reader, writer = await asyncio.open_connection("localhost", port)
+        while queue:
+            tile = queue.pop()
+            status, etag = await fetch(reader, writer, prefix + tile, etags.get(tile))
+            assert status in (200, 304)
+            if revalidate and etag:
+                etags[tile] = etag
+        writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return n_requests / (time.perf_counter() - start)
+
+
+async def bench(n_requests, concurrency):
+    with tempfile.TemporaryDirectory() as directory:
+        tiles = make_hips(directory)
+        parent, child = multiprocessing.Pipe()
+        server = multiprocessing.Process(target=serve, args=(directory, child))
+        server.start()
+        port = parent.recv()
+
+        for name in ("old", "new"):
+            prefix = f"/{name}/"
+            # Cold reads tiles from disk, hot is served from memory and
+            # revalidated sends the ETag back like a browser does
+            cold = await load(port, prefix, tiles, n_requests, concurrency)
+            hot = await load(port, prefix, tiles, n_requests, concurrency)
+            revalidated = await load(port, prefix, tiles, n_requests, concurrency, True)
+            print(
+                f"{name} handler | {concurrency:>3} clients | cold {cold:>7,.0f}"
+                f" | hot {hot:>7,.0f} | revalidated {revalidated:>7,.0f} req/s"
+            )
+        server.terminate()
+
+
+if __name__ == "__main__":
+    n_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 6
+    asyncio.run(bench(n_requests, concurrency))
@@ -0,0 +1,82 @@
+"""
+Rows/second of overlay_cat_astropy against the former row-by-row loop.
+
+Usage: python benchmarks/bench_overlay_cat_astropy.py [n_rows ...]
+"""
+import sys
+import time
+
+import numpy as np
+from astropy.table import Table
+
+from pyesasky.api_interactions import ApiInteractionsMixin
+
+
+class _CaptureWidget(ApiInteractionsMixin):
+    def __init__(self):
+        super().__init__()
+        self.sent = []
+
+    def _send_ignore(self, content, buffers=None):
+        self.sent.append(content)
+
+    def _send_receive(self, content, buffers=None):
+        self.sent.append(content)
+
+
+def make_table(n_rows):
+    rng = np.random.default_rng(0)
+    table = Table()
+    table["source_id"] = np.arange(n_rows, dtype=np.int64)
+    table["ra"] = rng.uniform(0, 360, n_rows)
+    table["dec"] = rng.uniform(-90, 90, n_rows)
+    table["phot_g_mean_mag"] = rng.uniform(5, 21, n_rows).astype(np.float32)
+    table["designation"] = np.char.encode(
+        np.char.add("Gaia DR3 ", np.arange(n_rows).astype(str)), "utf-8"
+    )
+    table["source_id"].meta["ucd"] = "meta.id;meta.main"
+    table["ra"].meta["ucd"] = "pos.eq.ra;meta.main"
+    table["dec"].meta["ucd"] = "pos.eq.dec;meta.main"
+    table["phot_g_mean_mag"].meta["ucd"] = "meta.number"
+    return table
+
+
+def row_loop_reference(table):
+    """The former per-cell implementation, kept only for comparison"""
+    sources = []
+    for j in range(len(table)):
+        details = []
+        for k, col_name in enumerate(table.colnames):
+            if isinstance(table[j][k], bytes):
+                value = str(table[j][k].decode("utf-8"))
+            else:
+                value = str(table[j][k])
+            details.append(dict(name=col_name, value=value, type="STRING"))
+        sources.append(details)
+    return sources
+
+
+def bench(n_rows):
+    table = make_table(n_rows)
+    widget = _CaptureWidget()
+
+    start = time.perf_counter()
+    widget.overlay_cat_astropy("bench", "J2000", None, None, table, "", "", "")
+    columnar = time.perf_counter() - start
+
+    # The reference loop is far too slow for big tables, time a slice of it
+    ref_rows = min(n_rows, 20000)
+    start = time.perf_counter()
+    row_loop_reference(table[:ref_rows])
+    reference = time.perf_counter() - start
+
+    print(
+        f"{n_rows:>9} rows | columnar {n_rows / columnar:>12,.0f} rows/s"
+        f" | row loop {ref_rows / reference:>10,.0f} rows/s"
+    )
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000, 500000]
+    for size in sizes:
+        bench(size)
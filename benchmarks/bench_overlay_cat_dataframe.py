@@ -0,0 +1,42 @@
+"""
+Rows/second of overlay_cat_dataframe against converting the DataFrame to
+astropy and calling overlay_cat_astropy, the former way to overlay one.
+
+Usage: python benchmarks/bench_overlay_cat_dataframe.py [n_rows ...]
+"""
+import sys
+import time
+
+from astropy.table import Table
+
+from bench_overlay_cat_astropy import _CaptureWidget, make_table
+from pyesasky.descriptors import CatalogueDescriptor
+
+
+def bench(n_rows):
+    dataframe = make_table(n_rows).to_pandas()
+    descriptor = CatalogueDescriptor(
+        "bench", "#ff0000", 5, "source_id", "designation", "ra", "dec", []
+    )
+    widget = _CaptureWidget()
+
+    start = time.perf_counter()
+    widget.overlay_cat_dataframe(dataframe, descriptor)
+    direct = time.perf_counter() - start
+
+    start = time.perf_counter()
+    widget.overlay_cat_astropy(
+        "bench", "J2000", None, None, Table.from_pandas(dataframe), "", "", ""
+    )
+    astropy = time.perf_counter() - start
+
+    print(
+        f"{n_rows:>9} rows | dataframe {n_rows / direct:>12,.0f} rows/s"
+        f" | via astropy {n_rows / astropy:>12,.0f} rows/s"
+    )
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000, 500000]
+    for size in sizes:
+        bench(size)
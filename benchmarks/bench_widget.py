@@ -0,0 +1,211 @@
+"""
+Offline benchmark suite of ESASkyWidget against the simulated frontend of
+tests/fake_frontend.py: catalogue, footprint and MOC ingestion throughput and
+memory peak, request round-trip latency and import time.
+
+Results can be saved and compared with a previous run, the comparison exits
+with an error when a metric got worse by more than the tolerance. Import
+times over IMPORT_BUDGETS are errors too:
+
+Usage: python benchmarks/bench_widget.py [--sizes N ...] [--save results.json]
+                                         [--compare baseline.json] [--tolerance 0.2]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from bench_overlay_cat_astropy import make_table
+from pyesasky.descriptors import FootprintSetDescriptor
+
+# The simulated frontend is shared with the tests
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tests"))
+
+from fake_frontend import make_widget  # noqa: E402
+
+LATENCIES = (0.0, 0.005)
+N_REQUESTS = 200
+N_IMPORTS = 5
+# Seconds each import may take at most, cold worker starts pay for them. The
+# widget budget allows for IPython, about 0.5s alone on CI runners
+IMPORT_BUDGETS = {
+    "import pyesasky": 0.05,
+    "from pyesasky import ESASkyWidget": 1.0,
+}
+
+
+def make_footprints(n_rows):
+    rng = np.random.default_rng(0)
+    ra = rng.uniform(0, 360, n_rows)
+    dec = rng.uniform(-80, 80, n_rows)
+    size = rng.uniform(0.01, 0.2, n_rows)
+    stcs = [
+        f"POLYGON ICRS {a - s:.6f} {d - s:.6f} {a + s:.6f} {d - s:.6f} "
+        f"{a + s:.6f} {d + s:.6f} {a - s:.6f} {d + s:.6f}"
+        for a, d, s in zip(ra, dec, size)
+    ]
+    return pd.DataFrame(
+        dict(
+            observation_id=np.arange(n_rows),
+            stcs=stcs,
+            ra=ra,
+            dec=dec,
+            exposure=rng.uniform(10, 1e4, n_rows),
+            instrument=rng.choice(["EPIC", "OM", "RGS"], n_rows),
+        )
+    )
+
+
+def make_moc(n_cells):
+    rng = np.random.default_rng(0)
+    return {"12": np.unique(rng.integers(0, 12 << 24, n_cells))}
+
+
+def ingestions(size):
+    """(name, rows, callable taking the widget) of each ingestion benchmark"""
+    table = make_table(size)
+    footprints = make_footprints(size)
+    descriptor = FootprintSetDescriptor(
+        "bench footprints", "#ff0000", 2, "observation_id", "", "stcs", "ra", "dec", []
+    )
+    moc = make_moc(size)
+    return [
+        (
+            "catalogue",
+            lambda widget: widget.overlay_cat_astropy(
+                "bench", "J2000", None, None, table, "", "", ""
+            ),
+        ),
+        (
+            "footprints",
+            lambda widget: widget.overlay_footprints_dataframe(footprints, descriptor),
+        ),
+        ("moc", lambda widget: widget.overlay_moc(moc, max_cells=size)),
+    ]
+
+
+def bench_ingestion(sizes, results):
+    widget, _ = make_widget()
+    for size in sizes:
+        for name, ingest in ingestions(size):
+            widget.kernel_comm.stats.clear()
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                ingest(widget)
+                elapsed = time.perf_counter() - start
+
+                # Traced separately, tracemalloc slows everything down
+                tracemalloc.start()
+                ingest(widget)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+            stats = widget.stats()
+            first_run = stats.iloc[: len(stats) // 2]
+            sent = first_run["sent_bytes"].sum()
+            results[f"{name}.{size}.rows_per_s"] = size / elapsed
+            results[f"{name}.{size}.peak_bytes"] = peak
+            results[f"{name}.{size}.sent_bytes"] = int(sent)
+            print(
+                f"{name:>10} | {size:>8} rows | {size / elapsed:>12,.0f} rows/s"
+                f" | peak {peak / 2**20:>8.1f} MiB | sent {sent / 2**20:>8.1f} MiB"
+            )
+
+
+def bench_latency(results):
+    for latency in LATENCIES:
+        widget, _ = make_widget(latency)
+        durations = []
+        for _ in range(N_REQUESTS):
+            start = time.perf_counter()
+            widget.get_fov()
+            durations.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        widget.gather(*[widget.get_fov] * 50)
+        gathered = time.perf_counter() - start
+
+        # The part of a round trip spent in pyesasky rather than waiting
+        median = statistics.median(durations) - latency
+        p95 = np.percentile(durations, 95) - latency
+        key = f"latency.{latency * 1000:g}ms"
+        results[f"{key}.median_overhead_s"] = median
+        results[f"{key}.p95_overhead_s"] = p95
+        results[f"{key}.gather50_s"] = gathered
+        print(
+            f"{latency * 1000:>4g} ms frontend"
+            f" | overhead median {median * 1e6:>7.0f} us"
+            f" | p95 {p95 * 1e6:>7.0f} us | 50 gathered {gathered * 1000:>7.1f} ms"
+        )
+
+
+def bench_import(results):
+    """Returns the number of imports over their budget"""
+    over_budget = 0
+    for index, (statement, budget) in enumerate(IMPORT_BUDGETS.items()):
+        code = (
+            "import time; start = time.perf_counter(); "
+            f"{statement}; print(time.perf_counter() - start)"
+        )
+        durations = [
+            float(subprocess.check_output([sys.executable, "-c", code], text=True))
+            for _ in range(N_IMPORTS)
+        ]
+        median = statistics.median(durations)
+        results[f"import.{index}.median_s"] = median
+        verdict = "ok" if median <= budget else "OVER BUDGET"
+        over_budget += median > budget
+        print(
+            f"{statement:>34} | median {median * 1000:>7.1f} ms"
+            f" | budget {budget * 1000:>5.0f} ms | {verdict}"
+        )
+    return over_budget
+
+
+def compare(results, baseline, tolerance):
+    """Prints the metrics that got worse than baseline, returns how many"""
+    regressions = 0
+    for key, value in results.items():
+        previous = baseline.get(key)
+        if not previous:
+            continue
+        # Throughputs should grow, everything else shrink
+        ratio = previous / value if key.endswith("_per_s") else value / previous
+        if ratio > 1 + tolerance:
+            regressions += 1
+            print(
+                f"REGRESSION {key}: {previous:.4g} -> {value:.4g} ({ratio:.2f}x worse)"
+            )
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--save", help="Writes the results to this JSON file")
+    parser.add_argument("--compare", help="JSON results of a previous run")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = {}
+    bench_ingestion(args.sizes, results)
+    bench_latency(results)
+    failures = bench_import(results)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            failures += compare(results, json.load(f), args.tolerance)
+    if failures:
+        sys.exit(1)
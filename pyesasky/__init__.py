@@ -1,5 +1,8 @@
-from jupyter_server import serverapp
-from pyesasky.widgets import ESASkyWidget  # noqa
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from jupyter_server.serverapp import ServerApp
+    from pyesasky.widgets import ESASkyWidget  # noqa
 
 
 try:
@@ -15,7 +18,17 @@ except ImportError:
     __version__ = "dev"
 
 
-def _load_jupyter_server_extension(serverapp: serverapp):
+def __getattr__(name):
+    # The widget pulls in ipywidgets and IPython, which take most of the
+    # import time, so it is only imported once it is used
+    if name == "ESASkyWidget":
+        from pyesasky import widgets
+
+        return widgets.ESASkyWidget
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _load_jupyter_server_extension(serverapp: "ServerApp"):
     """
     This function is called when the extension is loaded.
     """
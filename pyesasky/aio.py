@@ -0,0 +1,95 @@
+import asyncio
+import functools
+import threading
+
+from pyesasky.api_interactions import ApiInteractionsMixin
+
+
+class AsyncApi:
+    """
+    Coroutine versions of the ESASkyWidget API methods, available as
+    widget.aio. Responses are awaited on asyncio futures resolved by the
+    comm instead of blocking the kernel, so requests can run together:
+
+    obs, fov = await asyncio.gather(widget.aio.get_obs_count(), widget.aio.get_fov())
+    """
+
+    # Methods post-processing a response or doing blocking I/O besides the
+    # comm, these run in a worker thread to keep the event loop free
+    _THREADED_METHODS = {
+        "save_session",
+        "go_to_target",
+        "get_available_public_hips",
+        "browse_hips",
+        "select_hips",
+        "add_hips",
+        "add_hips_local",
+        "restore_session_file",
+        # These read files or convert whole tables before sending them
+        "overlay_cat_csv",
+        "overlay_cat_astropy",
+        "overlay_cat_arrow",
+        "overlay_cat_dataframe",
+        # These read the view back to cull catalogues or pick the level of
+        # detail of footprints, the values are needed before going on
+        "go_to",
+        "set_fov",
+        "refresh_view",
+        "overlay_cat",
+        "overlay_footprints",
+        "overlay_footprints_csv",
+        "overlay_footprints_astropy",
+        "overlay_footprints_arrow",
+        "overlay_footprints_dataframe",
+    }
+
+    def __init__(self, widget):
+        self._widget = widget
+        self._capture = threading.local()
+
+    def captured_requests(self):
+        """Returns the list collecting requests of the current call, if any"""
+        return getattr(self._capture, "requests", None)
+
+    def __getattr__(self, name):
+        if name.startswith("_") or not callable(
+            getattr(ApiInteractionsMixin, name, None)
+        ):
+            raise AttributeError(
+                f"'{type(self).__name__}' object has no attribute '{name}'"
+            )
+
+        method = getattr(self._widget, name)
+        # Deprecated camelCase aliases run the way their new method does
+        target = getattr(getattr(ApiInteractionsMixin, name), "new_method_name", name)
+        if target in self._THREADED_METHODS:
+            run = functools.partial(self._run_threaded, method)
+        else:
+            run = functools.partial(self._run, method)
+        return functools.wraps(method)(run)
+
+    async def _run(self, method, *args, **kwargs):
+        # The method itself only builds and sends messages, every request it
+        # makes is captured as a coroutine and awaited here
+        self._capture.requests = []
+        try:
+            result = method(*args, **kwargs)
+            requests = self._capture.requests
+        except BaseException:
+            for request in self._capture.requests:
+                request.close()
+            raise
+        finally:
+            self._capture.requests = None
+
+        responses = await asyncio.gather(*requests)
+        for request, response in zip(requests, responses):
+            if result is request:
+                return response
+        return result
+
+    async def _run_threaded(self, method, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, functools.partial(method, *args, **kwargs)
+        )
@@ -5,25 +5,87 @@ from io import StringIO
 import csv
 import os.path
 import time
-import tornado.httpserver
-import tornado.web
-import pandas as pd
-import requests
-from pyesasky.models import Catalogue, FootprintSet, MetadataType, HiPS
+import numpy as np
+from pyesasky.models import (
+    Catalogue,
+    FootprintSet,
+    HiPS,
+    _metadata_type,
+    dtype_metadata_type,
+)
+from pyesasky.arrow_utils import (
+    ARROW_BATCH_SIZE,
+    arrow_metadata_type,
+    arrow_schema,
+    arrow_to_numpy,
+    iter_batches,
+)
+from pyesasky.moc import MOC, encode_moc
+from pyesasky.spatial_index import SkyIndex
+from pyesasky.buffer_utils import pack_buffers
+from pyesasky.cache_utils import get_cache
+from pyesasky.hips_archive import is_archive, open_archive
+from pyesasky.table_utils import (
+    ColumnPlan,
+    column_to_str,
+    column_ucd,
+    iter_chunks,
+    row_ids,
+    series_to_numpy,
+    selected_metadata,
+)
+import pyesasky.constants as const
 from pyesasky.legacy.legacy_api_interactions import LApiInteractionsMixin
 
 
+def _dump_json(value, path):
+    with open(path, "w") as f:
+        json.dump(value, f)
+
+
+def _load_json(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _contains(sorted_ids, ids):
+    """Whether each of ids is in the sorted array sorted_ids"""
+    positions = np.searchsorted(sorted_ids, ids)
+    found = positions < len(sorted_ids)
+    found[found] = sorted_ids[positions[found]] == ids[found]
+    return found
+
+
+def __getattr__(name):
+    # FileHandler, the former handler of local HiPS, is imported on first
+    # access so tornado is only needed once a local HiPS is served
+    if name == "FileHandler":
+        from pyesasky.hips_server import HiPSFileHandler
+
+        return HiPSFileHandler
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 class ApiInteractionsMixin(LApiInteractionsMixin):
     def __init__(self):
         super().__init__()
         self.message_timeout = 10
+        # Footprint overlays sent with level of detail, by name
+        self._lod_overlays = {}
+        # Catalogues kept here and sent view by view, by name
+        self._culled_overlays = {}
+        # Ids of the objects the frontend holds, by updatable overlay name: a
+        # sorted array followed by the id chunks appended since, see _held_ids
+        self._overlay_ids = {}
+        # Id following the highest one sent, by overlay name
+        self._next_ids = {}
 
     @abstractmethod
-    def _send_ignore(self, content):
+    def _send_ignore(self, content, buffers=None):
         pass
 
     @abstractmethod
-    def _send_receive(self, content):
+    def _send_receive(self, content, buffers=None):
         pass
 
     def show_coo_grid(self, show=True):
@@ -141,16 +203,21 @@ class ApiInteractionsMixin(LApiInteractionsMixin):
         content = dict(event="closeAllResultPanelTabs")
         return self._send_ignore(content)
 
-    def get_available_public_hips(self, wavelength=""):
+    def get_available_public_hips(self, wavelength="", refresh=False):
         """Returns available HiPS in ESASky
         No argument for all available HiPS.
-        Specify wavelength for those available in that specific wavelength"""
-
-        response = requests.get(
-            "http://sky.esa.int/esasky-tap/hips-sources", timeout=self.message_timeout
+        Specify wavelength for those available in that specific wavelength.
+        The list is cached on disk, refresh=True revalidates it right away"""
+
+        hips_map = get_cache().get_parsed(
+            "http://sky.esa.int/esasky-tap/hips-sources",
+            self._parse_hips_json,
+            timeout=self.message_timeout,
+            dump=_dump_json,
+            load=_load_json,
+            name="hips_map",
+            refresh=refresh,
         )
-        response.raise_for_status()
-        hips_map = self._parse_hips_json(response.text)
         if len(wavelength) > 0:
             if wavelength.upper() in hips_map.keys():
                 return hips_map[wavelength.upper()]
@@ -193,6 +260,7 @@ class ApiInteractionsMixin(LApiInteractionsMixin):
 
         content = dict(event="goToRaDec", content=dict(ra=ra, dec=dec))
         self._send_ignore(content)
+        self._refresh_culled_overlays()
 
     def go_to_target(self, target_name):
         """Moves to targetName resolved by SIMBAD"""
@@ -201,12 +269,15 @@ class ApiInteractionsMixin(LApiInteractionsMixin):
         self._send_ignore(content)
         # Add small sleeper to wait for simbad to react
         time.sleep(1)
+        self._refresh_culled_overlays()
 
     def set_fov(self, fov_deg):
         """Sets the views Field of View in degrees"""
 
         content = dict(event="setFov", content=dict(fov=fov_deg))
         self._send_ignore(content)
+        self._refine_lod_overlays(fov_deg)
+        self._refresh_culled_overlays()
 
     def set_hips_color(self, color_palette):
         """Sets the colorpalette of the currently active sky to spcified value"""
@@ -264,34 +335,368 @@ class ApiInteractionsMixin(LApiInteractionsMixin):
 
         self._send_receive(content)
 
-    def overlay_cat(self, catalogue, show_data=False):
-        """Overlays a catalogue created by pyesasky.catalogue in the sky"""
+    def overlay_cat(
+        self,
+        catalogue,
+        show_data=False,
+        cull=False,
+        max_sources=None,
+        priority=None,
+        updatable=False,
+    ):
+        """Overlays a catalogue created by pyesasky.catalogue in the sky
+
+        Arguments:
+        cull -- (Bool, optional) Keep the catalogue here, indexed by position,
+        and only send the sources in the current view. go_to, go_to_target
+        and set_fov send the sources of the new view, refresh_view does it
+        after panning in the ESASky view
+        max_sources -- (Int, optional) Most sources sent per view when culling,
+        CULL_MAX_SOURCES by default
+        priority -- (Array, optional) When a view holds more than max_sources,
+        the sources with the lowest priority values are sent, e.g. magnitudes.
+        A random but stable choice by default
+        updatable -- (Bool, optional) Allow update_sources and remove_sources
+        to change the catalogue. ESASky can not change single sources, so the
+        frontend keeps the catalogue and sends it again whole on every change
+        """
+
+        if cull and updatable:
+            raise ValueError("A culled catalogue can not be updatable")
 
+        self._culled_overlays.pop(catalogue._catalogue_name, None)
         event = "overlayCatalogueWithDetails" if show_data else "overlayCatalogue"
-        content = dict(event=event, content=catalogue.to_dict())
-        self._send_ignore(content)
+        if not cull:
+            self._send_overlay(event, catalogue.to_columnar_dict(), updatable)
+            return
+
+        columns, _ = catalogue._columns()
+        if priority is None:
+            rank = np.random.default_rng(0).permutation(len(catalogue))
+        else:
+            rank = np.argsort(np.argsort(np.asarray(priority), kind="stable"))
+        culled = dict(
+            catalogue=catalogue,
+            index=SkyIndex(columns["ra"], columns["dec"]),
+            rank=rank,
+            max_sources=max_sources or const.CULL_MAX_SOURCES,
+            event=event,
+            sent=None,
+        )
+        self._culled_overlays[catalogue._catalogue_name] = culled
+        self._send_culled(catalogue._catalogue_name, culled, self._view_cone())
+
+    def refresh_view(self):
+        """Sends the sources of the culled catalogues in the current view,
+        see overlay_cat"""
+
+        self._refresh_culled_overlays()
+
+    def _refresh_culled_overlays(self):
+        if not self._culled_overlays:
+            return
+        cone = self._view_cone()
+        for name, culled in self._culled_overlays.items():
+            self._send_culled(name, culled, cone)
+
+    def _view_cone(self):
+        """(ra, dec, radius) in degrees of a cone around the current view,
+        None when the view is unknown"""
+        center, fov = self.get_center(), self.get_fov()
+        sizes = fov.values() if isinstance(fov, dict) else [fov]
+        sizes = [size for size in sizes if isinstance(size, (int, float))]
+        if not isinstance(center, dict) or not sizes:
+            return None
+        coordinates = {key.lower(): value for key, value in center.items()}
+        try:
+            # Half the diagonal of the view
+            radius = const.CULL_MARGIN * max(sizes) / np.sqrt(2)
+            return float(coordinates["ra"]), float(coordinates["dec"]), radius
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def _send_culled(self, name, culled, cone):
+        """Sends the sources of a culled catalogue inside cone. Only the new
+        ones are appended, unless the frontend would then hold too many."""
+        if cone is None:
+            visible = np.arange(len(culled["index"]))
+        else:
+            visible = culled["index"].query(*cone)
+        max_sources = culled["max_sources"]
+        if len(visible) > max_sources:
+            chosen = np.argpartition(culled["rank"][visible], max_sources)[:max_sources]
+            visible = np.sort(visible[chosen])
+
+        sent = culled["sent"]
+        if sent is not None:
+            new = np.setdiff1d(visible, sent, assume_unique=True)
+            if len(new) == 0:
+                return
+            if len(sent) + len(new) <= const.CULL_HELD_FACTOR * max_sources:
+                culled["sent"] = np.union1d(sent, new)
+                self._send_overlay(
+                    const.EVENT_APPEND_OVERLAY,
+                    culled["catalogue"].to_columnar_dict(new),
+                )
+                return
+            content = dict(event="deleteCatalogue", content=dict(overlayName=name))
+            self._send_ignore(content)
+
+        culled["sent"] = visible
+        self._send_overlay(
+            culled["event"], culled["catalogue"].to_columnar_dict(visible)
+        )
+
+    def _send_overlay(self, event, overlay, updatable=False):
+        """Sends an overlay from to_columnar_dict, a new one or one appended
+        to. The ids of the objects the frontend then holds are only recorded
+        for updatable overlays, appended chunks of the others are not kept
+        anywhere."""
+        overlay_set = overlay["overlaySet"]
+        name = overlay_set["overlayName"]
+        appended = event == const.EVENT_APPEND_OVERLAY
+        if not appended:
+            self._overlay_ids.pop(name, None)
+            self._next_ids.pop(name, None)
+        try:
+            ids = np.asarray(overlay_set["columns"]["id"], dtype=np.int64)
+        except (TypeError, ValueError):
+            # Without integer ids the overlay can not be updated
+            self._overlay_ids.pop(name, None)
+            updatable = False
+        else:
+            if len(ids):
+                self._next_ids[name] = max(
+                    self._next_ids.get(name, 0), int(ids.max()) + 1
+                )
+            if appended and name in self._overlay_ids:
+                # Merged only once they are needed, streamed overlays append
+                # many chunks
+                self._overlay_ids[name].append(ids)
+            elif updatable:
+                self._overlay_ids[name] = [ids[:0], ids]
+
+        overlay, buffers = pack_buffers(overlay)
+        content = dict(event=event, content=overlay)
+        if updatable:
+            content["updatable"] = True
+        self._send_ignore(content, buffers)
+
+    def append_sources(
+        self, overlay_name, ra, dec, names=None, ids=None, types=None, **columns
+    ):
+        """Adds sources to a visualised catalogue, only the new sources are
+        sent
+
+        Arguments:
+        overlay_name -- (String) Name of the catalogue
+        ra -- (Array) RA of the sources in degrees
+        dec -- (Array) Dec of the sources in degrees
+        names -- (Array or String, optional) Names of the sources, the
+        catalogue name by default
+        ids -- (Array, optional) Integer ids, following the highest id sent
+        to the catalogue by default. Only checked against the sources already
+        held for updatable catalogues
+        types -- (Dict, optional) MetadataType of the metadata columns, guessed
+        from their dtype by default
+        columns -- (Arrays) Metadata columns, by name
+        """
+        held = None
+        if overlay_name in self._overlay_ids or overlay_name not in self._next_ids:
+            held = self._held_ids(overlay_name)
+        elif overlay_name in self._culled_overlays:
+            self._held_ids(overlay_name)
+        if ids is None:
+            first = self._next_ids.get(overlay_name, 0)
+            ids = np.arange(first, first + len(ra))
+        ids = np.asarray(ids, dtype=np.int64)
+        duplicates = _contains(held, ids) if held is not None else ids[:0]
+        if duplicates.any():
+            raise ValueError(
+                f"{duplicates.sum()} ids are already in {overlay_name}, "
+                "update_sources changes existing sources"
+            )
+
+        catalogue = Catalogue(overlay_name, "J2000", None, None)
+        catalogue.add_sources(ra, dec, name=names, id=ids, types=types, **columns)
+        self._send_overlay(const.EVENT_APPEND_OVERLAY, catalogue.to_columnar_dict())
+
+    def update_sources(self, overlay_name, ids, types=None, **columns):
+        """Changes columns of sources or footprints of an updatable overlay,
+        only the changed values are sent. ESASky can not change single objects,
+        the frontend sends the whole overlay again
+
+        widget.update_sources("alerts", [3, 8], mag=[17.2, 18.0])
+
+        Arguments:
+        overlay_name -- (String) Name of the catalogue or footprint set
+        ids -- (Array) Ids of the objects to change
+        types -- (Dict, optional) MetadataType of new metadata columns,
+        guessed from their dtype by default
+        columns -- (Arrays) New values by column, fields such as ra, dec or
+        name as well as metadata columns
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        unknown = ~_contains(self._held_ids(overlay_name), ids)
+        if unknown.any():
+            raise ValueError(f"{unknown.sum()} ids are not in {overlay_name}")
+
+        types = types or {}
+        fields, data = {}, []
+        for col_name, values in columns.items():
+            values = np.asarray(values)
+            if col_name in Catalogue.FIELDS + FootprintSet.FIELDS:
+                fields[col_name] = values
+            else:
+                col_type = types.get(col_name) or _metadata_type(values)
+                data.append(dict(name=col_name, type=col_type, values=values))
+
+        update, buffers = pack_buffers(
+            dict(overlayName=overlay_name, ids=ids, columns=fields, data=data)
+        )
+        content = dict(event=const.EVENT_UPDATE_OVERLAY, content=update)
+        self._send_ignore(content, buffers)
+
+    def remove_sources(self, overlay_name, ids):
+        """Removes sources or footprints from an updatable overlay, ids it
+        does not hold are ignored. ESASky can not remove single objects, the
+        frontend sends the whole overlay again
+
+        Arguments:
+        overlay_name -- (String) Name of the catalogue or footprint set
+        ids -- (Array) Ids of the objects to remove
+        """
+        held = self._held_ids(overlay_name)
+        ids = np.asarray(ids, dtype=np.int64)
+        ids = np.unique(ids[_contains(held, ids)])
+        if len(ids) == 0:
+            return
+        held = np.setdiff1d(held, ids, assume_unique=True)
+        self._overlay_ids[overlay_name] = [held]
+
+        removal, buffers = pack_buffers(dict(overlayName=overlay_name, ids=ids))
+        content = dict(event=const.EVENT_REMOVE_FROM_OVERLAY, content=removal)
+        self._send_ignore(content, buffers)
+
+    def _held_ids(self, overlay_name):
+        if overlay_name in self._culled_overlays:
+            raise ValueError(
+                f"{overlay_name} is culled to the view, overlay it again to change it"
+            )
+        if overlay_name in self._next_ids and overlay_name not in self._overlay_ids:
+            raise ValueError(
+                f"{overlay_name} is not updatable, overlay it with updatable=True "
+                "to change it"
+            )
+        if overlay_name not in self._overlay_ids:
+            raise ValueError(
+                f"No overlay {overlay_name} with integer ids was sent from here"
+            )
+        chunks = self._overlay_ids[overlay_name]
+        if len(chunks) > 1:
+            chunks[:] = [np.unique(np.concatenate(chunks))]
+        return chunks[0]
 
     def clear_cat(self, name):
         """Clears all objects in named visualised catalogue"""
+        if name in self._overlay_ids:
+            self._overlay_ids[name] = [np.empty(0, dtype=np.int64)]
+        if name in self._next_ids:
+            self._next_ids[name] = 0
 
         content = dict(event="clearCatalogue", content=dict(overlayName=name))
         self._send_ignore(content)
 
     def delete_cat(self, name):
         """Deletes named visualised cataloge"""
+        self._culled_overlays.pop(name, None)
+        self._overlay_ids.pop(name, None)
+        self._next_ids.pop(name, None)
 
         content = dict(event="deleteCatalogue", content=dict(overlayName=name))
         self._send_ignore(content)
 
-    def overlay_footprints(self, footprints, show_data=False):
-        """Overlays footprints created by pyesasky.footprint in the sky"""
+    def overlay_footprints(
+        self, footprints, show_data=False, lod=False, updatable=False
+    ):
+        """Overlays footprints created by pyesasky.footprint in the sky
+
+        Arguments:
+        lod -- (Bool, optional) Level of detail, the shapes are simplified to
+        the resolution of the current field of view and sent again in finer
+        detail when set_fov zooms in
+        updatable -- (Bool, optional) Allow update_sources and remove_sources
+        to change the footprints. ESASky can not change single footprints, so
+        the frontend keeps the set and sends it again whole on every change
+        """
+
+        self._lod_overlays.pop(footprints._name, None)
+        tolerance = self._lod_tolerance() if lod else None
+        if tolerance:
+            self._lod_overlays[footprints._name] = dict(
+                sets=[footprints],
+                show_data=show_data,
+                tolerance=tolerance,
+                updatable=updatable,
+            )
 
         event = "overlayFootprintsWithDetails" if show_data else "overlayFootprints"
-        content = dict(event=event, content=dict(footprints.to_dict()))
-        self._send_ignore(content)
+        self._send_overlay(event, footprints.to_columnar_dict(tolerance), updatable)
+
+    def _lod_tolerance(self, fov=None):
+        """Simplification tolerance in degrees for fov, the current field of
+        view by default, None when the field of view is unknown"""
+        if fov is None:
+            fov = self.get_fov()
+        if isinstance(fov, dict):
+            fov = max(
+                (value for value in fov.values() if isinstance(value, (int, float))),
+                default=None,
+            )
+        try:
+            return float(fov) / const.LOD_VIEW_PIXELS
+        except (TypeError, ValueError):
+            return None
+
+    def _refine_lod_overlays(self, fov):
+        """Sends the level of detail overlays again when the view zoomed in
+        enough for their shapes to look coarse"""
+        tolerance = self._lod_tolerance(fov)
+        if not tolerance:
+            return
+
+        for name, lod in self._lod_overlays.items():
+            if lod["sets"] is None:
+                # Streamed, the chunks were not kept
+                continue
+            if tolerance * const.LOD_REFINE_FACTOR > lod["tolerance"]:
+                continue
+            lod["tolerance"] = tolerance
+            content = dict(
+                event="deleteFootprintsOverlay", content=dict(overlayName=name)
+            )
+            self._send_ignore(content)
+
+            first, *appended = lod["sets"]
+            event = (
+                "overlayFootprintsWithDetails"
+                if lod["show_data"]
+                else "overlayFootprints"
+            )
+            self._send_overlay(
+                event, first.to_columnar_dict(tolerance), lod["updatable"]
+            )
+            for footprints in appended:
+                self._send_overlay(
+                    const.EVENT_APPEND_OVERLAY, footprints.to_columnar_dict(tolerance)
+                )
 
     def clear_footprints(self, overlay_name):
         """Clears all objects in named visualised footprint table"""
+        if overlay_name in self._overlay_ids:
+            self._overlay_ids[overlay_name] = [np.empty(0, dtype=np.int64)]
+        if overlay_name in self._next_ids:
+            self._next_ids[overlay_name] = 0
         content = dict(
             event="clearFootprintsOverlay", content=dict(overlayName=overlay_name)
         )
@@ -299,15 +704,70 @@ class ApiInteractionsMixin(LApiInteractionsMixin):
 
     def delete_footprints(self, overlay_name):
         """Deletes named visualised footprint table"""
+        self._lod_overlays.pop(overlay_name, None)
+        self._overlay_ids.pop(overlay_name, None)
+        self._next_ids.pop(overlay_name, None)
 
         content = dict(
             event="deleteFootprintsOverlay", content=dict(overlayName=overlay_name)
         )
         self._send_ignore(content)
 
-    def overlay_footprints_csv(self, path, delimiter, descriptor):
-        """Overlays footprints read from a csv file"""
+    def overlay_footprints_csv(
+        self, path, delimiter, descriptor, chunk_size=None, lod=False
+    ):
+        """Overlays footprints read from a csv file
+
+        Arguments:
+        chunk_size -- (Int, optional) Read and send the file in chunks of this
+        many rows, each chunk is appended to the overlay so memory use is
+        bounded by the chunk size rather than the file size
+        lod -- (Bool, optional) Level of detail, see overlay_footprints. The
+        chunks are not kept, the shapes of a file read in chunks are only
+        simplified to the field of view it was overlaid in
+        """
+
+        with open(path) as csv_file:
+            csv_reader = csv.reader(csv_file, delimiter=delimiter)
+            columns = next(csv_reader, [])
+            print(f'Columns identified: {", ".join(columns)}')
+
+            plan = ColumnPlan.for_footprints(columns, descriptor)
+
+            line_count = 1
+            for chunk_index, rows in enumerate(iter_chunks(csv_reader, chunk_size)):
+                footprint_set = FootprintSet(
+                    descriptor.get_dataset_name(),
+                    "J2000",
+                    descriptor.get_histo_color(),
+                    descriptor.get_line_width(),
+                )
+
+                fields, details = plan.split_rows(rows)
+                empty = [""] * len(rows)
+                footprint_set._add_columns(
+                    fields.get("name", empty),
+                    fields.get("stcs", empty),
+                    row_ids(fields.get("id", len(rows)), line_count - 1),
+                    fields.get("ra"),
+                    fields.get("dec"),
+                    details,
+                )
+                line_count += len(rows)
 
+                if chunk_index == 0:
+                    self.overlay_footprints(footprint_set, show_data=True, lod=lod)
+                else:
+                    self._append_overlay(footprint_set)
+
+            print(f"Processed {line_count} lines.")
+
+    def overlay_footprints_astropy(self, descriptor, table, lod=False):
+        """Overlays footprints from an astropy table
+
+        Arguments:
+        lod -- (Bool, optional) Level of detail, see overlay_footprints
+        """
         footprint_set = FootprintSet(
             descriptor.get_dataset_name(),
             "J2000",
@@ -315,189 +775,121 @@ class ApiInteractionsMixin(LApiInteractionsMixin):
             descriptor.get_line_width(),
         )
 
-        # read colums
-        with open(path) as csv_file:
-            csv_reader = csv.reader(csv_file, delimiter=delimiter)
-            line_count = 0
-            for row in csv_reader:
-                if line_count == 0:
-                    columns = row
-                    print(f'Columns identified: {", ".join(row)}')
-                    line_count += 1
-                    i = 0
-                    while i < len(columns):
-                        if columns[i] == descriptor.get_id_col():
-                            col_id = columns[i]
-                            print("{id} mapped to " + col_id)
-                            if (
-                                descriptor.get_id_col()
-                                == descriptor.get_name_col()
-                            ):
-                                col_name = col_id
-                                print("{name} mapped to " + col_name)
-                        elif columns[i] == descriptor.get_name_col():
-                            col_name = columns[i]
-                            print("{name} mapped to " + col_name)
-                        elif columns[i] == descriptor.get_stcs_col():
-                            col_stcs = columns[i]
-                            print("{stcs} mapped to " + col_stcs)
-                        elif columns[i] == descriptor.get_ra_center_col():
-                            col_ra = columns[i]
-                            print("{centerRaDeg} mapped to " + col_ra)
-                        elif columns[i] == descriptor.get_dec_center_col():
-                            col_dec = columns[i]
-                            print("{centerDecDeg} mapped to " + col_dec)
-                        i += 1
-                else:
-                    i = 0
-                    c_details = []
-                    c_id = ""
-                    c_name = ""
-                    c_stcs = ""
-                    c_ra = ""
-                    c_deg = ""
-
-                    while i < len(row):
-                        if columns[i] == descriptor.get_id_col():
-                            c_id = row[i]
-                            if (
-                                descriptor.get_id_col()
-                                == descriptor.get_name_col()
-                            ):
-                                c_name = c_id
-                        elif columns[i] == descriptor.get_name_col():
-                            c_name = row[i]
-                        elif columns[i] == descriptor.get_stcs_col():
-                            c_stcs = row[i]
-                        elif columns[i] == descriptor.get_ra_center_col():
-                            c_ra = row[i]
-                        elif columns[i] == descriptor.get_dec_center_col():
-                            c_deg = row[i]
-                        else:
-                            c_meta = {}
-                            found = False
-                            if len(descriptor.get_metadata()) > 0:
-                                j = 0
-                                while j < len(descriptor.get_metadata()):
-                                    if (
-                                        descriptor.get_metadata()[j].get_label()
-                                        == columns[i]
-                                    ):
-                                        found = True
-                                        c_meta["name"] = descriptor.get_metadata()[
-                                            j
-                                        ].get_label()
-                                        c_meta["value"] = row[i]
-                                        c_meta["type"] = descriptor.get_metadata()[
-                                            j
-                                        ].get_col_type()
-
-                                        break
-                                    j += 1
-                            elif not found:
-                                c_meta["name"] = columns[i]
-                                c_meta["value"] = row[i]
-                                c_meta["type"] = MetadataType.STRING
-
-                            c_details.append(c_meta)
-
-                        i += 1
-
-                    footprint_set.add_footprint(
-                        c_name, c_stcs, c_id, c_ra, c_deg, c_details
-                    )
-
-                    line_count += 1
-            print(f"Processed {line_count} lines.")
-            self.overlay_footprints(footprint_set, show_data=True)
+        plan = ColumnPlan.for_footprints(table.colnames, descriptor)
+        fields, details = plan.split(
+            [column_to_str(table[col_name]) for col_name in table.colnames]
+        )
+        n_rows = len(table)
+        empty = np.full(n_rows, "")
+        footprint_set._add_columns(
+            fields.get("name", empty),
+            fields.get("stcs", empty),
+            row_ids(fields.get("id", n_rows), 0),
+            fields.get("ra"),
+            fields.get("dec"),
+            details,
+        )
 
-    def overlay_footprints_astropy(self, descriptor, table):
-        i = 0
+        print(f"Processed {n_rows} lines.")
+        self.overlay_footprints(footprint_set, show_data=True, lod=lod)
 
+    def overlay_footprints_arrow(
+        self, source, descriptor, batch_size=None, lod=False, columns=None
+    ):
+        """Overlays footprints from Arrow data, see overlay_cat_arrow
+
+        Arguments:
+        source -- (pyarrow.Table, pyarrow.dataset.Dataset or String) Table,
+        dataset or path of a Parquet file
+        descriptor -- (FootprintSetDescriptor) Columns to use
+        batch_size -- (Int, optional) Rows per batch, ARROW_BATCH_SIZE by default
+        lod -- (Bool, optional) Level of detail, see overlay_footprints. The
+        batches are not kept, the shapes of data read in several batches are
+        only simplified to the field of view it was overlaid in
+        columns -- (List or String, optional) Metadata columns to read, see
+        overlay_cat_arrow
+        """
+
+        schema = arrow_schema(source)
+        plan = ColumnPlan.for_footprints(
+            schema.names,
+            descriptor,
+            types={field.name: arrow_metadata_type(field.type) for field in schema},
+            metadata_columns=selected_metadata(descriptor, columns),
+        )
+
+        n_rows = 0
+        batches = iter_batches(source, plan.names, batch_size or ARROW_BATCH_SIZE)
+        for batch_index, batch in enumerate(batches):
+            footprint_set = FootprintSet(
+                descriptor.get_dataset_name(),
+                "J2000",
+                descriptor.get_histo_color(),
+                descriptor.get_line_width(),
+            )
+            fields, details = plan.split(
+                [arrow_to_numpy(batch.column(name)) for name in plan.names]
+            )
+            empty = np.full(batch.num_rows, "")
+            footprint_set._add_columns(
+                fields.get("name", empty),
+                fields.get("stcs", empty),
+                row_ids(fields.get("id", batch.num_rows), n_rows),
+                fields.get("ra"),
+                fields.get("dec"),
+                details,
+            )
+            n_rows += batch.num_rows
+
+            if batch_index == 0:
+                self.overlay_footprints(footprint_set, show_data=True, lod=lod)
+            else:
+                self._append_overlay(footprint_set)
+
+        print(f"Processed {n_rows} lines.")
+
+    def overlay_footprints_dataframe(self, dataframe, descriptor, lod=False):
+        """Overlays footprints from a pandas DataFrame, see overlay_cat_dataframe
+
+        Arguments:
+        dataframe -- (pandas.DataFrame) One footprint per row
+        descriptor -- (FootprintSetDescriptor) Columns to use, the columns it
+        does not list are sent as metadata typed from their dtype
+        lod -- (Bool, optional) Level of detail, see overlay_footprints
+        """
+
+        plan = ColumnPlan.for_footprints(
+            [str(name) for name in dataframe.columns],
+            descriptor,
+            types={
+                str(name): dtype_metadata_type(dtype)
+                for name, dtype in dataframe.dtypes.items()
+            },
+        )
+        columns = {str(name): series for name, series in dataframe.items()}
+        fields, details = plan.split(
+            [series_to_numpy(columns[name]) for name in plan.names]
+        )
+
+        n_rows = len(dataframe)
         footprint_set = FootprintSet(
             descriptor.get_dataset_name(),
             "J2000",
             descriptor.get_histo_color(),
             descriptor.get_line_width(),
         )
+        empty = np.full(n_rows, "")
+        footprint_set._add_columns(
+            fields.get("name", empty),
+            fields.get("stcs", empty),
+            row_ids(fields.get("id", n_rows), 0),
+            fields.get("ra"),
+            fields.get("dec"),
+            details,
+        )
 
-        while i < len(table.colnames):
-
-            if table.colnames[i] == descriptor.get_id_col():
-                col_id = table.colnames[i]
-                print("{id} mapped to " + col_id)
-                if descriptor.get_id_col() == descriptor.get_name_col():
-                    col_name = col_id
-                    print("{name} mapped to " + col_name)
-            elif table.colnames[i] == descriptor.get_name_col():
-                col_name = table.colnames[i]
-                print("{name} mapped to " + col_name)
-            elif table.colnames[i] == descriptor.get_stcs_col():
-                col_stcs = table.colnames[i]
-                print("{stcs} mapped to " + col_stcs)
-            elif table.colnames[i] == descriptor.get_ra_center_col():
-                col_ra = table.colnames[i]
-                print("{centerRaDeg} mapped to " + col_ra)
-            elif table.colnames[i] == descriptor.get_dec_center_col():
-                col_dec = table.colnames[i]
-                print("{centerDecDeg} mapped to " + col_dec)
-            i += 1
-
-        j = 0
-        c_id = j
-
-        while j < len(table):
-            c_details = []
-            k = 0
-            while k < len(table.colnames):
-                col_meta = {}
-                col_name = table.colnames[k]
-                if isinstance(table[j][k], bytes):
-                    col_val = str(table[j][k].decode("utf-8"))
-                else:
-                    col_val = str(table[j][k])
-                c_ra = []
-                c_dec = []
-
-                if col_name == descriptor.get_name_col():
-                    c_name = col_val
-                elif col_name == descriptor.get_stcs_col():
-                    c_stcs = col_val
-                elif col_name == descriptor.get_ra_center_col():
-                    c_ra = col_val
-                elif col_name == descriptor.get_dec_center_col():
-                    c_dec = col_val
-                else:
-                    col_meta = {}
-                    found = False
-                    if len(descriptor.get_metadata()) > 0:
-                        index = 0
-                        while index < len(descriptor.get_metadata()):
-                            if descriptor.get_metadata()[j].get_label() == col_name:
-                                found = True
-                                col_meta["name"] = descriptor.get_metadata()[
-                                    j
-                                ].get_label()
-                                col_meta["value"] = col_val
-                                col_meta["type"] = descriptor.get_metadata()[
-                                    j
-                                ].get_col_type()
-
-                                break
-                            index += 1
-                    elif not found:
-                        col_meta["name"] = col_name
-                        col_meta["value"] = col_val
-                        col_meta["type"] = MetadataType.STRING
-
-                    c_details.append(col_meta)
-                k += 1
-
-            j += 1
-            footprint_set.add_footprint(c_name, c_stcs, c_id, c_ra, c_dec, c_details)
-
-        print(f"Processed {j} lines.")
-        self.overlay_footprints(footprint_set, show_data=True)
+        print(f"Processed {n_rows} lines.")
+        self.overlay_footprints(footprint_set, show_data=True, lod=lod)
 
     def overlay_cat_astropy(
         self,
@@ -527,71 +919,149 @@ class ApiInteractionsMixin(LApiInteractionsMixin):
             id_col = ""
             is_user_id_col = False
 
-        i = 0
-
         if not is_user_ra_col and not is_user_dec_col and not is_user_id_col:
 
-            while i < len(table.colnames):
-
-                col_name = table.colnames[i]
-
-                if len(table[col_name].meta) > 0:
-                    meta_type = table[col_name].meta["ucd"]
-                    if "pos.eq.ra;meta.main" in meta_type and not is_user_ra_col:
-                        ra_col = col_name
-                    elif "pos.eq.dec;meta.main" in meta_type and not is_user_dec_col:
-                        dec_col = col_name
-                    elif "meta.id;meta.main" in meta_type and not is_user_id_col:
-                        id_col = col_name
-                i += 1
+            for col_name in table.colnames:
+                meta_type = column_ucd(table[col_name])
+                if not meta_type:
+                    continue
+                if "pos.eq.ra;meta.main" in meta_type and not is_user_ra_col:
+                    ra_col = col_name
+                elif "pos.eq.dec;meta.main" in meta_type and not is_user_dec_col:
+                    dec_col = col_name
+                elif "meta.id;meta.main" in meta_type and not is_user_id_col:
+                    id_col = col_name
 
         if not line_width:
             line_width = 5
 
         cat = Catalogue(name, frame, color, line_width)
 
-        j = 0
-        source_id = 0
-        while j < len(table):
-            details = []
-            ra = None
-            dec = None
-            k = 0
-            while k < len(table.colnames):
-                meta = {}
-                col_name = table.colnames[k]
-                if isinstance(table[j][k], bytes):
-                    value = str(table[j][k].decode("utf-8"))
-                else:
-                    value = str(table[j][k])
+        n_rows = len(table)
+        ras = [None] * n_rows
+        decs = [None] * n_rows
+        names = [name] * n_rows
+        details = []
+
+        # Every column is stringified and typed once, never cell by cell
+        for col_name in table.colnames:
+            values = column_to_str(table[col_name]).tolist()
+
+            if col_name == ra_col:
+                ras = values
+            elif col_name == dec_col:
+                decs = values
+            elif col_name == id_col:
+                names = values
+            else:
+                ucd = column_ucd(table[col_name])
+                col_type = self._ucd_type_to_esasky(ucd) if ucd else "STRING"
+                details.append((col_name, col_type, values))
 
-                if col_name == ra_col:
-                    ra = value
+        cat._add_columns(names, ras, decs, range(n_rows), details)
 
-                elif col_name == dec_col:
-                    dec = value
+        self.overlay_cat(cat)
 
-                elif col_name == id_col:
-                    name = value
+    def overlay_cat_dataframe(self, dataframe, descriptor, cooframe="J2000"):
+        """Overlays a catalogue from a pandas DataFrame. Whole columns are
+        converted at once, the metadata types follow the column dtypes and
+        numeric columns reach the comm buffers without copies.
 
-                else:
-                    meta["name"] = col_name
-                    meta["value"] = value
-                    if "ucd" in table[col_name].meta:
-                        meta["type"] = self._ucd_type_to_esasky(
-                            table[col_name].meta["ucd"]
-                        )
-                    else:
-                        meta["type"] = "STRING"
-                    details.append(meta)
-
-                k += 1
-
-            source_id = j
-            cat.add_source(name, ra, dec, source_id, details)
-            j += 1
+        Arguments:
+        dataframe -- (pandas.DataFrame) One source per row
+        descriptor -- (CatalogueDescriptor) Columns to use, the columns it
+        does not list are sent as metadata typed from their dtype
+        cooframe -- (String, optional) J2000 or Galactic
+        """
 
-        self.overlay_cat(cat)
+        plan = ColumnPlan.for_catalogue(
+            [str(name) for name in dataframe.columns],
+            descriptor,
+            types={
+                str(name): dtype_metadata_type(dtype)
+                for name, dtype in dataframe.dtypes.items()
+            },
+        )
+        columns = {str(name): series for name, series in dataframe.items()}
+        fields, details = plan.split(
+            [series_to_numpy(columns[name]) for name in plan.names]
+        )
+
+        n_rows = len(dataframe)
+        catalogue = Catalogue(
+            descriptor.get_dataset_name(),
+            cooframe,
+            descriptor.get_histo_color(),
+            descriptor.get_line_width(),
+        )
+        empty = np.full(n_rows, "")
+        catalogue._add_columns(
+            fields.get("name", empty),
+            fields.get("ra", empty),
+            fields.get("dec", empty),
+            row_ids(fields.get("id", n_rows), 0),
+            details,
+        )
+
+        print(f"Processed {n_rows} lines.")
+        self.overlay_cat(catalogue, show_data=True)
+
+    def overlay_cat_arrow(
+        self, source, descriptor, cooframe="J2000", batch_size=None, columns=None
+    ):
+        """Overlays a catalogue from Arrow data, such as a Parquet file.
+        Only the columns the descriptor needs are read, and the data is read
+        and sent one record batch at a time, each batch is appended to the
+        overlay. Numeric columns reach the comm buffers without copies.
+
+        Arguments:
+        source -- (pyarrow.Table, pyarrow.dataset.Dataset or String) Table,
+        dataset or path of a Parquet file
+        descriptor -- (CatalogueDescriptor) Columns to use
+        cooframe -- (String, optional) J2000 or Galactic
+        batch_size -- (Int, optional) Rows per batch, ARROW_BATCH_SIZE by default
+        columns -- (List or String, optional) Metadata columns to read, typed
+        from the schema when the descriptor does not list them. By default the
+        metadata the descriptor lists, or every column when it lists none.
+        "all" reads every column of the source
+        """
+
+        schema = arrow_schema(source)
+        plan = ColumnPlan.for_catalogue(
+            schema.names,
+            descriptor,
+            types={field.name: arrow_metadata_type(field.type) for field in schema},
+            metadata_columns=selected_metadata(descriptor, columns),
+        )
+
+        n_rows = 0
+        batches = iter_batches(source, plan.names, batch_size or ARROW_BATCH_SIZE)
+        for batch_index, batch in enumerate(batches):
+            catalogue = Catalogue(
+                descriptor.get_dataset_name(),
+                cooframe,
+                descriptor.get_histo_color(),
+                descriptor.get_line_width(),
+            )
+            fields, details = plan.split(
+                [arrow_to_numpy(batch.column(name)) for name in plan.names]
+            )
+            empty = np.full(batch.num_rows, "")
+            catalogue._add_columns(
+                fields.get("name", empty),
+                fields.get("ra", empty),
+                fields.get("dec", empty),
+                row_ids(fields.get("id", batch.num_rows), n_rows),
+                details,
+            )
+            n_rows += batch.num_rows
+
+            if batch_index == 0:
+                self.overlay_cat(catalogue, show_data=True)
+            else:
+                self._append_overlay(catalogue)
+
+        print(f"Processed {n_rows} lines.")
 
     def _ucd_type_to_esasky(self, tap_type):
         if tap_type == "meta.number":
@@ -599,133 +1069,83 @@ class ApiInteractionsMixin(LApiInteractionsMixin):
         else:
             return "STRING"
 
-    def overlay_cat_csv(self, file_path, delimiter, descriptor, cooframe):
-        """Overlays catalogue read from a csv file"""
+    def overlay_cat_csv(
+        self, file_path, delimiter, descriptor, cooframe, chunk_size=None
+    ):
+        """Overlays catalogue read from a csv file
 
-        catalogue = Catalogue(
-            descriptor.get_dataset_name(),
-            cooframe,
-            descriptor.get_histo_color(),
-            descriptor.get_line_width(),
-        )
+        Arguments:
+        chunk_size -- (Int, optional) Read and send the file in chunks of this
+        many rows, each chunk is appended to the overlay so memory use is
+        bounded by the chunk size rather than the file size
+        """
 
-        # read colums
         with open(file_path) as csv_file:
             csv_reader = csv.reader(csv_file, delimiter=delimiter)
-            line_count = 0
-            for row in csv_reader:
-                if line_count == 0:
-                    columns = row
-                    print(f'Column identified: {", ".join(row)}')
-                    line_count += 1
-                    i = 0
-                    while i < len(columns):
-                        if columns[i] == descriptor.get_id_col():
-                            col_id = columns[i]
-                            print("{id} column identified: " + col_id)
-                            if descriptor.get_id_col() == descriptor.get_name_col():
-                                col_name = col_id
-                                print("{name} column identified: " + col_name)
-                        elif columns[i] == descriptor.get_name_col():
-                            col_name = columns[i]
-                            print("{name} column identified: " + col_name)
-                        elif columns[i] == descriptor.get_ra_col():
-                            col_ra = columns[i]
-                            print("{centerRaDeg} column identified: " + col_ra)
-                        elif columns[i] == descriptor.get_dec_col():
-                            col_dec = columns[i]
-                            print("{currDecDeg} column identified: " + col_dec)
-                        i += 1
+            columns = next(csv_reader, [])
+            print(f'Column identified: {", ".join(columns)}')
+
+            plan = ColumnPlan.for_catalogue(columns, descriptor)
+
+            line_count = 1
+            for chunk_index, rows in enumerate(iter_chunks(csv_reader, chunk_size)):
+                catalogue = Catalogue(
+                    descriptor.get_dataset_name(),
+                    cooframe,
+                    descriptor.get_histo_color(),
+                    descriptor.get_line_width(),
+                )
+
+                fields, details = plan.split_rows(rows)
+                empty = [""] * len(rows)
+                catalogue._add_columns(
+                    fields.get("name", empty),
+                    fields.get("ra", empty),
+                    fields.get("dec", empty),
+                    row_ids(fields.get("id", len(rows)), line_count - 1),
+                    details,
+                )
+                line_count += len(rows)
+
+                if chunk_index == 0:
+                    self.overlay_cat(catalogue, show_data=True)
                 else:
-                    i = 0
-                    details = []
-                    col_id = ""
-                    name = ""
-                    ra = ""
-                    dec = ""
-
-                    while i < len(row):
-                        if columns[i] == descriptor.get_id_col():
-                            col_id = row[i]
-                            if descriptor.get_id_col() == descriptor.get_name_col():
-                                name = col_id
-                        elif columns[i] == descriptor.get_name_col():
-                            name = row[i]
-                        elif columns[i] == descriptor.get_ra_col():
-                            ra = row[i]
-                        elif columns[i] == descriptor.get_dec_col():
-                            dec = row[i]
-                        else:
-                            meta = {}
-                            found = False
-                            if len(descriptor.get_metadata()) > 0:
-                                j = 0
-                                while j < len(descriptor.get_metadata()):
-                                    if (
-                                        descriptor.get_metadata()[j].get_label()
-                                        == columns[i]
-                                    ):
-                                        found = True
-                                        meta["name"] = descriptor.get_metadata()[
-                                            j
-                                        ].get_label()
-                                        meta["value"] = row[i]
-                                        meta["type"] = descriptor.get_metadata()[
-                                            j
-                                        ].get_col_type()
-                                        break
-                                    j += 1
-                            elif not found:
-                                meta["name"] = columns[i]
-                                meta["value"] = row[i]
-                                meta["type"] = MetadataType.STRING
-
-                            details.append(meta)
-
-                        i += 1
-
-                    catalogue.add_source(name, ra, dec, col_id, details)
-                    line_count += 1
+                    self._append_overlay(catalogue)
+
             print(f"Processed {line_count} lines.")
-            self.overlay_cat(catalogue, show_data=True)
-
-    def overlay_moc(self, moc_obj, name="MOC", color="", opacity=0.2, mode="healpix"):
-        """Overlay HealPix Multi-Order Coverage map"""
-        moc_str = "{"
-        if isinstance(moc_obj, dict):
-            for order in moc_obj.keys():
-                moc_str += '"' + order + '":['
-                for val in moc_obj[order]:
-                    if "-" in str(val):
-                        start = int(val.split("-")[0])
-                        end = int(val.split("-")[1])
-                        for i in range(start, end + 1):
-                            moc_str += str(i) + ","
-                    else:
-                        moc_str += str(val) + ","
-                moc_str = moc_str[:-1] + "],"
-
-            moc_str = moc_str[:-1] + "}"
-        elif "/" in moc_obj:
-            order = ""
-            for val in moc_obj.split(" "):
-                if "/" in val:
-                    if order != "":
-                        moc_str = moc_str[:-1] + "],"
-                    order = val.split("/")[0]
-                    moc_str += '"' + order + '":['
-                    val = val.split("/")[1]
-
-                if "-" in str(val):
-                    start = int(val.split("-")[0])
-                    end = int(val.split("-")[1])
-                    for i in range(start, end + 1):
-                        moc_str += str(i) + ","
-                else:
-                    moc_str += str(val) + ","
-            moc_str = moc_str[:-1] + "]}"
+
+    def _append_overlay(self, overlay):
+        """Appends the objects of a catalogue or footprint set to the already
+        visualised overlay with the same name. Level of detail footprints are
+        simplified like the overlay but not kept, which stops refining it."""
+
+        lod = None
+        if isinstance(overlay, FootprintSet):
+            lod = self._lod_overlays.get(overlay._name)
+        if lod:
+            lod["sets"] = None
+            overlay = overlay.to_columnar_dict(lod["tolerance"])
         else:
+            overlay = overlay.to_columnar_dict()
+        self._send_overlay(const.EVENT_APPEND_OVERLAY, overlay)
+
+    def overlay_moc(
+        self, moc_obj, name="MOC", color="", opacity=0.2, mode="healpix", max_cells=None
+    ):
+        """Overlay HealPix Multi-Order Coverage map
+
+        Arguments:
+        moc_obj -- (MOC, Dict or String) pyesasky.moc.MOC, JSON MOC as a dict
+        {order: [cells]} or its string form, or an ASCII MOC like "1/0-3 5 2/44"
+        max_cells -- (Int, optional) The MOC is degraded until it has at most
+        this many cells, constants.MOC_MAX_CELLS by default
+        """
+        if isinstance(moc_obj, str) and not (
+            "/" in moc_obj or moc_obj.lstrip().startswith("{")
+        ):
             moc_str = moc_obj
+        else:
+            moc_str = encode_moc(moc_obj, max_cells or const.MOC_MAX_CELLS)
         content = dict(
             event="addMOC",
             content=dict(
@@ -770,9 +1190,22 @@ class ApiInteractionsMixin(LApiInteractionsMixin):
 
     def add_hips_local(self, hips_url):
         """Starts a tornado server which will supply the widget with
-        HiPS from a local source on client machine"""
-        if not hasattr(self, "tornadoServer"):
+        HiPS from a local source on client machine, either a directory or
+        a .tar or .zip archive of one"""
+        from pyesasky.hips_server import HiPSArchiveHandler, HiPSFileHandler
+
+        if not hasattr(self, "tornadoserver"):
             self._start_tornado()
+
+        archive_path = hips_url.rstrip("/\\")
+        if is_archive(archive_path):
+            handler = HiPSArchiveHandler
+            handler_kwargs = dict(archive=open_archive(archive_path))
+            hips_url = archive_path + "/"
+        else:
+            handler = HiPSFileHandler
+            handler_kwargs = dict(base_url=hips_url)
+
         drive, tail = os.path.splitdrive(hips_url)
         if drive:
             # Windows
@@ -781,7 +1214,7 @@ class ApiInteractionsMixin(LApiInteractionsMixin):
             url = hips_url
         url_pattern = url + "(.*)"
         self.tornadoserver.add_handlers(
-            r".*", [(str(url_pattern), self.FileHandler, dict(baseUrl=hips_url))]
+            r".*", [(str(url_pattern), handler, handler_kwargs)]
         )
         return url
 
@@ -808,8 +1241,11 @@ class ApiInteractionsMixin(LApiInteractionsMixin):
             content = dict(event="addHips", content=dict(hipsName=name))
             return self._send_receive(content)
 
-    def browse_hips(self):
-        """Queries CDS for the global HiPS list and returns it as a pandas dataframe"""
+    def browse_hips(self, refresh=False):
+        """Queries CDS for the global HiPS list and returns it as a pandas dataframe.
+        The list is cached on disk, refresh=True revalidates it right away"""
+        import pandas as pd
+
         url = "http://skyint.esac.esa.int/esasky-tap/global-hipslist"
         columns = [
             "ID",
@@ -820,18 +1256,33 @@ class ApiInteractionsMixin(LApiInteractionsMixin):
             "em_max",
             "hips_service_url",
         ]
-        with requests.get(url, stream=True, timeout=self.message_timeout) as response:
-            response_content = StringIO(response.content.decode("utf-8"))
-            df = pd.io.json.read_json(response_content)
-            return df[columns]
+
+        def parse(text):
+            return pd.io.json.read_json(StringIO(text))[columns]
+
+        return get_cache().get_parsed(
+            url,
+            parse,
+            timeout=self.message_timeout,
+            # Not pickled, the cache directory may be shared
+            dump=lambda df, path: df.to_json(path, orient="table"),
+            load=lambda path: pd.read_json(path, orient="table"),
+            name="hipslist",
+            refresh=refresh,
+        )
 
     def _read_properties(self, url):
         config = configparser.RawConfigParser(strict=False)
         if not url.startswith("http"):
             text = "[Dummy section]\n"
+            archive_path = url.rstrip("/\\")
             try:
-                with open(url + "properties", "r") as f:
-                    text += f.read() + "\n"
+                if is_archive(archive_path):
+                    properties = open_archive(archive_path).read("properties")
+                    text += properties.decode("utf-8") + "\n"
+                else:
+                    with open(url + "properties", "r") as f:
+                        text += f.read() + "\n"
                 config.read_string(text)
                 return config
             except FileNotFoundError as fnf_error:
@@ -842,6 +1293,8 @@ class ApiInteractionsMixin(LApiInteractionsMixin):
                 )
                 raise (fnf_error)
         else:
+            import requests
+
             response = requests.get(url + "properties", timeout=self.message_timeout)
             response.raise_for_status()
             text = "[Dummy section]\n" + response.text
@@ -872,47 +1325,9 @@ class ApiInteractionsMixin(LApiInteractionsMixin):
         return hips
 
     def _start_tornado(self):
-        class DummyHandler(tornado.web.RequestHandler):
-            pass
+        from pyesasky.hips_server import start_server
 
-        app = tornado.web.Application(
-            [
-                tornado.web.url(r"dummy", DummyHandler),
-            ]
-        )
-        server = tornado.httpserver.HTTPServer(app)
-        port_start = 8900
-        port_end = 8910
-        for port in range(port_start, port_end + 1):
-            try:
-                server.listen(port)
-            except OSError as os_error:
-                if port is port_end:
-                    raise (os_error)
-            else:
-                break
-        self.httpserver = server
-        self.tornadoserver = app
-        self.httpserverport = port
-
-    class FileHandler(tornado.web.RequestHandler):
-        def initialize(self, base_url):
-            self.base_url = base_url
-
-        def set_default_headers(self):
-            self.set_header("Access-Control-Allow-Origin", "*")
-
-        def get(self, path):
-            host = self.request.host
-            print(host)
-            origin = host.split(":")[0]
-            if not origin == "localhost":
-                raise tornado.web.HTTPError(status_code=403)
-            file_location = os.path.abspath(os.path.join(self.base_url, path))
-            if not os.path.isfile(file_location):
-                raise tornado.web.HTTPError(status_code=404)
-            with open(file_location, "rb") as source_file:
-                self.write(source_file.read())
+        self.tornadoserver, self.httpserver, self.httpserverport = start_server()
 
     """ External TAP Services"""
 
@@ -1170,7 +1585,9 @@ class ApiInteractionsMixin(LApiInteractionsMixin):
         sky_id -- (String) ID of the sky row to modify
         settings -- (Dict) Settings to apply
         """
-        content = dict(event="changeSkySettings", content=dict(id=sky_id, settings=settings))
+        content = dict(
+            event="changeSkySettings", content=dict(id=sky_id, settings=settings)
+        )
         self._send_ignore(content)
 
     def get_sky_rows(self):
@@ -1182,6 +1599,10 @@ class ApiInteractionsMixin(LApiInteractionsMixin):
 
     def remove_all_overlays(self):
         """Removes all active overlays"""
+        self._lod_overlays.clear()
+        self._culled_overlays.clear()
+        self._overlay_ids.clear()
+        self._next_ids.clear()
         content = dict(event="removeAllOverlays")
         self._send_ignore(content)
 
@@ -1192,7 +1613,9 @@ class ApiInteractionsMixin(LApiInteractionsMixin):
         overlay_name -- (String) Name of the overlay
         color -- (String) Color in RGB format (e.g. '#FF0000')
         """
-        content = dict(event="setOverlayColor", content=dict(overlayName=overlay_name, color=color))
+        content = dict(
+            event="setOverlayColor", content=dict(overlayName=overlay_name, color=color)
+        )
         self._send_ignore(content)
 
     def set_overlay_size(self, overlay_name, size):
@@ -1202,7 +1625,9 @@ class ApiInteractionsMixin(LApiInteractionsMixin):
         overlay_name -- (String) Name of the overlay
         size -- (Float) Size value
         """
-        content = dict(event="setOverlaySize", content=dict(overlayName=overlay_name, size=size))
+        content = dict(
+            event="setOverlaySize", content=dict(overlayName=overlay_name, size=size)
+        )
         self._send_ignore(content)
 
     def set_overlay_shape(self, overlay_name, shape):
@@ -1212,7 +1637,9 @@ class ApiInteractionsMixin(LApiInteractionsMixin):
         overlay_name -- (String) Name of the overlay
         shape -- (String) Shape type
         """
-        content = dict(event="setOverlayShape", content=dict(overlayName=overlay_name, shape=shape))
+        content = dict(
+            event="setOverlayShape", content=dict(overlayName=overlay_name, shape=shape)
+        )
         self._send_ignore(content)
 
     def get_active_overlays(self):
@@ -1227,7 +1654,10 @@ class ApiInteractionsMixin(LApiInteractionsMixin):
         overlay_name -- (String) Name of the overlay
         shape_name -- (String) Name of the shape to select
         """
-        content = dict(event="selectShape", content=dict(overlayName=overlay_name, shapeName=shape_name))
+        content = dict(
+            event="selectShape",
+            content=dict(overlayName=overlay_name, shapeName=shape_name),
+        )
         self._send_ignore(content)
 
     def deselect_shape(self, overlay_name, shape_name):
@@ -1237,7 +1667,10 @@ class ApiInteractionsMixin(LApiInteractionsMixin):
         overlay_name -- (String) Name of the overlay
         shape_name -- (String) Name of the shape to deselect
         """
-        content = dict(event="deselectShape", content=dict(overlayName=overlay_name, shapeName=shape_name))
+        content = dict(
+            event="deselectShape",
+            content=dict(overlayName=overlay_name, shapeName=shape_name),
+        )
         self._send_ignore(content)
 
     def deselect_all_shapes(self, overlay_name=None):
@@ -1280,7 +1713,9 @@ class ApiInteractionsMixin(LApiInteractionsMixin):
         radius -- (Float, optional) Radius in decimal degrees
         """
         if ra is not None and dec is not None and radius is not None:
-            content = dict(event="plotPublications", content=dict(ra=ra, dec=dec, radius=radius))
+            content = dict(
+                event="plotPublications", content=dict(ra=ra, dec=dec, radius=radius)
+            )
         else:
             content = dict(event="plotPublications")
         return self._send_receive(content)
@@ -1324,16 +1759,23 @@ class ApiInteractionsMixin(LApiInteractionsMixin):
 
     # MOC
 
-    def overlay_q3c_moc(self, moc_data, options=None):
+    def overlay_q3c_moc(self, moc_data, options=None, max_cells=None):
         """Overlay a Q3C Multi-Order Coverage map
 
         Arguments:
-        moc_data -- (String) Q3C MOC data string
+        moc_data -- (String or MOC) Q3C MOC data string, or a pyesasky.moc.MOC
+        whose cells are Q3C pixels
         options -- (Dict, optional) Display options
+        max_cells -- (Int, optional) A MOC is degraded until it has at most
+        this many cells, constants.MOC_MAX_CELLS by default
         """
         if options is None:
             options = {}
-        content = dict(event="addQ3CMOC", content=dict(options=options, mocData=moc_data))
+        if isinstance(moc_data, MOC):
+            moc_data = encode_moc(moc_data, max_cells or const.MOC_MAX_CELLS)
+        content = dict(
+            event="addQ3CMOC", content=dict(options=options, mocData=moc_data)
+        )
         self._send_ignore(content)
 
     # MODULES / TREEMAP / BUTTONS
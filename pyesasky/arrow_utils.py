@@ -0,0 +1,97 @@
+import os
+
+import numpy as np
+
+from pyesasky.models import MetadataType
+
+# Rows per record batch, each batch is sent as its own chunk of the overlay
+ARROW_BATCH_SIZE = 100_000
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+    except ImportError as import_error:
+        raise ImportError(
+            "Arrow and Parquet ingestion needs pyarrow, install it with "
+            "pip install pyarrow"
+        ) from import_error
+    return pyarrow
+
+
+def arrow_schema(source):
+    """
+    Returns the schema of an Arrow source without reading its data.
+
+    Arguments:
+    source -- (pyarrow.Table, pyarrow.dataset.Dataset or String) Table,
+    dataset or path of a Parquet file
+    """
+    _pyarrow()
+    if isinstance(source, (str, os.PathLike)):
+        import pyarrow.parquet as pq
+
+        return pq.read_schema(source)
+    return source.schema
+
+
+def iter_batches(source, columns, batch_size=ARROW_BATCH_SIZE):
+    """
+    Yields the record batches of an Arrow source, with only the columns
+    given. Parquet files and datasets are read batch by batch.
+
+    Arguments:
+    source -- (pyarrow.Table, pyarrow.dataset.Dataset or String) Table,
+    dataset or path of a Parquet file
+    columns -- (List) Names of the columns to read
+    batch_size -- (Int, optional) Most rows per batch
+    """
+    pa = _pyarrow()
+    if isinstance(source, (str, os.PathLike)):
+        import pyarrow.parquet as pq
+
+        yield from pq.ParquetFile(source).iter_batches(
+            batch_size=batch_size, columns=columns
+        )
+    elif isinstance(source, pa.Table):
+        yield from source.select(columns).to_batches(max_chunksize=batch_size)
+    else:
+        import pyarrow.dataset as ds
+
+        if not isinstance(source, ds.Dataset):
+            raise TypeError(
+                f"Expected a pyarrow Table, Dataset or Parquet path, got {type(source)}"
+            )
+        yield from source.to_batches(columns=columns, batch_size=batch_size)
+
+
+def arrow_metadata_type(data_type):
+    """MetadataType of an Arrow data type"""
+    pa = _pyarrow()
+    if pa.types.is_floating(data_type):
+        return MetadataType.DOUBLE
+    if pa.types.is_integer(data_type):
+        return MetadataType.LONG
+    return MetadataType.STRING
+
+
+def arrow_to_numpy(array):
+    """
+    Turns an Arrow array into a NumPy array for the comm buffers. Numeric
+    arrays without nulls are not copied, other types are sent as strings.
+    Nulls become None.
+    """
+    pa = _pyarrow()
+    if isinstance(array, pa.ChunkedArray):
+        array = array.combine_chunks()
+
+    data_type = array.type
+    if pa.types.is_floating(data_type) or pa.types.is_integer(data_type):
+        if array.null_count == 0:
+            return array.to_numpy(zero_copy_only=False)
+        return np.array(array.to_pylist(), dtype=object)
+
+    if not (pa.types.is_string(data_type) or pa.types.is_large_string(data_type)):
+        array = array.cast(pa.string())
+    values = array.to_numpy(zero_copy_only=False)
+    return values if array.null_count else values.astype(str)
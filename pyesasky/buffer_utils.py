@@ -0,0 +1,78 @@
+import numpy as np
+
+BUFFER_KEY = "__buffer__"
+
+# Integers above this can not be represented exactly by a float64
+MAX_SAFE_INTEGER = 2**53 - 1
+
+
+def pack_buffers(content):
+    """
+    Moves every NumPy array in content into binary comm buffers.
+
+    Arrays are replaced by a small reference dict, {"__buffer__": index,
+    "dtype": ..., "length": ...}, that the frontend resolves back into a
+    typed array (float64) or a list of strings (utf8). Returns the rewritten
+    content and the list of buffers to send along with it.
+    """
+    buffers = []
+    return _pack(content, buffers), buffers
+
+
+def _pack(value, buffers):
+    if isinstance(value, dict):
+        return {key: _pack(item, buffers) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_pack(item, buffers) for item in value]
+    if isinstance(value, np.ndarray):
+        return _pack_array(value, buffers)
+    return value
+
+
+def _pack_array(values, buffers):
+    kind = values.dtype.kind
+
+    if kind == "f" or (kind in "iu" and _is_safe_integer(values)):
+        buffers.append(np.ascontiguousarray(values, dtype="<f8").data)
+        return {BUFFER_KEY: len(buffers) - 1, "dtype": "float64", "length": len(values)}
+
+    if kind in "US":
+        strings = values.astype(str) if kind == "S" else values
+        data, offsets = _encode_strings(strings.tolist())
+        buffers.append(data)
+        buffers.append(offsets.data)
+        return {
+            BUFFER_KEY: len(buffers) - 2,
+            "dtype": "utf8",
+            "offsets": len(buffers) - 1,
+            "length": len(values),
+        }
+
+    # Object arrays, booleans and big integers travel as plain JSON
+    return values.tolist()
+
+
+def _is_safe_integer(values):
+    return len(values) == 0 or (
+        values.max() <= MAX_SAFE_INTEGER and values.min() >= -MAX_SAFE_INTEGER
+    )
+
+
+def _encode_strings(strings):
+    """
+    Encodes strings as a single utf-8 buffer plus the offsets of every string
+    in the decoded (UTF-16) text, so the frontend decodes once and slices.
+    """
+    joined = "".join(strings)
+    if joined.isascii():
+        lengths = np.fromiter(map(len, strings), dtype=np.int64, count=len(strings))
+    else:
+        lengths = np.fromiter(
+            (len(s.encode("utf-16-le")) // 2 for s in strings),
+            dtype=np.int64,
+            count=len(strings),
+        )
+
+    offsets = np.zeros(len(strings) + 1, dtype="<f8")
+    np.cumsum(lengths, out=offsets[1:])
+    return joined.encode("utf-8"), offsets
@@ -0,0 +1,211 @@
+import copy
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from pyesasky.log_utils import logger
+
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_MAX_SIZE = 200 * 1024 * 1024
+
+# Parsed value not found on disk, parsers may return None
+_MISSING = object()
+
+
+def user_cache_dir():
+    """Returns the per-user cache directory for pyesasky, PYESASKY_CACHE_DIR
+    overrides the platform default"""
+    if os.environ.get("PYESASKY_CACHE_DIR"):
+        return Path(os.environ["PYESASKY_CACHE_DIR"])
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or Path.home() / "AppData" / "Local"
+        return Path(base) / "pyesasky" / "Cache"
+    if sys.platform == "darwin":
+        return Path.home() / "Library" / "Caches" / "pyesasky"
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "pyesasky"
+
+
+class HttpCache:
+    """
+    On-disk cache for HTTP resources. Entries younger than ttl are served
+    without any request, older ones are revalidated with ETag and
+    If-Modified-Since. Results parsed from an entry are kept next to it, on
+    disk and in memory, so an unchanged resource is never parsed twice. When
+    the server can not be reached a stale entry is served instead.
+    Entries live in their own directory, clearing the cache or evicting
+    entries never touches other files of the user cache directory.
+    """
+
+    def __init__(self, directory=None, ttl=DEFAULT_TTL, max_size=DEFAULT_MAX_SIZE):
+        self.directory = Path(directory) if directory else user_cache_dir() / "http"
+        self.ttl = ttl
+        self.max_size = max_size
+        self._memory = {}  # (url, parser name) -> (version, parsed value)
+        self._lock = threading.Lock()
+
+    def get(self, url, timeout, refresh=False):
+        """Returns the body of url as text and the version of the entry"""
+        meta = self._read_meta(url)
+        body_path = self._path(url, "body")
+
+        if meta and body_path.is_file():
+            if not refresh and time.time() - meta["fetched"] < self.ttl:
+                return body_path.read_text("utf-8"), meta["version"]
+        else:
+            meta = None
+
+        headers = {}
+        if meta and meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta and meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+        import requests
+
+        try:
+            response = requests.get(url, headers=headers, timeout=timeout)
+            if response.status_code != 304:
+                response.raise_for_status()
+        except requests.RequestException:
+            if meta is None:
+                raise
+            logger.warning("Could not revalidate %s, using cached copy", url)
+            return body_path.read_text("utf-8"), meta["version"]
+
+        if response.status_code == 304:
+            meta["fetched"] = time.time()
+            self._write_meta(url, meta)
+            return body_path.read_text("utf-8"), meta["version"]
+
+        meta = dict(
+            url=url,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+            fetched=time.time(),
+            version=(meta["version"] + 1) if meta else 1,
+        )
+        self._write(body_path, response.content)
+        self._write_meta(url, meta)
+        self._evict()
+        # Decoded like cached bodies, not with the charset requests guesses
+        return response.content.decode("utf-8"), meta["version"]
+
+    def get_parsed(self, url, parse, timeout, dump, load, name, refresh=False):
+        """
+        Returns parse(body of url), reusing the result of a previous parse for
+        as long as the cached body is unchanged. dump(value, path) and
+        load(path) persist the parsed value, name tells parsers apart.
+        """
+        text, version = self.get(url, timeout, refresh)
+        key = (url, name)
+
+        with self._lock:
+            cached = self._memory.get(key)
+        if cached and cached[0] == version:
+            return copy.deepcopy(cached[1])
+
+        parsed_path = self._path(url, f"{name}-{version}")
+        value = _MISSING
+        if parsed_path.is_file():
+            try:
+                value = load(parsed_path)
+            except Exception:  # noqa
+                logger.debug("Discarding unreadable cache entry %s", parsed_path)
+
+        if value is _MISSING:
+            value = parse(text)
+            tmp_path = self._temp_path(parsed_path)
+            try:
+                dump(value, tmp_path)
+                os.replace(tmp_path, parsed_path)
+            finally:
+                tmp_path.unlink(missing_ok=True)
+            self._remove_old_versions(url, name, version)
+
+        with self._lock:
+            self._memory[key] = (version, value)
+        return copy.deepcopy(value)
+
+    def clear(self):
+        """Removes every cached entry"""
+        with self._lock:
+            self._memory.clear()
+        for path in self._entry_files():
+            path.unlink(missing_ok=True)
+
+    def _path(self, url, kind):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return self.directory / f"{key}.{kind}"
+
+    def _read_meta(self, url):
+        try:
+            with open(self._path(url, "meta"), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, url, meta):
+        self._write(self._path(url, "meta"), json.dumps(meta).encode("utf-8"))
+
+    def _write(self, path, content):
+        tmp_path = self._temp_path(path)
+        try:
+            tmp_path.write_bytes(content)
+            os.replace(tmp_path, path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+    def _temp_path(self, path):
+        """New empty file to write path to before moving it in place, unique
+        so concurrent writers of the same entry never share one. It is named
+        after the entry so eviction counts it with it."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            dir=self.directory, prefix=path.name + ".", suffix=".tmp", delete=False
+        ) as f:
+            return Path(f.name)
+
+    def _remove_old_versions(self, url, name, version):
+        stem = self._path(url, name).name
+        for path in self.directory.glob(stem + "-*"):
+            if path.name != f"{stem}-{version}":
+                path.unlink(missing_ok=True)
+
+    def _entry_files(self):
+        if not self.directory.is_dir():
+            return []
+        return [path for path in self.directory.iterdir() if path.is_file()]
+
+    def _evict(self):
+        """Removes the least recently fetched entries above max_size"""
+        entries = {}
+        for path in self._entry_files():
+            stat = path.stat()
+            key = path.name.split(".")[0]
+            size, mtime = entries.get(key, (0, 0))
+            entries[key] = (size + stat.st_size, max(mtime, stat.st_mtime))
+
+        total = sum(size for size, _ in entries.values())
+        for key, (size, _) in sorted(entries.items(), key=lambda e: e[1][1]):
+            if total <= self.max_size:
+                break
+            for path in self.directory.glob(key + ".*"):
+                path.unlink(missing_ok=True)
+            total -= size
+
+
+_default_cache = None
+
+
+def get_cache():
+    """Returns the cache shared by all widgets"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = HttpCache()
+    return _default_cache
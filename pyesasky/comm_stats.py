@@ -0,0 +1,129 @@
+import threading
+import time
+from collections import deque
+
+import pyesasky.constants as const
+from pyesasky.log_utils import logger
+
+STATS_COLUMNS = (
+    "started",
+    "event",
+    "msg_id",
+    "status",
+    "serialize",
+    "send",
+    "wait",
+    "parse",
+    "payload_bytes",
+    "sent_bytes",
+)
+
+
+class CommRecord:
+    """
+    Timings of one message, filled in as it goes through the comm. Phases
+    are in seconds and None when the message did not go through them:
+    serialize -- JSON encoding and compression of the content
+    send -- handing the message to the kernel comm
+    wait -- from the send until the response arrived
+    parse -- turning the response into the result of the call
+    payload_bytes is the size of the JSON content and buffers of the message,
+    sent_bytes the size of what was sent once compressed. Encoding only to
+    count them is not worth it, they stay None unless the message could be
+    compressed or callbacks are registered.
+    """
+
+    __slots__ = STATS_COLUMNS + ("awaits_response", "sent_at")
+
+    def __init__(self, event, msg_id, awaits_response):
+        self.started = time.time()
+        self.event = event
+        self.msg_id = msg_id
+        self.status = "pending"
+        self.serialize = None
+        self.send = None
+        self.wait = None
+        self.parse = None
+        self.payload_bytes = None
+        self.sent_bytes = None
+        self.awaits_response = awaits_response
+        self.sent_at = None
+
+    def received(self):
+        if self.sent_at is not None:
+            self.wait = time.perf_counter() - self.sent_at
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in STATS_COLUMNS}
+
+
+class CommStats:
+    """
+    Ring buffer of the CommRecords of the last messages, with callbacks
+    called with the record dict when a message starts and ends, e.g. to
+    open and close tracing spans.
+    """
+
+    def __init__(self, size=const.STATS_SIZE):
+        self._records = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self._on_start = []
+        self._on_end = []
+
+    def start(self, event, msg_id, awaits_response):
+        record = CommRecord(event, msg_id, awaits_response)
+        with self._lock:
+            self._records.append(record)
+        self._notify(self._on_start, record)
+        return record
+
+    def finish(self, record, status):
+        record.status = status
+        self._notify(self._on_end, record)
+
+    def add_callback(self, on_end=None, on_start=None):
+        """
+        Registers callbacks taking the record dict of a message
+
+        Arguments:
+        on_end -- (Callable, optional) Called once the message is sent, or
+        answered for requests, or timed out
+        on_start -- (Callable, optional) Called before the message is sent
+        """
+        if on_end is not None:
+            self._on_end.append(on_end)
+        if on_start is not None:
+            self._on_start.append(on_start)
+
+    @property
+    def has_callbacks(self):
+        return bool(self._on_start or self._on_end)
+
+    def remove_callback(self, callback):
+        for callbacks in (self._on_end, self._on_start):
+            if callback in callbacks:
+                callbacks.remove(callback)
+
+    def _notify(self, callbacks, record):
+        for callback in list(callbacks):
+            try:
+                callback(record.to_dict())
+            except Exception:  # noqa
+                logger.exception("Stats callback %s failed", callback)
+
+    def records(self):
+        """Returns the record dicts of the last messages, oldest first"""
+        with self._lock:
+            return [record.to_dict() for record in self._records]
+
+    def to_dataframe(self):
+        """Returns the last records as a pandas DataFrame, one row per message"""
+        import pandas as pd
+
+        frame = pd.DataFrame(self.records(), columns=list(STATS_COLUMNS))
+        frame["started"] = pd.to_datetime(frame["started"], unit="s", utc=True)
+        return frame
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
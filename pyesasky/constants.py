@@ -20,12 +20,51 @@ MESSAGE_ERROR_AVAILABLE: Final = "available"
 MESSAGE_EXTRAS_MESSAGE: Final = "message"
 
 MESSAGE_INIT_ID_FLAG: Final = "__init__"
+# Codecs the frontend can decompress, listed in its handshake answer
+MESSAGE_COMPRESSION: Final = "compression"
 
 # Message types
 MESSAGE_TYPE_DOWNLOAD: Final = "esasky_jupyter_download"
 
+# Events handled by the pyesasky frontend before reaching ESASky
+EVENT_APPEND_OVERLAY: Final = "pyesaskyAppendOverlay"
+EVENT_UPDATE_OVERLAY: Final = "pyesaskyUpdateOverlay"
+EVENT_REMOVE_FROM_OVERLAY: Final = "pyesaskyRemoveFromOverlay"
+EVENT_BATCH: Final = "pyesaskyBatch"
+EVENT_COMPRESSED: Final = "pyesaskyCompressed"
+
+# Messages whose JSON is bigger than this many bytes are sent compressed
+# when the frontend supports it
+COMPRESSION_THRESHOLD: Final = 64 * 1024
+
+# Messages sent before the frontend answered the handshake are held up to
+# this many buffer bytes, fire-and-forget messages past it are dropped
+COMM_QUEUE_MAX_BYTES: Final = 256 * 1024 * 1024
+
+# Number of messages whose timings are kept, see KernelComm.stats
+STATS_SIZE: Final = 1000
+
+# MOCs are degraded to the deepest order needing at most this many cells
+MOC_MAX_CELLS: Final = 100_000
+
+# Footprints sent with level of detail are simplified to one pixel of a
+# view this many pixels wide, and re-sent once zooming in this much
+LOD_VIEW_PIXELS: Final = 1000
+LOD_REFINE_FACTOR: Final = 2
+
+# Culled catalogues send at most this many sources per view, and are sent
+# again from scratch once the frontend would hold more than twice that
+CULL_MAX_SOURCES: Final = 50_000
+CULL_HELD_FACTOR: Final = 2
+# Views are widened by this factor so small pans need no new sources
+CULL_MARGIN: Final = 1.25
+
 
 # NOTICES
+# PyPI is asked for the latest release at most this often, in seconds, and
+# never when this environment variable is set
+VERSION_CHECK_INTERVAL: Final = 24 * 60 * 60
+VERSION_CHECK_SKIP_ENV: Final = "PYESASKY_NO_VERSION_CHECK"
 VERSION_WARNING_HTML: Final = """
     <div style="    background-color: #fff3cd;
     background-color: #fff3cd;
@@ -0,0 +1,200 @@
+import functools
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tarfile
+import time
+import zipfile
+import zlib
+from collections import namedtuple
+
+from pyesasky.cache_utils import user_cache_dir
+from pyesasky.log_utils import logger
+
+ARCHIVE_EXTENSIONS = (".tar", ".zip")
+INDEX_SUFFIX = ".pyesasky-index.json"
+_INDEX_FORMAT = 1
+
+# Offset of the name and extra field lengths in a zip local file header
+_ZIP_HEADER_LENGTHS = 26
+_ZIP_HEADER_SIZE = 30
+
+Member = namedtuple("Member", "offset size compressed_size method mtime etag")
+
+
+def is_archive(path):
+    """Whether path is a tar or zip file that can hold a HiPS"""
+    return path.lower().endswith(ARCHIVE_EXTENSIONS) and os.path.isfile(path)
+
+
+def open_archive(path):
+    """Returns the HiPSArchive for path, shared until the archive changes"""
+    path = os.path.abspath(path)
+    archive_stat = os.stat(path)
+    return _open_archive(path, archive_stat.st_size, archive_stat.st_mtime_ns)
+
+
+def _normalize(name):
+    while name.startswith("./"):
+        name = name[2:]
+    return name.lstrip("/")
+
+
+@functools.lru_cache(maxsize=16)
+def _open_archive(path, size, mtime_ns):
+    return HiPSArchive(path)
+
+
+class HiPSArchive:
+    """
+    A HiPS packed in an uncompressed tar or a zip archive, read straight
+    from a memory map of the archive. The offsets of all members are
+    indexed once and the index is persisted next to the archive, or in the
+    user cache dir when that is not writable, so reopening it is instant.
+    Member names are relative to the directory holding the HiPS properties.
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        archive_stat = os.stat(self.path)
+        self._version = [archive_stat.st_size, archive_stat.st_mtime_ns]
+
+        with open(self.path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self._members = self._load_index()
+        if self._members is None:
+            self._members = self._build_index()
+            self._save_index()
+
+    def member(self, name):
+        """Returns the Member stored under name, None if there is none"""
+        entry = self._members.get(name)
+        if entry is None:
+            return None
+        offset, size, compressed_size, method, mtime = entry
+        etag = f"{size:x}-{offset:x}-{self._version[1]:x}"
+        return Member(offset, size, compressed_size, method, mtime, etag)
+
+    def read_member(self, member):
+        data = self._map[member.offset:member.offset + member.compressed_size]
+        if member.method == zipfile.ZIP_DEFLATED:
+            return zlib.decompress(data, -zlib.MAX_WBITS)
+        return data
+
+    def read(self, name):
+        member = self.member(name)
+        if member is None:
+            raise FileNotFoundError(f"{name} not found in {self.path}")
+        return self.read_member(member)
+
+    def _build_index(self):
+        start = time.perf_counter()
+        if zipfile.is_zipfile(self.path):
+            entries = self._index_zip()
+        else:
+            entries = self._index_tar()
+
+        members = {_normalize(name): entry for name, entry in entries.items()}
+
+        # The HiPS is the shallowest directory with a properties file
+        properties = [name for name in members if name.split("/")[-1] == "properties"]
+        root = min(properties, key=lambda name: name.count("/"), default="properties")
+        prefix = root[:-len("properties")]
+        if prefix:
+            members = {
+                name[len(prefix):]: entry
+                for name, entry in members.items()
+                if name.startswith(prefix)
+            }
+
+        logger.debug(
+            "Indexed %s members of %s in %.1fs",
+            len(members), self.path, time.perf_counter() - start,
+        )
+        return members
+
+    def _index_zip(self):
+        entries = {}
+        with zipfile.ZipFile(self.path) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or info.flag_bits & 0x1:
+                    continue
+                if info.compress_type not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+                    logger.warning(
+                        "Skipping %s, unsupported compression", info.filename
+                    )
+                    continue
+
+                # The local header can have another extra field than the
+                # central directory, the data starts right after it
+                name_length, extra_length = struct.unpack_from(
+                    "<2H", self._map, info.header_offset + _ZIP_HEADER_LENGTHS
+                )
+                offset = (
+                    info.header_offset + _ZIP_HEADER_SIZE + name_length + extra_length
+                )
+                entries[info.filename] = [
+                    offset,
+                    info.file_size,
+                    info.compress_size,
+                    info.compress_type,
+                    time.mktime(info.date_time + (0, 0, -1)),
+                ]
+        return entries
+
+    def _index_tar(self):
+        entries = {}
+        try:
+            with tarfile.open(self.path, "r:") as archive:
+                for info in archive:
+                    if info.isreg() and not info.issparse():
+                        entries[info.name] = [
+                            info.offset_data,
+                            info.size,
+                            info.size,
+                            zipfile.ZIP_STORED,
+                            info.mtime,
+                        ]
+        except tarfile.ReadError as read_error:
+            raise ValueError(
+                f"{self.path} is not an uncompressed tar archive, compressed "
+                "archives can not be memory mapped"
+            ) from read_error
+        return entries
+
+    def _index_paths(self):
+        digest = hashlib.sha256(self.path.encode("utf-8")).hexdigest()
+        return [
+            self.path + INDEX_SUFFIX,
+            os.path.join(user_cache_dir(), "archives", digest + INDEX_SUFFIX),
+        ]
+
+    def _load_index(self):
+        for index_path in self._index_paths():
+            try:
+                with open(index_path, "r") as f:
+                    index = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if (
+                index.get("format") == _INDEX_FORMAT
+                and index.get("archive") == self._version
+            ):
+                return index["members"]
+        return None
+
+    def _save_index(self):
+        index = dict(format=_INDEX_FORMAT, archive=self._version, members=self._members)
+        for index_path in self._index_paths():
+            try:
+                os.makedirs(os.path.dirname(index_path), exist_ok=True)
+                tmp_path = index_path + ".tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump(index, f, separators=(",", ":"))
+                os.replace(tmp_path, index_path)
+                return
+            except OSError:
+                logger.debug("Could not write archive index to %s", index_path)
@@ -0,0 +1,223 @@
+import functools
+import mimetypes
+import os
+import stat
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import tornado.httpserver
+import tornado.web
+from tornado.ioloop import IOLoop
+from tornado.netutil import bind_sockets
+
+from pyesasky.log_utils import logger
+
+# Ports tried in order before falling back to one picked by the OS
+HIPS_SERVER_PORTS = range(8900, 9000)
+
+# Seconds browsers may reuse a tile before revalidating it
+TILE_MAX_AGE = 3600
+
+TILE_CACHE_SIZE = 64 * 1024 * 1024
+# Bigger files are streamed from disk instead of being cached
+TILE_CACHE_MAX_FILE_SIZE = 1024 * 1024
+STREAM_CHUNK_SIZE = 64 * 1024
+
+_READ_WORKERS = 8
+
+
+class TileCache:
+    """Thread safe LRU of small files, bounded by their total size in bytes.
+    Entries are keyed by path and versioned by modification time and size."""
+
+    def __init__(
+        self, max_size=TILE_CACHE_SIZE, max_file_size=TILE_CACHE_MAX_FILE_SIZE
+    ):
+        self.max_size = max_size
+        self.max_file_size = max_file_size
+        self._entries = OrderedDict()  # path -> (version, data)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, path, version):
+        """Returns the cached content of path, None on a miss"""
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(path)
+            return entry[1]
+
+    def load(self, path, version):
+        """Reads path and caches its content"""
+        with open(path, "rb") as f:
+            data = f.read()
+
+        with self._lock:
+            previous = self._entries.pop(path, None)
+            if previous:
+                self._size -= len(previous[1])
+            self._entries[path] = (version, data)
+            self._size += len(data)
+            while self._size > self.max_size:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+        return data
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+class HiPSFileHandler(tornado.web.RequestHandler):
+    """
+    Serves the tiles of a local HiPS. Small files are kept in an LRU cache,
+    bigger ones are streamed in chunks, and all reads happen in a thread
+    pool so tiles load concurrently. Responses carry ETag, Last-Modified
+    and Cache-Control headers, a browser revalidating a tile gets a 304.
+    """
+
+    tile_cache = TileCache()
+    _read_pool = ThreadPoolExecutor(_READ_WORKERS, thread_name_prefix="pyesasky-hips")
+
+    def initialize(self, base_url):
+        self.root = os.path.abspath(base_url)
+
+    def set_default_headers(self):
+        self.set_header("Access-Control-Allow-Origin", "*")
+
+    def prepare(self):
+        origin = self.request.host.split(":")[0]
+        if origin != "localhost":
+            raise tornado.web.HTTPError(status_code=403)
+
+    def compute_etag(self):
+        # The ETag is set from the file size and modification time in get,
+        # hashing every tile is too slow
+        return None
+
+    def head(self, path):
+        return self.get(path, include_body=False)
+
+    async def get(self, path, include_body=True):
+        file_location = os.path.abspath(os.path.join(self.root, path))
+        if not file_location.startswith(os.path.join(self.root, "")):
+            raise tornado.web.HTTPError(status_code=403)
+        try:
+            file_stat = os.stat(file_location)
+        except OSError:
+            raise tornado.web.HTTPError(status_code=404)
+        if not stat.S_ISREG(file_stat.st_mode):
+            raise tornado.web.HTTPError(status_code=404)
+
+        etag = f"{file_stat.st_size:x}-{file_stat.st_mtime_ns:x}"
+        if not self._set_tile_headers(
+            file_location, file_stat.st_size, etag, file_stat.st_mtime, include_body
+        ):
+            return
+
+        version = (file_stat.st_mtime_ns, file_stat.st_size)
+        data = self.tile_cache.lookup(file_location, version)
+        if data is None and file_stat.st_size <= self.tile_cache.max_file_size:
+            data = await IOLoop.current().run_in_executor(
+                self._read_pool, self.tile_cache.load, file_location, version
+            )
+
+        if data is not None:
+            self.write(data)
+            return
+
+        with open(file_location, "rb") as f:
+            while True:
+                chunk = await IOLoop.current().run_in_executor(
+                    self._read_pool, f.read, STREAM_CHUNK_SIZE
+                )
+                if not chunk:
+                    break
+                self.write(chunk)
+                await self.flush()
+
+    def _set_tile_headers(self, name, size, etag, mtime, include_body):
+        """Sets the caching headers of a tile, returns whether its content
+        should be written, False for HEAD requests and unchanged tiles"""
+        modified = int(mtime)
+        self.set_header("Etag", f'"{etag}"')
+        self.set_header("Last-Modified", datetime.fromtimestamp(modified, timezone.utc))
+        self.set_header("Cache-Control", f"max-age={TILE_MAX_AGE}")
+        self.set_header("Content-Type", _content_type(name))
+
+        if self.check_etag_header() or self._modified_before(modified):
+            self.set_status(304)
+            return False
+
+        self.set_header("Content-Length", size)
+        return include_body
+
+    def _modified_before(self, modified):
+        """Whether the client copy, per If-Modified-Since, is still current"""
+        since = self.request.headers.get("If-Modified-Since")
+        if not since or self.request.headers.get("If-None-Match"):
+            return False
+        try:
+            return modified <= parsedate_to_datetime(since).timestamp()
+        except (TypeError, ValueError):
+            return False
+
+
+class HiPSArchiveHandler(HiPSFileHandler):
+    """Serves the tiles of a local HiPS packed in a tar or zip archive,
+    see pyesasky.hips_archive.HiPSArchive"""
+
+    def initialize(self, archive):
+        self.archive = archive
+
+    async def get(self, path, include_body=True):
+        member = self.archive.member(path)
+        if member is None:
+            raise tornado.web.HTTPError(status_code=404)
+
+        if self._set_tile_headers(
+            path, member.size, member.etag, member.mtime, include_body
+        ):
+            # Inflating a zip member can take long, not on the IOLoop
+            data = await IOLoop.current().run_in_executor(
+                self._read_pool, self.archive.read_member, member
+            )
+            self.write(data)
+
+
+@functools.lru_cache(maxsize=64)
+def _content_type_of(extension):
+    return mimetypes.guess_type("tile" + extension)[0] or "application/octet-stream"
+
+
+def _content_type(path):
+    return _content_type_of(os.path.splitext(path)[1].lower())
+
+
+def start_server(ports=None):
+    """
+    Starts an empty tornado application listening on the first free port of
+    ports, HIPS_SERVER_PORTS by default, or on any port when none is free.
+    Returns the application, the server and the port.
+    """
+    if ports is None:
+        ports = HIPS_SERVER_PORTS
+    app = tornado.web.Application([])
+    server = tornado.httpserver.HTTPServer(app)
+
+    for port in list(ports) + [0]:
+        try:
+            sockets = bind_sockets(port)
+        except OSError:
+            continue
+        server.add_sockets(sockets)
+        port = sockets[0].getsockname()[1]
+        logger.debug("Local HiPS server listening on port %s", port)
+        return app, server, port
+
+    raise OSError("No free port for the local HiPS server")
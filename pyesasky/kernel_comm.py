@@ -1,86 +1,193 @@
+import asyncio
+import json
 import time
 import threading
 import uuid
-from typing import Callable, Dict, Any, Optional
-
-from ipykernel.comm import Comm
+import zlib
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import TYPE_CHECKING, Callable, Dict, Any, List, Optional, Tuple
 
 import pyesasky.constants as const
 import pyesasky.message_utils as m
+from pyesasky.comm_stats import CommRecord, CommStats
 from pyesasky.exceptions import CommNotInitializedError
 from pyesasky.log_utils import logger
 
+if TYPE_CHECKING:
+    from ipykernel.comm import Comm
+
 ContentType = Dict[str, Any]
 CommCallback = Callable[[str, ContentType], None]
 
+# Minimum seconds between two handshake attempts while messages are queued
+HANDSHAKE_RETRY_INTERVAL = 1
+
+# Codecs pyesasky can compress with, in order of preference. Browsers only
+# decompress gzip and deflate natively, zstd would need a bundled decoder.
+COMPRESSORS = {"deflate": lambda data: zlib.compress(data, 1)}
+
 
 class KernelComm:
 
-    def __init__(self, widget_comm: Comm, widget_on_msg: Optional[CommCallback] = None):
+    def __init__(
+        self, widget_comm: "Comm", widget_on_msg: Optional[CommCallback] = None
+    ):
         self.widget_comm = widget_comm
         self.widget_on_msg = widget_on_msg
-        self.comm_established = False
         self.default_timeout = 5
+        # Set to None to never compress
+        self.compression_threshold = const.COMPRESSION_THRESHOLD
 
-        self._pending = {}  # msg_id -> {"event": Event, "response": dict}
+        self._pending: Dict[str, Future] = {}  # msg_id -> Future of the response
         self._lock = threading.Lock()
 
+        # Messages sent before the frontend answered the handshake
+        self._established = threading.Event()
+        self._queue: List[Tuple[ContentType, Any, Optional[CommRecord]]] = []
+        self._queued_bytes = 0
+        # Set to None to queue without limit
+        self.queue_max_bytes = const.COMM_QUEUE_MAX_BYTES
+        self._queue_lock = threading.Lock()
+        self._last_handshake = 0.0
+        self._codec = None  # Agreed on in the handshake
+
+        # Timings of the last messages, see CommStats
+        self.stats = CommStats()
+
         if not self._valid_widget_comm(widget_comm):
             raise CommNotInitializedError("The comm is not valid")
 
         self.widget_comm.on_msg(self._on_message)
+        self._start_handshake()
+
+    @property
+    def comm_established(self):
+        return self._established.is_set()
 
     def send_message(self, content, buffers=None) -> Optional[str]:
         """
-        Sends a message to the frontend. Initializes comm first if needed.
+        Sends a message to the frontend. Messages sent before the handshake
+        completed are queued and flushed once the frontend is ready.
         For request/response, use send_and_wait() instead.
         """
-        if not self.comm_established and not self._initialize_comm(buffers):
-            raise CommNotInitializedError("Communication could not be established.")
-
         return self._send_message(content, buffers)
 
-    def send_and_wait(self, content, buffers=None, timeout: float = 5):
+    def send_batch(self, contents) -> Optional[str]:
+        """
+        Sends several fire-and-forget messages as a single comm message,
+        the frontend dispatches them in order.
+        """
+        for content in contents:
+            content[const.MESSAGE_CONTENT_ID] = str(uuid.uuid4())
+            content[const.MESSAGE_ORIGIN] = "pyesasky"
+
+        return self._send_message(
+            {"event": const.EVENT_BATCH, "content": {"events": contents}}, None
+        )
+
+    def send_async(self, content, buffers=None) -> Future:
+        """
+        Sends a message without waiting for the response. The returned future
+        resolves with the response, so many requests can be in flight at once.
+        """
+        future, record = self._request(content, buffers)
+
+        def resolved(done):
+            record.received()
+            self.stats.finish(record, "cancelled" if done.cancelled() else "ok")
+
+        future.add_done_callback(resolved)
+        return future
+
+    def send_and_wait(self, content, buffers=None, timeout: float = 5, parse=None):
         """
         Sends a message and waits for response. Registers listener before
-        sending to avoid missing fast responses.
+        sending to avoid missing fast responses. When given, parse is applied
+        to the response and its result returned instead.
         """
-        if not self.comm_established and not self._initialize_comm(buffers):
-            raise CommNotInitializedError("Communication could not be established.")
+        future, record = self._request(content, buffers)
 
-        msg_id = str(uuid.uuid4())
-        event = threading.Event()
+        try:
+            response = future.result(timeout=self._response_timeout(timeout))
+        except FutureTimeoutError:
+            self._raise_timeout(record)
 
-        with self._lock:
-            self._pending[msg_id] = {"event": event, "response": None}
+        return self._complete(record, response, parse)
 
-        content[const.MESSAGE_CONTENT_ID] = msg_id
-        content[const.MESSAGE_ORIGIN] = "pyesasky"
+    async def send_aio(self, content, buffers=None, timeout: float = 5, parse=None):
+        """
+        Coroutine version of send_and_wait, the response is awaited on an
+        asyncio future so the event loop keeps running meanwhile.
+        """
+        future, record = self._request(content, buffers)
+
+        try:
+            response = await asyncio.wait_for(
+                asyncio.wrap_future(future), self._response_timeout(timeout)
+            )
+        except asyncio.TimeoutError:
+            self._raise_timeout(record)
+
+        return self._complete(record, response, parse)
 
+    def _request(self, content, buffers):
+        """Sends a request, returns the future of its response and its record"""
         if not self._valid_widget_comm(self.widget_comm):
-            with self._lock:
-                self._pending.pop(msg_id, None)
             raise CommNotInitializedError("Widget comm is not valid.")
 
-        logger.debug('Sending message %s', content)
-        self.widget_comm.send(
-            data={const.MESSAGE_METHOD: "custom", const.MESSAGE_CONTENT: content},
-            buffers=buffers,
-        )
-
-        if not event.wait(timeout=timeout):
-            with self._lock:
-                self._pending.pop(msg_id, None)
-            raise TimeoutError(f"Timed out waiting for message with ID '{msg_id}'")
+        msg_id = str(uuid.uuid4())
+        future = Future()
 
         with self._lock:
-            data = self._pending.pop(msg_id, None)
+            self._pending[msg_id] = future
 
-        if data and data["response"]:
-            logger.debug("Message received %s", data["response"])
-            return data["response"]
-
-        raise TimeoutError(f"No response received for message ID '{msg_id}'")
+        content[const.MESSAGE_CONTENT_ID] = msg_id
+        content[const.MESSAGE_ORIGIN] = "pyesasky"
+        record = self.stats.start(content.get("event"), msg_id, awaits_response=True)
+        self._dispatch(content, buffers, record)
+        return future, record
+
+    def _complete(self, record, response, parse):
+        record.received()
+        if not response:
+            self.stats.finish(record, "empty")
+            raise TimeoutError(f"No response received for message ID '{record.msg_id}'")
+
+        logger.debug("Message received %s", response)
+        if parse is not None:
+            start = time.perf_counter()
+            try:
+                response = parse(response)
+            except Exception:
+                self.stats.finish(record, "error")
+                raise
+            record.parse = time.perf_counter() - start
+
+        self.stats.finish(record, "ok")
+        return response
+
+    def discard(self, msg_id):
+        """Stops waiting for the response to msg_id"""
+        with self._lock:
+            future = self._pending.pop(msg_id, None)
+        if future is not None:
+            future.cancel()
+
+    def _response_timeout(self, timeout):
+        # A request queued behind the handshake also waits for the frontend
+        if self.comm_established:
+            return timeout
+        return timeout + self.default_timeout
+
+    def _raise_timeout(self, record):
+        msg_id = record.msg_id
+        self.discard(msg_id)
+        if not self.comm_established:
+            self._drop_queued(msg_id)
+            self.stats.finish(record, "not_established")
+            raise CommNotInitializedError("Communication could not be established.")
+        self.stats.finish(record, "timeout")
+        raise TimeoutError(f"Timed out waiting for message with ID '{msg_id}'")
 
     def _on_message(self, message):
         """Routes incoming messages to pending waiters or the widget callback."""
@@ -93,64 +200,187 @@ class KernelComm:
 
         if inner.get(const.MESSAGE_INIT):
             logger.debug("Comms established")
-            self.comm_established = True
-            with self._lock:
-                pending = self._pending.get(const.MESSAGE_INIT_ID_FLAG)
-                if pending:
-                    pending["response"] = raw_content
-                    pending["event"].set()
+            self._negotiate_compression(inner.get(const.MESSAGE_COMPRESSION) or [])
+            self._flush_queue()
             return
 
         # Check for response to pending request
         msg_id = m.get_message_id(raw_content)
-        if msg_id:
-            with self._lock:
-                pending = self._pending.get(msg_id)
-                if pending:
-                    pending["response"] = raw_content
-                    pending["event"].set()
-                    return
+        if msg_id and self._resolve(msg_id, raw_content):
+            return
 
         # Unsolicited message (e.g. download request)
         if content and const.MESSAGE_CONTENT_TYPE in content and self.widget_on_msg:
             self.widget_on_msg(content[const.MESSAGE_CONTENT_TYPE], content)
 
+    def _resolve(self, msg_id, response):
+        with self._lock:
+            future = self._pending.pop(msg_id, None)
+        if future is None or not future.set_running_or_notify_cancel():
+            return False
+        future.set_result(response)
+        return True
+
     def _send_message(self, content, buffers) -> Optional[str]:
         msg_id = str(uuid.uuid4())
         content[const.MESSAGE_CONTENT_ID] = msg_id
         content[const.MESSAGE_ORIGIN] = "pyesasky"
 
         if self._valid_widget_comm(self.widget_comm):
-            logger.debug('Sending message %s', content)
-            self.widget_comm.send(
-                data={const.MESSAGE_METHOD: "custom", const.MESSAGE_CONTENT: content},
-                buffers=buffers,
+            record = self.stats.start(
+                content.get("event"), msg_id, awaits_response=False
             )
+            self._dispatch(content, buffers, record)
             return msg_id
 
         return None
 
-    def _initialize_comm(self, buffers):
-        event = threading.Event()
-        with self._lock:
-            self._pending[const.MESSAGE_INIT_ID_FLAG] = {"event": event, "response": None}
+    def _dispatch(self, content, buffers, record=None):
+        """Sends content now, or queues it until the handshake completes"""
+        with self._queue_lock:
+            queued = not self._established.is_set()
+            if queued:
+                self._enqueue(content, buffers, record)
+            else:
+                self._send_now(content, buffers, record)
+
+        if queued:
+            self._start_handshake(throttle=True)
+
+    def _enqueue(self, content, buffers, record):
+        """Queues a message, fire-and-forget ones are dropped once the
+        queue holds queue_max_bytes of buffers, e.g. the chunks of a large
+        file overlaid before the widget is displayed"""
+        size = _buffers_size(buffers)
+        awaits_response = record is not None and record.awaits_response
+        if (
+            not awaits_response
+            and self.queue_max_bytes is not None
+            and self._queued_bytes + size > self.queue_max_bytes
+        ):
+            logger.warning(
+                "Dropped %s, the frontend has not answered yet and %s bytes are "
+                "queued. Display the widget before sending large overlays",
+                content.get("event"),
+                self._queued_bytes,
+            )
+            if record is not None:
+                self.stats.finish(record, "dropped")
+            return
+        self._queue.append((content, buffers, record))
+        self._queued_bytes += size
 
-        self._send_message({"event": "initTest"}, buffers)
+    def _negotiate_compression(self, codecs):
+        self._codec = next((codec for codec in COMPRESSORS if codec in codecs), None)
+        logger.debug("Compression codec %s", self._codec)
 
-        if not event.wait(timeout=self.default_timeout):
-            with self._lock:
-                self._pending.pop(const.MESSAGE_INIT_ID_FLAG, None)
-            self.comm_established = False
-            return False
+    def _send_now(self, content, buffers, record=None):
+        logger.debug('Sending message %s', content)
+        start = time.perf_counter()
+        payload_bytes = sent_bytes = None
+        # Encoding is only worth it when the payload may be compressed or the
+        # byte counts reach a callback, they are those of the JSON and buffers
+        # the comm sends, before and after compression
+        compressible = self._codec and self.compression_threshold is not None
+        if compressible or self.stats.has_callbacks:
+            payload = _encode(content)
+            payload_bytes = sent_bytes = _message_size(payload, buffers)
+            if (
+                compressible
+                and payload is not None
+                and len(payload) > self.compression_threshold
+            ):
+                content, buffers = self._compress(content, payload, buffers)
+                sent_bytes = _message_size(_encode(content), buffers)
+
+        sending = time.perf_counter()
+        self.widget_comm.send(
+            data={const.MESSAGE_METHOD: "custom", const.MESSAGE_CONTENT: content},
+            buffers=buffers,
+        )
 
-        with self._lock:
-            self._pending.pop(const.MESSAGE_INIT_ID_FLAG, None)
+        if record is not None:
+            record.sent_at = time.perf_counter()
+            record.serialize = sending - start if payload_bytes is not None else None
+            record.send = record.sent_at - sending
+            record.payload_bytes = payload_bytes
+            record.sent_bytes = sent_bytes
+            if not record.awaits_response:
+                self.stats.finish(record, "sent")
 
-        self.comm_established = True
-        time.sleep(0.5)
-        return True
+    def _compress(self, content, payload, buffers):
+        """
+        Moves the JSON payload of content into a compressed first buffer,
+        the frontend decompresses it and shifts the buffers back. Returns
+        the content and buffers to send.
+        """
+        compressed = COMPRESSORS[self._codec](payload)
+        logger.debug("Compressed %s bytes to %s", len(payload), len(compressed))
+        wrapper = {
+            "event": const.EVENT_COMPRESSED,
+            "codec": self._codec,
+            const.MESSAGE_CONTENT_ID: content.get(const.MESSAGE_CONTENT_ID),
+            const.MESSAGE_ORIGIN: "pyesasky",
+        }
+        return wrapper, [compressed] + list(buffers or [])
+
+    def _flush_queue(self):
+        # Flushing under the queue lock keeps queued messages ahead of new ones
+        with self._queue_lock:
+            self._established.set()
+            queued, self._queue = self._queue, []
+            self._queued_bytes = 0
+            for content, buffers, record in queued:
+                self._send_now(content, buffers, record)
+
+    def _drop_queued(self, msg_id):
+        with self._queue_lock:
+            self._queue = [
+                queued
+                for queued in self._queue
+                if queued[0].get(const.MESSAGE_CONTENT_ID) != msg_id
+            ]
+            self._queued_bytes = sum(_buffers_size(queued[1]) for queued in self._queue)
+
+    def _start_handshake(self, throttle=False):
+        """
+        Asks the frontend to confirm it is ready, without waiting for the
+        answer. The frontend also starts a handshake itself once the ESASky
+        iframe has loaded, whichever answer arrives first flushes the queue.
+        """
+        now = time.monotonic()
+        if throttle and now - self._last_handshake < HANDSHAKE_RETRY_INTERVAL:
+            return
+        self._last_handshake = now
+
+        if self._valid_widget_comm(self.widget_comm):
+            self._send_now(
+                {
+                    "event": "initTest",
+                    const.MESSAGE_CONTENT_ID: str(uuid.uuid4()),
+                    const.MESSAGE_ORIGIN: "pyesasky",
+                },
+                None,
+            )
 
-    def _valid_widget_comm(self, comm: Comm):
+    def _valid_widget_comm(self, comm: "Comm"):
         return comm is not None and (
             comm.kernel is not None if hasattr(comm, "kernel") else True
         )
+
+
+def _encode(content):
+    """JSON of content as sent by the comm, None if it is not plain JSON"""
+    try:
+        return json.dumps(content, separators=(",", ":")).encode("utf-8")
+    except (TypeError, ValueError):
+        return None
+
+
+def _buffers_size(buffers):
+    return sum(memoryview(buffer).nbytes for buffer in buffers or [])
+
+
+def _message_size(payload, buffers):
+    """Bytes of a message, its buffers only when the JSON could not be encoded"""
+    return (len(payload) if payload is not None else 0) + _buffers_size(buffers)
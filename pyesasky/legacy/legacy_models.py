@@ -3,6 +3,8 @@ from pyesasky.legacy.legacy_utils import deprecated
 
 class LCatalogue:
 
+    __slots__ = ()
+
     @deprecated("add_source")
     def addSource(self, name, ra, dec, id=None, *details):
         pass
@@ -14,6 +16,8 @@ class LCatalogue:
 
 class LFootprintSet:
 
+    __slots__ = ()
+
     @deprecated("add_footprint")
     def addFootprint(self, name, stcs, id, centralRADeg=[], centralDecDeg=[], *details):
         pass
@@ -25,6 +29,8 @@ class LFootprintSet:
 
 class LHiPS:
 
+    __slots__ = ()
+
     @deprecated("to_dict")
     def toDict(self):
         pass
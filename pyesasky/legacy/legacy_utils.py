@@ -16,6 +16,7 @@ def deprecated(new_method_name, with_args=False):
             # Call the new method
             return new_method(*args, **kwargs)
 
+        wrapper.new_method_name = new_method_name
         return wrapper
 
     return decorator
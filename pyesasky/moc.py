@@ -0,0 +1,304 @@
+import json
+import re
+
+import numpy as np
+
+# Deepest HEALPix order of a MOC, cells are stored as intervals at this order
+MAX_ORDER = 29
+
+_ORDER_PREFIX = re.compile(r"(\d+)/")
+_CELL_RANGE = re.compile(r"(\d+)(?:-(\d+))?")
+
+
+def _shift(order):
+    return 2 * (MAX_ORDER - order)
+
+
+def parse_moc(moc_obj):
+    """
+    Parses a MOC into a sorted array of disjoint [start, end) intervals of
+    order 29 cells, with shape (n, 2).
+
+    Arguments:
+    moc_obj -- (Dict or String) JSON MOC as a dict {order: [cells]} or its
+    string form, or an ASCII MOC like "1/0-3 5 2/44". Cells may also be
+    "start-end" ranges in a dict.
+    """
+    intervals = []
+    if isinstance(moc_obj, str):
+        text = moc_obj.strip()
+        if text.startswith("{"):
+            moc_obj = json.loads(text)
+        else:
+            parts = _ORDER_PREFIX.split(text)
+            for order, cells in zip(parts[1::2], parts[2::2]):
+                intervals.append(_parse_cells(int(order), cells))
+
+    if isinstance(moc_obj, dict):
+        for order, cells in moc_obj.items():
+            if isinstance(cells, np.ndarray) and cells.dtype.kind in "iu":
+                intervals.append(_cells_to_intervals(int(order), cells))
+                continue
+            cells = list(cells)
+            if all(isinstance(cell, (int, np.integer)) for cell in cells):
+                intervals.append(_cells_to_intervals(int(order), np.asarray(cells)))
+            else:
+                text = " ".join(str(cell) for cell in cells)
+                intervals.append(_parse_cells(int(order), text))
+
+    if not intervals:
+        return np.empty((0, 2), dtype=np.int64)
+    return merge_intervals(np.concatenate(intervals))
+
+
+def _parse_cells(order, text):
+    """Parses the cells and start-end ranges of one order of an ASCII MOC"""
+    matches = _CELL_RANGE.findall(text)
+    if not matches:
+        return np.empty((0, 2), dtype=np.int64)
+    starts, ends = np.array(matches).T
+    ends = np.where(ends == "", starts, ends).astype(np.int64)
+    starts = starts.astype(np.int64)
+    shift = _shift(order)
+    return np.column_stack((starts << shift, (ends + 1) << shift))
+
+
+def _cells_to_intervals(order, cells):
+    cells = cells.astype(np.int64)
+    shift = _shift(order)
+    return np.column_stack((cells << shift, (cells + 1) << shift))
+
+
+def merge_intervals(intervals):
+    """Sorts intervals and merges the overlapping and adjacent ones"""
+    intervals = np.asarray(intervals, dtype=np.int64).reshape(-1, 2)
+    intervals = intervals[intervals[:, 0] < intervals[:, 1]]
+    if len(intervals) == 0:
+        return intervals
+
+    intervals = intervals[np.argsort(intervals[:, 0], kind="stable")]
+    starts = intervals[:, 0]
+    ends = np.maximum.accumulate(intervals[:, 1])
+
+    # An interval opens a new group when it starts after every previous end
+    new_group = np.empty(len(starts), dtype=bool)
+    new_group[0] = True
+    new_group[1:] = starts[1:] > ends[:-1]
+    group_ends = np.append(np.flatnonzero(new_group)[1:] - 1, len(starts) - 1)
+    return np.column_stack((starts[new_group], ends[group_ends]))
+
+
+def degrade_intervals(intervals, order):
+    """Rounds intervals outwards to whole cells of order and merges them"""
+    shift = _shift(order)
+    return merge_intervals(
+        np.column_stack(
+            (
+                (intervals[:, 0] >> shift) << shift,
+                ((intervals[:, 1] + (1 << shift) - 1) >> shift) << shift,
+            )
+        )
+    )
+
+
+def _decompose(intervals, max_order):
+    """Yields (order, low, high) with the cells [low, high) of each order
+    that together cover intervals with the fewest cells"""
+    if max_order < MAX_ORDER:
+        intervals = degrade_intervals(intervals, max_order)
+    starts = intervals[:, 0].copy()
+    ends = intervals[:, 1].copy()
+
+    # Each order takes the cells fully inside what is left of the intervals,
+    # the rest on both sides of them is left for the next orders
+    for order in range(max_order + 1):
+        if len(starts) == 0:
+            break
+        shift = _shift(order)
+        low = (starts + (1 << shift) - 1) >> shift
+        high = ends >> shift
+
+        covered = low < high
+        if covered.any():
+            yield order, low[covered], high[covered]
+
+        left_ends = np.where(covered, low << shift, ends)
+        right_starts = np.where(covered, high << shift, ends)
+        starts, ends = (
+            np.concatenate((starts, right_starts)),
+            np.concatenate((left_ends, ends)),
+        )
+        remaining = starts < ends
+        starts, ends = starts[remaining], ends[remaining]
+
+
+def intervals_to_cells(intervals, max_order=MAX_ORDER):
+    """
+    Turns intervals into the fewest cells covering them, as a dict of
+    order -> sorted cell array. Intervals are first degraded to max_order.
+    """
+    cells = {}
+    for order, low, high in _decompose(intervals, max_order):
+        cells[order] = np.sort(_expand_ranges(low, high))
+    return cells
+
+
+def count_cells(intervals, max_order=MAX_ORDER):
+    """Number of cells intervals_to_cells would return, without building them"""
+    return sum(
+        int((high - low).sum()) for _, low, high in _decompose(intervals, max_order)
+    )
+
+
+def _expand_ranges(low, high):
+    """Concatenates np.arange(low[i], high[i]) for all i"""
+    counts = high - low
+    offsets = np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(low, counts) + np.arange(counts.sum()) - offsets
+
+
+def cells_to_json(cells):
+    """Serialises a dict of order -> cells as a JSON MOC string"""
+    return json.dumps(
+        {str(order): order_cells.tolist() for order, order_cells in cells.items()},
+        separators=(",", ":"),
+    )
+
+
+def encode_moc(moc_obj, max_cells=None):
+    """
+    Serialises a MOC into the compact JSON form ESASky expects, degraded to
+    the deepest order that needs at most max_cells cells.
+
+    Arguments:
+    moc_obj -- (MOC, Dict or String) MOC instance or anything parse_moc reads
+    max_cells -- (Int, optional) Cell budget, no limit by default
+    """
+    moc = moc_obj if isinstance(moc_obj, MOC) else MOC.from_moc(moc_obj)
+    order = moc.max_order
+    if max_cells is not None:
+        order = moc.display_order(max_cells)
+    return moc.to_json(order)
+
+
+def _complement(boundaries, points):
+    """Whether each point is outside the intervals flattened in boundaries"""
+    return np.searchsorted(boundaries, points, side="right") % 2 == 0
+
+
+class MOC:
+    """
+    Multi-Order Coverage map stored as sorted, disjoint [start, end)
+    intervals of order 29 HEALPix cells. Set operations work on the
+    interval boundaries and never expand cells:
+
+    moc = (MOC.from_moc(xmm) | MOC.from_moc(chandra)) - MOC.from_moc("0/4")
+    widget.overlay_moc(moc)
+    """
+
+    def __init__(self, intervals=None):
+        if intervals is None:
+            intervals = np.empty((0, 2), dtype=np.int64)
+        self.intervals = merge_intervals(intervals)
+
+    @classmethod
+    def from_moc(cls, moc_obj):
+        """Builds a MOC from anything parse_moc reads"""
+        return cls(parse_moc(moc_obj))
+
+    @classmethod
+    def from_cells(cls, order, cells):
+        """Builds a MOC from cells of a single order"""
+        return cls(_cells_to_intervals(order, np.asarray(cells)))
+
+    def union(self, other):
+        return MOC(np.concatenate((self.intervals, other.intervals)))
+
+    def intersection(self, other):
+        return self._combine(other, np.logical_and)
+
+    def difference(self, other):
+        return self._combine(other, lambda inside, other_inside: inside & ~other_inside)
+
+    __or__ = union
+    __and__ = intersection
+    __sub__ = difference
+
+    def _combine(self, other, operator):
+        # Between two consecutive boundaries of either MOC, membership in
+        # both of them is constant, so checking the segment start is enough
+        own, others = self.intervals.ravel(), other.intervals.ravel()
+        points = np.union1d(own, others)
+        if len(points) < 2:
+            return MOC()
+        inside = operator(
+            ~_complement(own, points[:-1]), ~_complement(others, points[:-1])
+        )
+        return MOC(np.column_stack((points[:-1][inside], points[1:][inside])))
+
+    def degrade(self, order):
+        """Returns the MOC covering this one with cells of order at most"""
+        return MOC(degrade_intervals(self.intervals, order))
+
+    @property
+    def max_order(self):
+        """Deepest order needed to represent the MOC exactly"""
+        boundaries = self.intervals.ravel()
+        boundaries = boundaries[boundaries != 0]
+        if len(boundaries) == 0:
+            return 0
+        # Trailing zero bits of the boundaries tell the coarsest alignment,
+        # base cell boundaries can be aligned beyond order 0
+        lowest_bits = (boundaries & -boundaries).astype(np.float64)
+        trailing = np.log2(lowest_bits).astype(np.int64)
+        return max(0, MAX_ORDER - int(trailing.min()) // 2)
+
+    @property
+    def sky_fraction(self):
+        """Fraction of the sky covered"""
+        covered = int((self.intervals[:, 1] - self.intervals[:, 0]).sum())
+        return covered / (12 << (2 * MAX_ORDER))
+
+    def cell_count(self, order=None):
+        """Number of cells of the MOC degraded to order, its own by default"""
+        return count_cells(self.intervals, self.max_order if order is None else order)
+
+    def display_order(self, max_cells):
+        """Deepest order at which the MOC needs at most max_cells cells"""
+        # Degrading never adds cells, so the counts grow with the order
+        low, high = 0, self.max_order
+        while low < high:
+            order = (low + high + 1) // 2
+            if self.cell_count(order) <= max_cells:
+                low = order
+            else:
+                high = order - 1
+        return low
+
+    def to_dict(self, order=None):
+        """Returns the MOC as a JSON MOC dict {order: [cells]}"""
+        cells = intervals_to_cells(
+            self.intervals, self.max_order if order is None else order
+        )
+        return {
+            str(cell_order): order_cells.tolist()
+            for cell_order, order_cells in cells.items()
+        }
+
+    def to_json(self, order=None):
+        return cells_to_json(
+            intervals_to_cells(
+                self.intervals, self.max_order if order is None else order
+            )
+        )
+
+    def __eq__(self, other):
+        return isinstance(other, MOC) and np.array_equal(
+            self.intervals, other.intervals
+        )
+
+    def __repr__(self):
+        return (
+            f"MOC({len(self.intervals)} intervals, max_order={self.max_order}, "
+            f"sky_fraction={self.sky_fraction:.6f})"
+        )
@@ -1,4 +1,200 @@
+import numpy as np
+
 from pyesasky.legacy.legacy_models import LCatalogue, LFootprintSet, LHiPS
+from pyesasky.stcs import parse_stcs, simplify_stcs
+
+
+def _as_column(values, numeric=False):
+    """Turns cell values into a NumPy array where possible, columns with
+    missing or mixed values are kept as plain lists"""
+    if isinstance(values, np.ndarray):
+        if values.dtype.kind == "O":
+            values = values.tolist()
+        elif numeric and values.dtype.kind != "f":
+            try:
+                return values.astype(np.float64)
+            except (ValueError, TypeError):
+                return values.astype(str) if values.dtype.kind == "S" else values
+        else:
+            return values
+
+    if any(value is None for value in values):
+        return list(values)
+
+    if numeric:
+        try:
+            return np.asarray(values, dtype=np.float64)
+        except (ValueError, TypeError):
+            pass
+
+    if all(isinstance(value, str) for value in values):
+        return np.array(values, dtype=str)
+
+    array = np.asarray(values)
+    return array if array.dtype.kind in "fiu" else list(values)
+
+
+def _metadata_type(values):
+    """MetadataType matching the dtype of a column"""
+    return dtype_metadata_type(np.asarray(values).dtype)
+
+
+def dtype_metadata_type(dtype):
+    """MetadataType matching a NumPy or pandas dtype"""
+    kind = getattr(dtype, "kind", "O")
+    if kind == "f":
+        return MetadataType.DOUBLE
+    if kind in "iu":
+        return MetadataType.LONG
+    if kind == "M":
+        return MetadataType.DATETIME
+    return MetadataType.STRING
+
+
+def _take(values, indices):
+    if indices is None:
+        return values
+    if isinstance(values, np.ndarray):
+        return values[indices]
+    return [values[index] for index in indices]
+
+
+class _Column:
+    """Values of one column, appended cell by cell or as whole arrays"""
+
+    __slots__ = ("_pieces", "_tail", "size")
+
+    def __init__(self):
+        self._pieces = []
+        self._tail = []
+        self.size = 0
+
+    def append(self, value):
+        self._tail.append(value)
+        self.size += 1
+
+    def extend(self, values):
+        if self._tail:
+            self._pieces.append(self._tail)
+            self._tail = []
+        self._pieces.append(values)
+        self.size += len(values)
+
+    def pad(self, size):
+        """Fills the column with missing values up to size"""
+        if size > self.size:
+            self.extend([None] * (size - self.size))
+
+    def values(self, numeric=False):
+        pieces = self._pieces + [self._tail] if self._tail else self._pieces
+        if pieces and all(isinstance(piece, np.ndarray) for piece in pieces):
+            if len(pieces) > 1:
+                # Keep the concatenation, the column is often read again
+                self._pieces, self._tail = [np.concatenate(pieces)], []
+            return _as_column(self._pieces[0], numeric)
+
+        values = []
+        for piece in pieces:
+            values.extend(piece.tolist() if isinstance(piece, np.ndarray) else piece)
+        return _as_column(values, numeric)
+
+
+class _ColumnarOverlay:
+    """
+    Objects of an overlay stored column by column: one _Column per field
+    and one per metadata name, the metadata type is kept per column.
+    Row dicts are only built by to_dict.
+    """
+
+    __slots__ = ("_fields", "_data", "_size")
+
+    FIELDS = ()
+    NUMERIC_FIELDS = ()
+
+    def _init_columns(self):
+        self._fields = {field: _Column() for field in self.FIELDS}
+        self._data = {}  # metadata name -> (type, _Column)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def _append_row(self, values, details):
+        for field, value in zip(self.FIELDS, values):
+            self._fields[field].append(value)
+
+        for meta in details:
+            if "name" not in meta:
+                continue
+            if meta["name"] not in self._data:
+                self._data[meta["name"]] = (meta.get("type"), _Column())
+            column = self._data[meta["name"]][1]
+            column.pad(self._size)
+            column.append(meta.get("value"))
+        self._size += 1
+
+    def _extend_rows(self, values, details):
+        """Adds one object per row from whole columns.
+
+        details is a list of (name, type, values) tuples, one per metadata column.
+        """
+        for field, column in zip(self.FIELDS, values):
+            self._fields[field].extend(column)
+
+        for col_name, col_type, column in details:
+            if col_name not in self._data:
+                self._data[col_name] = (col_type, _Column())
+            self._data[col_name][1].pad(self._size)
+            self._data[col_name][1].extend(column)
+        self._size += len(values[0])
+
+    def _complete_fields(self):
+        """Hook run before the fields are read, to derive lazily computed values"""
+
+    def _columns(self, indices=None):
+        """The fields and the metadata columns, only the rows at indices
+        when given"""
+        self._complete_fields()
+        columns = {
+            field: _take(column.values(numeric=field in self.NUMERIC_FIELDS), indices)
+            for field, column in self._fields.items()
+        }
+        data = []
+        for col_name, (col_type, column) in self._data.items():
+            column.pad(self._size)
+            data.append(
+                dict(
+                    name=col_name, type=col_type, values=_take(column.values(), indices)
+                )
+            )
+        return columns, data
+
+    def _rows(self):
+        """The objects as row dicts, the form of to_dict"""
+        self._complete_fields()
+        columns = [column.values() for column in self._fields.values()]
+        columns = [
+            column.tolist() if isinstance(column, np.ndarray) else column
+            for column in columns
+        ]
+        data = []
+        for col_name, (col_type, column) in self._data.items():
+            column.pad(self._size)
+            values = column.values()
+            if isinstance(values, np.ndarray):
+                values = values.tolist()
+            data.append((col_name, col_type, values))
+
+        rows = []
+        for index, row in enumerate(zip(*columns)):
+            obj = dict(zip(self.FIELDS, row))
+            obj["data"] = [
+                dict(name=col_name, value=values[index], type=col_type)
+                for col_name, col_type, values in data
+                if values[index] is not None
+            ]
+            rows.append(obj)
+        return rows
 
 
 class CooFrame:
@@ -56,7 +252,18 @@ class MetadataType:
         }
 
 
-class Catalogue(LCatalogue):
+class Catalogue(_ColumnarOverlay, LCatalogue):
+
+    __slots__ = (
+        "_catalogue_name",
+        "_cooframe",
+        "_color",
+        "_line_width",
+        "_description",
+    )
+
+    FIELDS = ("name", "id", "ra", "dec")
+    NUMERIC_FIELDS = ("ra", "dec")
 
     def __init__(self, catalogue_name, cooframe, color, line_width, description=None):
 
@@ -65,7 +272,7 @@ class Catalogue(LCatalogue):
         self._color = color if color else "#aa2345"
         self._line_width = line_width if line_width else 10
         self._description = description
-        self._sources = []
+        self._init_columns()
 
         self._catalogue_name = catalogue_name
 
@@ -78,33 +285,81 @@ class Catalogue(LCatalogue):
             )
 
     def add_source(self, name, ra, dec, id=None, *details):
-        source = {}
-        source["name"] = name
-        if not id:
-            source["id"] = len(self._sources)
-        else:
-            source["id"] = int(id)
+        source_id = int(id) if id else self._size
+        self._append_row(
+            (name, source_id, ra, dec), details[0] if details else ()
+        )
 
-        source["ra"] = ra
-        source["dec"] = dec
+    def add_sources(self, ra, dec, name=None, id=None, types=None, **columns):
+        """Adds many sources at once from arrays, much faster than add_source
+
+        Arguments:
+        ra -- (Array) RA of the sources in degrees
+        dec -- (Array) Dec of the sources in degrees
+        name -- (Array or String, optional) Names of the sources, the catalogue
+        name by default
+        id -- (Array, optional) Integer ids, numbered from the current source
+        count by default
+        types -- (Dict, optional) MetadataType of the metadata columns, guessed
+        from their dtype by default
+        columns -- (Arrays) Metadata columns, by name
+        """
+        ra = np.asarray(ra, dtype=np.float64)
+        dec = np.asarray(dec, dtype=np.float64)
+        types = types or {}
+        details = [
+            (
+                col_name,
+                types.get(col_name) or _metadata_type(values),
+                np.asarray(values),
+            )
+            for col_name, values in columns.items()
+        ]
+        self._add_columns(name, ra, dec, id, details)
+
+    def _add_columns(self, names, ras, decs, ids, details):
+        """Adds one source per row from whole columns.
+
+        details is a list of (name, type, values) tuples, one per metadata column.
+        """
+        n_rows = len(ras)
+        if names is None or isinstance(names, str):
+            names = np.full(n_rows, self._catalogue_name if names is None else names)
+        if ids is None:
+            ids = np.arange(self._size, self._size + n_rows)
+        self._extend_rows((names, np.asarray(ids, dtype=np.int64), ras, decs), details)
 
-        source["data"] = []
+    def to_dict(self):
+        overlay = dict(
+            type="SourceListOverlay",
+            overlayName=self._catalogue_name,
+            cooframe=self._cooframe,
+            color=self._color,
+            lineWidth=self._line_width,
+            skyObjectList=self._rows(),
+        )
+        if self._description is not None:
+            overlay["description"] = self._description
 
-        if details and len(details[0]) > 0:
-            i = 0
-            while i < len(details[0]):
-                source["data"].append(details[0][i])
-                i += 1
-        self._sources.append(source)
+        return dict(overlaySet=overlay)
 
-    def to_dict(self):
+    def to_columnar_dict(self, indices=None):
+        """Same as to_dict but with the sources stored column by column,
+        see pyesasky.buffer_utils.pack_buffers
+
+        Arguments:
+        indices -- (Array, optional) Only send the sources at these indices
+        """
+        columns, data = self._columns(indices)
         overlay = dict(
             type="SourceListOverlay",
             overlayName=self._catalogue_name,
             cooframe=self._cooframe,
             color=self._color,
             lineWidth=self._line_width,
-            skyObjectList=self._sources,
+            skyObjectCount=self._size if indices is None else len(indices),
+            columns=columns,
+            data=data,
         )
         if self._description is not None:
             overlay["description"] = self._description
@@ -112,7 +367,19 @@ class Catalogue(LCatalogue):
         return dict(overlaySet=overlay)
 
 
-class FootprintSet(LFootprintSet):
+class FootprintSet(_ColumnarOverlay, LFootprintSet):
+
+    __slots__ = (
+        "_name",
+        "_cooframe",
+        "_color",
+        "_line_width",
+        "_description",
+        "_parsed_size",
+    )
+
+    FIELDS = ("name", "id", "stcs", "ra_deg", "dec_deg")
+    NUMERIC_FIELDS = ("ra_deg", "dec_deg")
 
     def __init__(self, name, cooframe, color, line_width, description=None):
         self._name = ""
@@ -120,7 +387,8 @@ class FootprintSet(LFootprintSet):
         self._color = color if color else "#aa2345"
         self._line_width = line_width if line_width else 10
         self._description = description
-        self._footprints = []
+        self._init_columns()
+        self._parsed_size = 0
 
         self._name = name
 
@@ -134,51 +402,120 @@ class FootprintSet(LFootprintSet):
 
     # details is a dictionary d = {'banana': 3, 'apple': 4, 'pear': 1, 'orange': 2}
     def add_footprint(self, name, stcs, id, ra_col, dec_col, *details):
-        footprint = {}
+        footprint_id = int(id) if id else self._size
+        # The STC-S is parsed with the other footprints when serialised,
+        # missing centers are filled then
+        self._append_row(
+            (name, footprint_id, stcs, _center(ra_col), _center(dec_col)), details[0]
+        )
 
-        footprint["name"] = name
-        if not id:
-            footprint["id"] = len(self._footprints)
-        else:
-            footprint["id"] = int(id)
-
-        stcs = stcs.upper()
-        stcs = stcs.replace("ICRS", "")
-        stcs = stcs.replace("J2000", "")
-        stcs = stcs.replace("FK5", "")
-        stcs = stcs.replace("POLYGON", "POLYGON J2000")
-        stcs = stcs.replace("CIRCLE", "CIRCLE J2000")
-        footprint["stcs"] = stcs
-
-        if not ra_col:
-            # we take the first ra coord in the stcs, just after POLYGON J2000
-            footprint["ra_deg"] = stcs.split()[2]
-        else:
-            footprint["ra_deg"] = ra_col
+    def add_footprints(
+        self, stcs, name=None, id=None, ra=None, dec=None, types=None, **columns
+    ):
+        """Adds many footprints at once from arrays, much faster than add_footprint
+
+        Arguments:
+        stcs -- (Array) STC-S shapes of the footprints
+        name -- (Array or String, optional) Names of the footprints, the set
+        name by default
+        id -- (Array, optional) Integer ids, numbered from the current
+        footprint count by default
+        ra -- (Array, optional) Center RA in degrees, the centroid of the
+        STC-S shape by default
+        dec -- (Array, optional) Center Dec in degrees, the centroid of the
+        STC-S shape by default
+        types -- (Dict, optional) MetadataType of the metadata columns, guessed
+        from their dtype by default
+        columns -- (Arrays) Metadata columns, by name
+        """
+        types = types or {}
+        details = [
+            (
+                col_name,
+                types.get(col_name) or _metadata_type(values),
+                np.asarray(values),
+            )
+            for col_name, values in columns.items()
+        ]
+        self._add_columns(name, stcs, id, ra, dec, details)
+
+    def _add_columns(self, names, stcs, ids, ras, decs, details):
+        """Adds one footprint per row from whole columns.
+
+        details is a list of (name, type, values) tuples, one per metadata column.
+        """
+        stcs = np.asarray(stcs)
+        n_rows = len(stcs)
+        if names is None or isinstance(names, str):
+            names = np.full(n_rows, self._name if names is None else names)
+        if ids is None:
+            ids = np.arange(self._size, self._size + n_rows)
+        if ras is None:
+            ras = np.full(n_rows, np.nan)
+        if decs is None:
+            decs = np.full(n_rows, np.nan)
+        self._extend_rows(
+            (names, np.asarray(ids, dtype=np.int64), stcs, ras, decs), details
+        )
 
-        if not dec_col:
-            # we take the first dec coord in the stcs, just after POLYGON J2000
-            footprint["dec_deg"] = stcs.split()[3]
-        else:
-            footprint["dec_deg"] = dec_col
+    def _complete_fields(self):
+        """Normalises the STC-S of the footprints added since the last call,
+        all at once, and fills their missing centers with the centroids"""
+        start = self._parsed_size
+        if start == self._size:
+            return
+
+        stcs = self._fields["stcs"].values()
+        parsed = parse_stcs(stcs[start:])
+        updated = dict(
+            stcs=(stcs, parsed.stcs),
+            ra_deg=(self._fields["ra_deg"].values(), parsed.ra),
+            dec_deg=(self._fields["dec_deg"].values(), parsed.dec),
+        )
+        for field, (values, new_values) in updated.items():
+            if field != "stcs":
+                new_values = _fill_missing(values[start:], new_values)
+            column = _Column()
+            if start:
+                column.extend(values[:start])
+            column.extend(new_values)
+            self._fields[field] = column
+        self._parsed_size = self._size
 
-        footprint["data"] = []
-        if len(details[0]) > 0:
-            i = 0
-            while i < len(details[0]):
-                footprint["data"].append(details[0][i])
-                i += 1
+    def to_dict(self):
+        overlay = dict(
+            type="FootprintListOverlay",
+            overlayName=self._name,
+            cooframe=self._cooframe,
+            color=self._color,
+            lineWidth=self._line_width,
+            skyObjectList=self._rows(),
+        )
+        if self._description is not None:
+            overlay["description"] = self._description
 
-        self._footprints.append(footprint)
+        return dict(overlaySet=overlay)
 
-    def to_dict(self):
+    def to_columnar_dict(self, tolerance=None):
+        """Same as to_dict but with the footprints stored column by column,
+        see pyesasky.buffer_utils.pack_buffers
+
+        Arguments:
+        tolerance -- (Float, optional) Simplify the shapes to this many
+        degrees, see pyesasky.stcs.simplify_stcs
+        """
+        columns, data = self._columns()
+        if tolerance:
+            columns["stcs"] = simplify_stcs(columns["stcs"], tolerance)
         overlay = dict(
             type="FootprintListOverlay",
             overlayName=self._name,
             cooframe=self._cooframe,
             color=self._color,
             lineWidth=self._line_width,
-            skyObjectList=self._footprints,
+            skyObjectCount=self._size,
+            columns=columns,
+            data=data,
         )
         if self._description is not None:
             overlay["description"] = self._description
@@ -186,6 +523,22 @@ class FootprintSet(LFootprintSet):
         return dict(overlaySet=overlay)
 
 
+def _center(value):
+    """Center coordinate, NaN when missing: None, an empty string or list"""
+    if value is None or isinstance(value, (str, list)) and not value:
+        return np.nan
+    return value
+
+
+def _fill_missing(values, defaults):
+    """Float array of values, with defaults where a value is None, empty or NaN"""
+    if isinstance(values, np.ndarray) and values.dtype.kind in "fiu":
+        values = values.astype(np.float64)
+    else:
+        values = np.array([_center(value) for value in values], dtype=np.float64)
+    return np.where(np.isnan(values), defaults, values)
+
+
 class HiPS(LHiPS):
 
     def __init__(self, name, url, cooframe, max_order, img_format):
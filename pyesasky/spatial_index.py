@@ -0,0 +1,119 @@
+import numpy as np
+
+from pyesasky.moc import _expand_ranges
+
+# Zones are sized for about this many sources per cell
+SOURCES_PER_CELL = 64
+_MIN_ZONE_HEIGHT = 1 / 60
+_MAX_ZONE_HEIGHT = 10.0
+
+
+class SkyIndex:
+    """
+    Zones index of sky positions answering cone queries without looking at
+    every source. The sky is cut in declination zones of equal height, each
+    zone in RA cells about as wide as high, and the sources are sorted by
+    cell. A query only reads the cells its cone overlaps, then checks the
+    exact distance of the sources in them.
+
+    index = SkyIndex(ra, dec)
+    visible = index.query(83.6, 22.0, 0.5)
+    """
+
+    def __init__(self, ra, dec):
+        ra = np.asarray(ra, dtype=np.float64) % 360
+        dec = np.clip(np.asarray(dec, dtype=np.float64), -90, 90)
+
+        n_cells = max(len(ra) / SOURCES_PER_CELL, 1)
+        self.zone_height = float(
+            np.clip(np.sqrt(41253 / n_cells), _MIN_ZONE_HEIGHT, _MAX_ZONE_HEIGHT)
+        )
+        self.n_zones = int(np.ceil(180 / self.zone_height))
+
+        # Cells of a zone are sized by its widest parallel
+        zone_low = np.arange(self.n_zones) * self.zone_height - 90
+        widest = np.minimum(np.abs(zone_low), np.abs(zone_low + self.zone_height))
+        widest[(zone_low < 0) & (zone_low + self.zone_height > 0)] = 0
+        self.zone_cells = np.maximum(
+            (360 * np.cos(np.radians(widest)) / self.zone_height).astype(np.int64), 1
+        )
+        self.zone_offsets = np.concatenate(([0], np.cumsum(self.zone_cells)))
+
+        cells = self._cells(self._zones(dec), ra)
+        self._order = np.argsort(cells, kind="stable")
+        self._cell_starts = np.searchsorted(
+            cells[self._order], np.arange(self.zone_offsets[-1] + 1)
+        )
+        self._ra = ra[self._order]
+        self._dec = dec[self._order]
+
+    def __len__(self):
+        return len(self._order)
+
+    def _zones(self, dec):
+        zones = ((np.asarray(dec) + 90) / self.zone_height).astype(np.int64)
+        return np.clip(zones, 0, self.n_zones - 1)
+
+    def _cells(self, zones, ra):
+        bins = self.zone_cells[zones]
+        cells = np.minimum((ra / 360 * bins).astype(np.int64), bins - 1)
+        return self.zone_offsets[zones] + cells
+
+    def query(self, ra, dec, radius):
+        """
+        Returns the sorted indices of the sources within radius of a position.
+
+        Arguments:
+        ra -- (Float) RA of the center in degrees
+        dec -- (Float) Dec of the center in degrees
+        radius -- (Float) Radius of the cone in degrees
+        """
+        if radius >= 180:
+            return np.arange(len(self))
+
+        zones = np.arange(
+            self._zones(max(dec - radius, -90)), self._zones(min(dec + radius, 90)) + 1
+        )
+        # RA half width of the cone, the same at every declination it spans
+        if abs(dec) + radius >= 90:
+            half_width = 180.0
+        else:
+            half_width = np.degrees(
+                np.arcsin(min(np.sin(np.radians(radius)) / np.cos(np.radians(dec)), 1))
+            )
+
+        bins = self.zone_cells[zones]
+        if half_width >= 180:
+            first, last = np.zeros_like(bins), bins - 1
+        else:
+            first = np.floor((ra - half_width) / 360 * bins).astype(np.int64)
+            last = np.floor((ra + half_width) / 360 * bins).astype(np.int64)
+            last = np.minimum(last, first + bins - 1)
+
+        # Cell ranges wrapping over RA 0 are split in two
+        low = np.concatenate(
+            (np.maximum(first, 0), np.where(first < 0, first + bins, 0))
+        )
+        high = np.concatenate((
+            np.minimum(last, bins - 1) + 1,
+            np.where(first < 0, bins, np.where(last >= bins, last - bins + 1, 0)),
+        ))
+        offsets = np.concatenate((self.zone_offsets[zones], self.zone_offsets[zones]))
+        low, high = low + offsets, np.maximum(high + offsets, low + offsets)
+
+        candidates = _expand_ranges(self._cell_starts[low], self._cell_starts[high])
+        inside = _angular_distance(
+            self._ra[candidates], self._dec[candidates], ra, dec
+        ) <= radius
+        return np.sort(self._order[candidates[inside]])
+
+
+def _angular_distance(ra, dec, ra0, dec0):
+    """Haversine distance in degrees"""
+    ra, dec = np.radians(ra), np.radians(dec)
+    ra0, dec0 = np.radians(ra0), np.radians(dec0)
+    a = (
+        np.sin((dec - dec0) / 2) ** 2
+        + np.cos(dec) * np.cos(dec0) * np.sin((ra - ra0) / 2) ** 2
+    )
+    return np.degrees(2 * np.arcsin(np.sqrt(np.clip(a, 0, 1))))
@@ -0,0 +1,404 @@
+import re
+from collections import namedtuple
+
+import numpy as np
+
+from pyesasky.moc import _expand_ranges
+
+# Shape keywords and numbers, anything else (frames, parentheses) is skipped
+_TOKEN = re.compile(
+    r"\b(POLYGON|CIRCLE|BOX|UNION)\b"
+    r"|(?<![\w.])([-+]?(?:\d+\.?\d*|\.\d+)(?:E[-+]?\d+)?)",
+    re.IGNORECASE,
+)
+
+ParsedStcs = namedtuple(
+    "ParsedStcs", "stcs ra dec ra_min ra_max dec_min dec_max"
+)
+
+
+def normalize_stcs(stcs):
+    """Rewrites a single STC-S string in the form ESASky expects"""
+    return parse_stcs([stcs]).stcs[0]
+
+
+def parse_stcs(values):
+    """
+    Parses a column of STC-S strings with POLYGON, CIRCLE, BOX and UNION
+    shapes. Returns a ParsedStcs of arrays: the strings rewritten as
+    J2000 polygons and circles, the spherical centroids and the bounding
+    boxes, all in degrees. A bounding box can wrap, ra_min > ra_max then.
+    Rows without a shape get an empty string and NaN coordinates.
+    """
+    vertices = _read_vertices(values)
+    n_rows = len(vertices.stcs)
+    ra, dec, radius = vertices.coordinates()
+    circles = np.array([kind == "CIRCLE" for kind in vertices.kinds], dtype=bool)
+
+    ra_c, dec_c = _centroids(
+        ra, dec, radius, vertices.rows, vertices.shapes, circles, n_rows
+    )
+    ra_min, ra_max, dec_min, dec_max = _bounding_boxes(
+        ra, dec, radius, vertices.rows, vertices.shapes, ra_c, n_rows
+    )
+    return ParsedStcs(
+        np.array(vertices.stcs, dtype=str),
+        ra_c,
+        dec_c,
+        ra_min,
+        ra_max,
+        dec_min,
+        dec_max,
+    )
+
+
+class _Vertices:
+    """Vertices of a column of STC-S shapes, one entry per vertex with the
+    coordinates as written. Circles are a single vertex with a radius."""
+
+    def __init__(self):
+        self.stcs = []
+        self.ra, self.dec, self.radius = [], [], []
+        self.rows, self.shapes = [], []
+        self.kinds = []
+
+    def coordinates(self):
+        return (
+            np.array(self.ra, dtype=np.float64),
+            np.array(self.dec, dtype=np.float64),
+            np.array(self.radius, dtype=np.float64),
+        )
+
+
+def _read_vertices(values):
+    vertices = _Vertices()
+    vertex_rows, vertex_shapes = [], []
+
+    for row, stcs in enumerate(values):
+        shapes = _split_shapes(stcs if isinstance(stcs, str) else "")
+        parts = []
+        for kind, numbers in shapes:
+            if kind == "CIRCLE":
+                if len(numbers) < 3:
+                    continue
+                numbers = numbers[:3]
+                vertices.ra.append(numbers[0])
+                vertices.dec.append(numbers[1])
+                vertices.radius.append(numbers[2])
+                points = 1
+            else:
+                if kind == "BOX":
+                    if len(numbers) < 4:
+                        continue
+                    numbers = _box_corners(*(float(number) for number in numbers[:4]))
+                    kind = "POLYGON"
+                numbers = numbers[: len(numbers) // 2 * 2]
+                if not numbers:
+                    continue
+                vertices.ra.extend(numbers[0::2])
+                vertices.dec.extend(numbers[1::2])
+                points = len(numbers) // 2
+                vertices.radius.extend(["0"] * points)
+
+            vertex_rows.extend([row] * points)
+            vertex_shapes.extend([len(vertices.kinds)] * points)
+            vertices.kinds.append(kind)
+            parts.append(f"{kind} J2000 " + " ".join(numbers))
+        vertices.stcs.append(" ".join(parts))
+
+    vertices.rows = np.array(vertex_rows, dtype=np.int64)
+    vertices.shapes = np.array(vertex_shapes, dtype=np.int64)
+    return vertices
+
+
+def _split_shapes(stcs):
+    """Returns the (kind, number strings) of every shape in stcs"""
+    shapes = []
+    for keyword, number in _TOKEN.findall(stcs):
+        if keyword:
+            keyword = keyword.upper()
+            if keyword != "UNION":
+                shapes.append((keyword, []))
+        elif shapes:
+            shapes[-1][1].append(number)
+    return shapes
+
+
+def _box_corners(ra, dec, width, height):
+    """Corners of a BOX, width is measured along the great circle"""
+    half_ra = width / 2 / max(np.cos(np.radians(dec)), 1e-12)
+    half_dec = height / 2
+    corners = [
+        (ra - half_ra, dec - half_dec),
+        (ra + half_ra, dec - half_dec),
+        (ra + half_ra, dec + half_dec),
+        (ra - half_ra, dec + half_dec),
+    ]
+    return [
+        f"{value:.10g}" for corner in corners for value in (corner[0] % 360, corner[1])
+    ]
+
+
+def _centroids(ra, dec, radius, rows, shapes, circles, n_rows):
+    """
+    Spherical centroid of each row: the direction of the first moment of
+    its area, so it does not depend on how the edges are sampled. The
+    moment of a polygon is the sum of those of a triangle fan from its first
+    vertex, each weighted by its area. The inner edges of the fan cancel out,
+    leaving half the sum over the outline of each edge angle times its unit
+    normal. The parts of a UNION add up weighted by their areas. Rows whose
+    shapes have no area use the mean of their vertices.
+    """
+    points = _unit_vectors(ra, dec)
+    n_shapes = len(circles)
+    moment = np.zeros((n_rows, 3))
+    has_area = np.zeros(n_rows, dtype=bool)
+
+    if len(points):
+        starts = np.insert(shapes[1:] != shapes[:-1], 0, True)
+        ends = np.append(shapes[1:] != shapes[:-1], True)
+        following = np.arange(1, len(points) + 1)
+        following[ends] = np.flatnonzero(starts)
+        first = points[np.flatnonzero(starts)][shapes]
+        a, b = points, points[following]
+
+        # Signed area of the fan triangles (first, a, b), whose sign tells the
+        # orientation of the polygon
+        triple = np.einsum("ij,ij->i", first, np.cross(a, b))
+        denominator = (
+            1
+            + np.einsum("ij,ij->i", first, a)
+            + np.einsum("ij,ij->i", a, b)
+            + np.einsum("ij,ij->i", b, first)
+        )
+        area = np.bincount(
+            shapes, 2 * np.arctan2(triple, denominator), minlength=n_shapes
+        )
+        normals = np.cross(a, b)
+        lengths = np.linalg.norm(normals, axis=1)
+        scale = np.divide(
+            _angle(a, b) / 2, lengths, out=np.zeros_like(lengths), where=lengths > 0
+        )
+        shape_moment = np.column_stack(
+            [
+                np.bincount(shapes, normals[:, axis] * scale, minlength=n_shapes)
+                for axis in range(3)
+            ]
+        )
+        shape_moment *= np.sign(area)[:, None]
+
+        perimeter = np.bincount(shapes, _angle(a, b), minlength=n_shapes)
+        # Flat polygons, lines or points, have rounding errors for an area
+        flat = np.abs(area) <= 1e-9 * perimeter**2
+
+        # A cap of angular radius r has an area of 2 pi (1 - cos r) and a
+        # moment of pi sin(r)^2 along its center
+        first_index = np.flatnonzero(starts)
+        cap_radius = np.radians(radius[first_index])
+        shape_moment[circles] = (
+            np.pi * np.sin(cap_radius[circles])[:, None] ** 2
+            * points[first_index][circles]
+        )
+        flat[circles] = cap_radius[circles] <= 0
+        shape_moment[flat] = 0
+
+        shape_rows = rows[first_index]
+        for axis in range(3):
+            np.add.at(moment[:, axis], shape_rows, shape_moment[:, axis])
+        has_area[shape_rows[~flat]] = True
+
+    # Shapes without area, the direction of the mean of the vertices
+    mean = np.column_stack(
+        [np.bincount(rows, points[:, axis], minlength=n_rows) for axis in range(3)]
+    )
+    x, y, z = np.where(has_area[:, None], moment, mean).T
+
+    empty = np.bincount(rows, minlength=n_rows) == 0
+    ra_c = np.degrees(np.arctan2(y, x)) % 360
+    dec_c = np.degrees(np.arctan2(z, np.hypot(x, y)))
+    # Tiny negative angles wrap to 360 exactly
+    ra_c[ra_c >= 360] = 0.0
+    ra_c[empty] = np.nan
+    dec_c[empty] = np.nan
+    return ra_c, dec_c
+
+
+def _bounding_boxes(ra, dec, radius, rows, shapes, ra_c, n_rows):
+    # RA offsets from the centroid, so boxes crossing RA 0 stay contiguous
+    offset = (ra - ra_c[rows] + 180) % 360 - 180
+    ra_radius = radius / np.maximum(np.cos(np.radians(np.abs(dec) + radius)), 1e-12)
+    dec_low = dec - radius
+    dec_high = dec + radius
+
+    # A polygon circling a pole winds 360 degrees in RA, a circle reaching
+    # over a pole covers every RA as well
+    circling = np.zeros(n_rows, dtype=bool)
+    if len(ra):
+        starts = np.insert(shapes[1:] != shapes[:-1], 0, True)
+        ends = np.append(shapes[1:] != shapes[:-1], True)
+        following = np.arange(1, len(ra) + 1)
+        following[ends] = np.flatnonzero(starts)
+        step = (ra[following] - ra + 180) % 360 - 180
+        winding = np.bincount(shapes, step)
+        circling[rows[np.abs(winding[shapes]) > 180]] = True
+    over_pole = np.zeros(n_rows, dtype=bool)
+    over_pole[rows[(dec_high >= 90) | (dec_low <= -90)]] = True
+
+    low = np.full(n_rows, np.inf)
+    high = np.full(n_rows, -np.inf)
+    np.minimum.at(low, rows, offset - ra_radius)
+    np.maximum.at(high, rows, offset + ra_radius)
+    dec_min = np.full(n_rows, np.inf)
+    dec_max = np.full(n_rows, -np.inf)
+    np.minimum.at(dec_min, rows, dec_low)
+    np.maximum.at(dec_max, rows, dec_high)
+
+    dec_max[circling & (dec_max > 0)] = 90.0
+    dec_min[circling & (dec_min < 0)] = -90.0
+    full = circling | over_pole | (high - low >= 360)
+    ra_min = np.where(full, 0.0, (ra_c + low) % 360)
+    ra_max = np.where(full, 360.0, (ra_c + high) % 360)
+    empty = np.isnan(ra_c)
+    for array in (ra_min, ra_max, dec_min, dec_max):
+        array[empty] = np.nan
+    return ra_min, ra_max, np.clip(dec_min, -90, 90), np.clip(dec_max, -90, 90)
+
+
+def simplify_stcs(values, tolerance):
+    """
+    Simplifies a column of STC-S strings for display at a resolution of
+    tolerance degrees. Polygons lose the vertices closer than tolerance to
+    their outline, with a Douglas-Peucker simplification along great
+    circles, and footprints smaller than tolerance become a single circle.
+    Returns the simplified strings in the normalised J2000 form.
+
+    Arguments:
+    values -- (Array) STC-S strings
+    tolerance -- (Float) Largest allowed deviation from the shapes in degrees
+    """
+    vertices = _read_vertices(values)
+    n_rows = len(vertices.stcs)
+    simplified = np.array(vertices.stcs, dtype=object)
+    if not vertices.kinds:
+        return simplified.astype(str)
+
+    ra, dec, radius = vertices.coordinates()
+    rows, shapes = vertices.rows, vertices.shapes
+    circles = np.array([kind == "CIRCLE" for kind in vertices.kinds])
+    tolerance = np.radians(tolerance)
+    points = _unit_vectors(ra, dec)
+
+    # Footprints within tolerance of their centroid are drawn as a circle
+    ra_c, dec_c = _centroids(ra, dec, radius, rows, shapes, circles, n_rows)
+    centers = _unit_vectors(ra_c, dec_c)
+    reach = _angle(points, centers[rows]) + np.radians(radius)
+    extent = np.zeros(n_rows)
+    np.maximum.at(extent, rows, reach)
+    tiny = (extent < tolerance) & ~np.isnan(ra_c)
+    for row in np.flatnonzero(tiny):
+        simplified[row] = (
+            f"CIRCLE J2000 {ra_c[row]:.10g} {dec_c[row]:.10g} "
+            # Widened by more than the rounding of the printed center, so
+            # the circle still covers the footprint
+            f"{np.degrees(max(extent[row], 1e-12)) + 1e-7:.10g}"
+        )
+
+    keep = _douglas_peucker(points, shapes, circles, tolerance)
+    simplify = ~tiny & (np.bincount(rows, ~keep, minlength=n_rows) > 0)
+    if simplify.any():
+        kept = np.flatnonzero(keep & simplify[rows])
+        bounds = np.searchsorted(shapes[kept], np.arange(len(vertices.kinds) + 1))
+        parts = {}
+        for shape in np.unique(shapes[kept]):
+            indices = kept[bounds[shape]:bounds[shape + 1]]
+            numbers = " ".join(
+                f"{vertices.ra[index]} {vertices.dec[index]}" for index in indices
+            )
+            if circles[shape]:
+                numbers += f" {vertices.radius[indices[0]]}"
+            parts.setdefault(rows[indices[0]], []).append(
+                f"{vertices.kinds[shape]} J2000 {numbers}"
+            )
+        for row, row_parts in parts.items():
+            simplified[row] = " ".join(row_parts)
+    return simplified.astype(str)
+
+
+def _unit_vectors(ra, dec):
+    ra, dec = np.radians(ra), np.radians(dec)
+    cos_dec = np.cos(dec)
+    return np.column_stack((cos_dec * np.cos(ra), cos_dec * np.sin(ra), np.sin(dec)))
+
+
+def _angle(a, b):
+    """Angle in radians between unit vectors, stable for small angles"""
+    return np.arctan2(
+        np.linalg.norm(np.cross(a, b), axis=-1), np.einsum("ij,ij->i", a, b)
+    )
+
+
+def _group_argmax(values, groups, n_groups):
+    """Largest value of every group and the index it is found at, -inf and
+    -1 for empty groups"""
+    maximum = np.full(n_groups, -np.inf)
+    index = np.full(n_groups, -1)
+    if len(values):
+        order = np.lexsort((-values, groups))
+        first = np.insert(groups[order][1:] != groups[order][:-1], 0, True)
+        maximum[groups[order][first]] = values[order][first]
+        index[groups[order][first]] = order[first]
+    return maximum, index
+
+
+def _douglas_peucker(points, shapes, circles, tolerance):
+    """Mask of the vertices kept by a Douglas-Peucker simplification of the
+    polygons, all polygons are simplified together segment by segment"""
+    n_shapes = len(circles)
+    first = np.searchsorted(shapes, np.arange(n_shapes))
+    last = np.append(first[1:], len(shapes))
+    polygons = np.flatnonzero(~circles & (last - first > 3))
+    keep = ~np.isin(shapes, polygons)
+    keep[first] = True
+
+    # A ring is split at the vertex farthest from its first one, the two
+    # chains then end at the same vertex they start from
+    indices = np.flatnonzero(~keep)
+    _, farthest = _group_argmax(
+        _angle(points[indices], points[first[shapes[indices]]]),
+        shapes[indices],
+        n_shapes,
+    )
+    farthest = farthest[polygons]
+    farthest = indices[farthest[farthest >= 0]]
+    keep[farthest] = True
+
+    # Segments are [start, end) index ranges, end_vertex closes the ring
+    start = np.concatenate((first[polygons], farthest))
+    end = np.concatenate((farthest, last[polygons]))
+    end_vertex = np.concatenate((farthest, first[polygons]))
+
+    while len(start):
+        counts = end - start - 1
+        segments = np.repeat(np.arange(len(start)), counts)
+        interior = _expand_ranges(start + 1, end)
+        a = points[start][segments]
+        b = points[end_vertex][segments]
+        normal = np.cross(a, b)
+        norm = np.linalg.norm(normal, axis=1)
+        sine = np.einsum("ij,ij->i", points[interior], normal)
+        distance = np.where(
+            norm > 1e-15,
+            np.abs(np.arcsin(np.clip(sine / np.maximum(norm, 1e-15), -1, 1))),
+            _angle(points[interior], a),
+        )
+        maximum, split = _group_argmax(distance, segments, len(start))
+        split_segments = np.flatnonzero(maximum > tolerance)
+        split = interior[split[split_segments]]
+        keep[split] = True
+
+        start, end, end_vertex = (
+            np.concatenate((start[split_segments], split)),
+            np.concatenate((split, end[split_segments])),
+            np.concatenate((split, end_vertex[split_segments])),
+        )
+    return keep
@@ -0,0 +1,256 @@
+import hashlib
+from itertools import islice, zip_longest
+
+import numpy as np
+
+from pyesasky.models import MetadataType
+
+MASKED_VALUE = "--"
+
+
+def column_to_str(column):
+    """
+    Converts a whole table column to an array of strings in one pass.
+    Bytes columns are decoded as utf-8 and masked cells are rendered
+    the same way astropy renders them ('--'). Cells of multidimensional
+    columns are rendered one by one, like '[1 2]'.
+    """
+    values = np.asarray(column)
+
+    if values.ndim > 1:
+        return np.array([str(cell) for cell in column], dtype=str)
+    if values.dtype.kind == "S":
+        result = np.char.decode(values, "utf-8")
+    elif values.dtype.kind == "O":
+        result = np.array(
+            [v.decode("utf-8") if isinstance(v, bytes) else str(v) for v in values],
+            dtype=str,
+        )
+    else:
+        result = values.astype(str)
+
+    mask = np.ma.getmask(column)
+    if mask is not np.ma.nomask and mask.any():
+        result = result.astype(object)
+        result[mask] = MASKED_VALUE
+
+    return result
+
+
+def series_to_numpy(series):
+    """
+    Converts a pandas Series to a NumPy array for the comm buffers in one
+    pass. Numeric columns without missing values are not copied, dates
+    become ISO strings and other types strings. Missing values become None.
+    """
+    kind = series.dtype.kind
+    missing = series.isna().to_numpy()
+    if kind in "fiu" and not missing.any():
+        return series.to_numpy()
+
+    if kind in "fiu":
+        values = series.to_numpy(dtype=np.float64, na_value=np.nan).astype(object)
+    elif kind == "M":
+        dates = series.to_numpy(dtype="datetime64[ns]")
+        values = np.datetime_as_string(dates).astype(object)
+    else:
+        present = series[~missing]
+        if kind == "S" or (len(present) and isinstance(present.iloc[0], bytes)):
+            series = series.str.decode("utf-8")
+        values = series.astype(str).to_numpy(dtype=str)
+        if not missing.any():
+            return values
+        values = values.astype(object)
+    values[missing] = None
+    return values
+
+
+def column_ucd(column):
+    """Returns the UCD of a table column or None if not set"""
+    meta = getattr(column, "meta", None)
+    if meta:
+        return meta.get("ucd")
+    return None
+
+
+def iter_chunks(iterable, chunk_size=None):
+    """
+    Yields lists of at most chunk_size items from iterable, or a single list
+    with everything if chunk_size is not set. At least one (possibly empty)
+    chunk is always yielded.
+    """
+    iterator = iter(iterable)
+    if not chunk_size:
+        yield list(iterator)
+        return
+
+    chunk = list(islice(iterator, chunk_size))
+    yield chunk
+    while len(chunk) == chunk_size:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class ColumnPlan:
+    """
+    Roles of the columns of a table, worked out once from a descriptor and
+    the header. A column either fills a field of the overlay (id, name,
+    ra, ...) or is a metadata column, with the label and type the
+    descriptor gives it or as a STRING when the descriptor does not list it.
+    """
+
+    def __init__(
+        self, columns, descriptor, role_cols, types=None, metadata_columns=None
+    ):
+        """
+        Arguments:
+        columns -- (List) Column names of the table, in order
+        descriptor -- (CatalogueDescriptor or FootprintSetDescriptor)
+        role_cols -- (List) (role, column name, log prefix) in matching priority
+        types -- (Dict, optional) MetadataType of the columns the descriptor
+        does not list, STRING by default
+        metadata_columns -- (Set, optional) Only keep these metadata columns,
+        all of them by default
+        """
+        metadata = {meta.get_label(): meta for meta in descriptor.get_metadata()}
+        id_is_name = descriptor.get_id_col() == descriptor.get_name_col()
+        types = types or {}
+
+        # One (roles, label, type) per column, roles is empty for metadata.
+        # names are the table columns the plan uses, in the same order
+        self.columns = []
+        self.names = []
+        for column in columns:
+            for role, role_col, prefix in role_cols:
+                if column == role_col:
+                    print(prefix + column)
+                    if role == "id" and id_is_name:
+                        print(prefix.replace("{id}", "{name}") + column)
+                        self.columns.append((("id", "name"), column, None))
+                    else:
+                        self.columns.append(((role,), column, None))
+                    break
+            else:
+                if metadata_columns is not None and column not in metadata_columns:
+                    continue
+                meta = metadata.get(column)
+                if meta is not None:
+                    self.columns.append(((), meta.get_label(), meta.get_col_type()))
+                else:
+                    self.columns.append(
+                        ((), column, types.get(column, MetadataType.STRING))
+                    )
+            self.names.append(column)
+
+    @classmethod
+    def for_catalogue(cls, columns, descriptor, **options):
+        return cls(
+            columns,
+            descriptor,
+            [
+                ("id", descriptor.get_id_col(), "{id} column identified: "),
+                ("name", descriptor.get_name_col(), "{name} column identified: "),
+                ("ra", descriptor.get_ra_col(), "{centerRaDeg} column identified: "),
+                ("dec", descriptor.get_dec_col(), "{currDecDeg} column identified: "),
+            ],
+            **options,
+        )
+
+    @classmethod
+    def for_footprints(cls, columns, descriptor, **options):
+        return cls(
+            columns,
+            descriptor,
+            [
+                ("id", descriptor.get_id_col(), "{id} mapped to "),
+                ("name", descriptor.get_name_col(), "{name} mapped to "),
+                ("stcs", descriptor.get_stcs_col(), "{stcs} mapped to "),
+                ("ra", descriptor.get_ra_center_col(), "{centerRaDeg} mapped to "),
+                ("dec", descriptor.get_dec_center_col(), "{centerDecDeg} mapped to "),
+            ],
+            **options,
+        )
+
+    def split(self, values):
+        """
+        Sorts whole columns, one per name of the plan in order, into fields
+        and metadata. Returns a dict of role -> column and a list of
+        (label, type, column) tuples.
+        """
+        fields, details = {}, []
+        for (roles, label, col_type), column in zip(self.columns, values):
+            if roles:
+                for role in roles:
+                    fields[role] = column
+            else:
+                details.append((label, col_type, column))
+        return fields, details
+
+    def split_rows(self, rows):
+        """Same as split from a list of rows, missing cells are None"""
+        n_rows = len(rows)
+        values = list(zip_longest(*rows))
+        values += [(None,) * n_rows] * (len(self.columns) - len(values))
+        return self.split(values)
+
+
+def selected_metadata(descriptor, columns=None):
+    """
+    Names of the metadata columns to read from a table, None for all of them.
+
+    Arguments:
+    descriptor -- (CatalogueDescriptor or FootprintSetDescriptor)
+    columns -- (List or String, optional) Metadata columns to read, or "all".
+    By default the metadata the descriptor lists, or all of them when it
+    lists none
+    """
+    if columns == "all":
+        return None
+    if columns is not None:
+        return set(columns)
+    return {meta.get_label() for meta in descriptor.get_metadata()} or None
+
+
+def row_ids(ids, first):
+    """
+    Integer ids of n rows from an id column, or the row numbers counted from
+    first when there is none. Every id goes through the same mapping, so ids
+    of different rows or chunks never collide: integer ids are kept, other
+    ids, e.g. observation ids, get a negative id hashed from their text and
+    missing ones a negative id hashed from their row number.
+
+    Arguments:
+    ids -- (Array or Int) Id column, or the number of rows when there is none
+    first -- (Int) Row number of the first row
+    """
+    if isinstance(ids, int):
+        return np.arange(first, first + ids)
+    if isinstance(ids, np.ndarray) and ids.dtype.kind in "iu":
+        return ids.astype(np.int64)
+
+    return np.array(
+        [_id_value(value, first + index) for index, value in enumerate(ids)],
+        dtype=np.int64,
+    )
+
+
+def _id_value(value, row):
+    if value is None or value == "" or value == MASKED_VALUE or value != value:
+        return _hashed_id(f"\0{row}")
+    try:
+        integer = int(value)
+    except (TypeError, ValueError, OverflowError):
+        pass
+    else:
+        exact = integer == value or str(integer) == str(value).strip()
+        if exact and -(2**63) <= integer < 2**63:
+            return integer
+    return _hashed_id(str(value))
+
+
+def _hashed_id(text):
+    """Negative 63 bit id hashed from text"""
+    digest = hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+    return -1 - (int.from_bytes(digest, "little") >> 1)
@@ -1,25 +1,36 @@
+import json
+import os
 import re
 import logging
-import requests
-from importlib.metadata import version as get_version
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from importlib.metadata import PackageNotFoundError, version as get_version
 
 import ipywidgets as widgets
 from ipywidgets import register
 from traitlets import Unicode, default, List
-from ipyfilechooser import FileChooser
 from IPython.display import display, HTML, Javascript
 
 
+from pyesasky.cache_utils import user_cache_dir
 from pyesasky.kernel_comm import KernelComm
 from pyesasky.log_utils import setup_accordion_logging, logger
 from pyesasky.exceptions import CommNotInitializedError
 from pyesasky.message_utils import create_message_output, create_message_result
 from pyesasky.api_interactions import ApiInteractionsMixin
+from pyesasky.aio import AsyncApi
 import pyesasky.constants as const
 from ._version import __version__  # noqa
 
 __all__ = ["ESASkyWidget"]
 
+PYPI_RELEASES_URL = "https://pypi.org/rss/project/pyesasky/releases.xml"
+
+# Only one thread asks PyPI at a time, the others then read its answer
+_version_check_lock = threading.Lock()
+
 
 @register
 class ESASkyWidget(widgets.DOMWidget, ApiInteractionsMixin):
@@ -37,6 +48,8 @@ class ESASkyWidget(widgets.DOMWidget, ApiInteractionsMixin):
     def __init__(self, lang="en", enable_logs=False, log_level=logging.DEBUG):
         super().__init__()
         self.kernel_comm = KernelComm(self.comm, self._handle_comm_message)
+        self._aio = AsyncApi(self)
+        self._batch_queue = None
 
         if enable_logs:
             setup_accordion_logging(log_level)
@@ -58,6 +71,43 @@ class ESASkyWidget(widgets.DOMWidget, ApiInteractionsMixin):
         self.spinner = SpinnerWidget()
         self.spinner.display()
 
+    @property
+    def aio(self):
+        """Coroutine versions of the API methods, e.g.
+        await widget.aio.get_fov(), see pyesasky.aio.AsyncApi"""
+        return self._aio
+
+    @contextmanager
+    def batch(self):
+        """Queues fire-and-forget commands (go_to, set_overlay_color,
+        select_shape, ...) and sends them as a single message when the block
+        exits. The frontend runs them in the order they were issued.
+
+        with widget.batch():
+            for name in shapes:
+                widget.select_shape("my overlay", name)
+        """
+        if self._batch_queue is not None:
+            # Nested batch, the outermost one flushes
+            yield
+            return
+
+        self._batch_queue = []
+        try:
+            yield
+        finally:
+            self._flush_batch()
+            self._batch_queue = None
+
+    def _flush_batch(self):
+        queued, self._batch_queue = self._batch_queue, []
+        if not queued:
+            return
+        try:
+            self.kernel_comm.send_batch(queued)
+        except CommNotInitializedError:
+            return "Communication could not be established"
+
     def set_view_height(self, height):
         """Sets the widget view height in pixels"""
 
@@ -66,25 +116,77 @@ class ESASkyWidget(widgets.DOMWidget, ApiInteractionsMixin):
             height = height + "px"
         self.view_height = height
 
+    def gather(self, *calls):
+        """Runs several request/response calls concurrently and returns their
+        results in order. All requests are sent before any response is awaited,
+        so N calls cost roughly one round trip instead of N.
+
+        Arguments:
+        calls -- callables taking no arguments, e.g.
+        widget.gather(widget.get_obs_count, widget.get_fov,
+                      lambda: widget.get_tap_count("CADC"))
+        """
+        if not calls:
+            return []
+
+        with ThreadPoolExecutor(max_workers=len(calls)) as executor:
+            return list(executor.map(lambda call: call(), calls))
+
+    def stats(self):
+        """Returns the timings of the last messages sent to ESASky as a pandas
+        DataFrame, one row per message. Phases are in seconds:
+        serialize (JSON encoding and compression), send, wait (for the
+        response) and parse. Status is sent, ok, timeout, not_established,
+        empty, error or pending."""
+        return self.kernel_comm.stats.to_dataframe()
+
+    def add_stats_callback(self, on_end=None, on_start=None):
+        """Calls on_end with the timings dict of each message once it is
+        done, and on_start before it is sent, e.g. to record tracing spans
+
+        Arguments:
+        on_end -- (Callable, optional) Takes the dict of a stats() row
+        on_start -- (Callable, optional) Takes the dict of a stats() row
+        """
+        self.kernel_comm.stats.add_callback(on_end, on_start)
+
+    def remove_stats_callback(self, callback):
+        """Stops calling a callback added with add_stats_callback"""
+        self.kernel_comm.stats.remove_callback(callback)
+
     def _check_server_version(self):
-        version_resp = requests.get(
-            "https://pypi.org/rss/project/pyesasky/releases.xml", timeout=self.message_timeout
-        )
-        if version_resp.status_code != 200:
+        """Warns below the widget when a newer pyesasky is released. The check
+        runs in the background and is skipped when PYESASKY_NO_VERSION_CHECK
+        is set."""
+        if os.environ.get(const.VERSION_CHECK_SKIP_ENV):
+            return
+
+        self._version_output = widgets.Output()
+        display(self._version_output)
+        threading.Thread(
+            target=self._warn_if_outdated, name="pyesasky-version-check", daemon=True
+        ).start()
+
+    def _warn_if_outdated(self):
+        try:
+            installed_version = get_version("pyesasky")
+            latest_version = _latest_version(self.message_timeout)
+        except PackageNotFoundError:
+            return
+        except Exception:  # noqa
+            logger.debug("Version check failed", exc_info=True)
             return
 
-        match = re.search(r'<title>(\d+\.\d+\.\d+)</title>', version_resp.text)
-        installed_version = get_version("pyesasky")
-        if match:
-            latest_version = match.group(1)
-            if installed_version != latest_version:
-                display(HTML(const.VERSION_WARNING_HTML))
+        if latest_version and installed_version != latest_version:
+            self._version_output.append_display_data(HTML(const.VERSION_WARNING_HTML))
 
     def _handle_comm_message(self, msg_type, content):
         logger.debug("recieved comm message of type: %s", msg_type)
         try:
             self.spinner.show()
             if msg_type == const.MESSAGE_TYPE_DOWNLOAD:
+                import requests
+
                 url = content.get("url")
                 response = requests.get(
                     url.strip(), allow_redirects=True, timeout=self.message_timeout
@@ -104,29 +206,104 @@ class ESASkyWidget(widgets.DOMWidget, ApiInteractionsMixin):
     def _default_layout(self):
         return widgets.Layout(height="400px", align_self="stretch")
 
-    def _send_ignore(self, content):
+    def _send_ignore(self, content, buffers=None):
+        if self._batch_queue is not None:
+            if not buffers:
+                self._batch_queue.append(content)
+                return
+            # Messages with buffers are sent on their own, in order
+            self._flush_batch()
+
         try:
-            self.kernel_comm.send_message(content)
+            self.kernel_comm.send_message(content, buffers)
         except CommNotInitializedError:
             return "Communication could not be established"
 
-    def _send_receive(self, content):
+    def _send_receive(self, content, buffers=None):
+        if self._batch_queue:
+            self._flush_batch()
+
+        requests = self._aio.captured_requests()
+        if requests is not None:
+            request = self._send_receive_aio(content, buffers)
+            requests.append(request)
+            return request
+
         try:
-            resp = self.kernel_comm.send_and_wait(content, timeout=self.message_timeout)
+            return self.kernel_comm.send_and_wait(
+                content,
+                buffers,
+                timeout=self.message_timeout,
+                parse=self._parse_response,
+            )
+        except TimeoutError:
+            return "Timed out waiting for response. Please try again"
+        except CommNotInitializedError:
+            return "Communication could not be established"
+
+    def _parse_response(self, resp):
+        output = create_message_output(resp)
+        if output:
+            print(output)
 
-            output = create_message_output(resp)
-            if output:
-                print(output)
+        return create_message_result(resp)
 
-            return create_message_result(resp)
+    async def _send_receive_aio(self, content, buffers=None):
+        try:
+            return await self.kernel_comm.send_aio(
+                content,
+                buffers,
+                timeout=self.message_timeout,
+                parse=self._parse_response,
+            )
         except TimeoutError:
             return "Timed out waiting for response. Please try again"
         except CommNotInitializedError:
             return "Communication could not be established"
 
 
+def _latest_version(timeout):
+    """
+    Returns the latest pyesasky release on PyPI, None when it is unknown.
+    The answer, or the failure to get one, is cached on disk for
+    VERSION_CHECK_INTERVAL so PyPI is asked at most once a day.
+    """
+    cache_path = user_cache_dir() / "latest-version.json"
+    with _version_check_lock:
+        try:
+            with open(cache_path, "r") as f:
+                cached = json.load(f)
+            if time.time() - cached["checked"] < const.VERSION_CHECK_INTERVAL:
+                return cached["version"]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+        import requests
+
+        latest_version = None
+        try:
+            response = requests.get(PYPI_RELEASES_URL, timeout=timeout)
+            if response.status_code == 200:
+                match = re.search(r'<title>(\d+\.\d+\.\d+)</title>', response.text)
+                latest_version = match.group(1) if match else None
+        except requests.RequestException:
+            logger.debug("Could not reach PyPI for the latest version")
+
+        try:
+            os.makedirs(cache_path.parent, exist_ok=True)
+            tmp_path = cache_path.with_name(cache_path.name + ".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(dict(checked=time.time(), version=latest_version), f)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            logger.debug("Could not write the version check to %s", cache_path)
+        return latest_version
+
+
 class DownloadModal:
     def __init__(self):
+        from ipyfilechooser import FileChooser
+
         self.response = None
 
         self.fc = FileChooser(
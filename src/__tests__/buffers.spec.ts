@@ -0,0 +1,153 @@
+import {
+  TextDecoder as NodeTextDecoder,
+  TextEncoder as NodeTextEncoder
+} from 'util';
+import { decodeMessage, rebuildOverlaySet, unpackBuffers } from '../buffers';
+
+if (typeof globalThis.TextDecoder === 'undefined') {
+  Object.assign(globalThis, {
+    TextDecoder: NodeTextDecoder,
+    TextEncoder: NodeTextEncoder
+  });
+}
+
+function float64View(values: number[], byteOffset = 0): DataView {
+  // Offset views check that unaligned buffers are copied before decoding
+  const bytes = new Uint8Array(byteOffset + values.length * 8);
+  bytes.set(new Uint8Array(new Float64Array(values).buffer), byteOffset);
+  return new DataView(bytes.buffer, byteOffset, values.length * 8);
+}
+
+function utf8Views(strings: string[]): DataView[] {
+  // Offsets count UTF-16 code units, like pyesasky.buffer_utils writes them
+  const offsets = [0];
+  for (const s of strings) {
+    offsets.push(offsets[offsets.length - 1] + s.length);
+  }
+  const data = new TextEncoder().encode(strings.join(''));
+  return [
+    new DataView(data.buffer, data.byteOffset, data.byteLength),
+    float64View(offsets)
+  ];
+}
+
+describe('unpackBuffers', () => {
+  it('decodes float64 references', () => {
+    const ref = { __buffer__: 0, dtype: 'float64', length: 3 };
+    const values = unpackBuffers(ref, [float64View([1.5, -2, 1e300], 3)]);
+    expect(Array.from(values)).toEqual([1.5, -2, 1e300]);
+  });
+
+  it('decodes utf8 references with multi byte characters', () => {
+    const strings = ['M31', 'Barnard’s star', '', '🌌 galaxy'];
+    const ref = { __buffer__: 0, dtype: 'utf8', offsets: 1, length: 4 };
+    expect(unpackBuffers(ref, utf8Views(strings))).toEqual(strings);
+  });
+
+  it('resolves references nested in objects and arrays', () => {
+    const buffers = [float64View([1, 2]), ...utf8Views(['a', 'b'])];
+    const msg = {
+      event: 'overlay',
+      list: [{ __buffer__: 0, dtype: 'float64', length: 2 }, 'plain'],
+      names: { __buffer__: 1, dtype: 'utf8', offsets: 2, length: 2 }
+    };
+    const decoded = unpackBuffers(msg, buffers);
+    expect(decoded.event).toBe('overlay');
+    expect(Array.from(decoded.list[0])).toEqual([1, 2]);
+    expect(decoded.list[1]).toBe('plain');
+    expect(decoded.names).toEqual(['a', 'b']);
+  });
+});
+
+describe('rebuildOverlaySet', () => {
+  it('turns columns into one object per row', () => {
+    const rebuilt = rebuildOverlaySet({
+      overlayName: 'cat',
+      color: 'red',
+      skyObjectCount: 2,
+      columns: { name: ['a', 'b'], ra: [10, 20], dec: [-5, 5], id: [0, 1] },
+      data: [
+        { name: 'mag', type: 'DOUBLE', values: [12.5, null] },
+        { name: 'kind', type: 'STRING', values: ['star', 'galaxy'] }
+      ]
+    });
+
+    expect(rebuilt.overlayName).toBe('cat');
+    expect(rebuilt.color).toBe('red');
+    expect(rebuilt.columns).toBeUndefined();
+    expect(rebuilt.skyObjectList).toEqual([
+      {
+        name: 'a',
+        ra: 10,
+        dec: -5,
+        id: 0,
+        data: [
+          { name: 'mag', value: 12.5, type: 'DOUBLE' },
+          { name: 'kind', value: 'star', type: 'STRING' }
+        ]
+      },
+      {
+        name: 'b',
+        ra: 20,
+        dec: 5,
+        id: 1,
+        // Missing cells are left out
+        data: [{ name: 'kind', value: 'galaxy', type: 'STRING' }]
+      }
+    ]);
+  });
+});
+
+describe('decodeMessage', () => {
+  it('unpacks and rebuilds columnar overlays', () => {
+    const buffers = [float64View([10, 20]), ...utf8Views(['a', 'b'])];
+    const msg = {
+      event: 'overlayCatalogue',
+      msgId: '1',
+      content: {
+        overlaySet: {
+          overlayName: 'cat',
+          skyObjectCount: 2,
+          columns: {
+            ra: { __buffer__: 0, dtype: 'float64', length: 2 },
+            name: { __buffer__: 1, dtype: 'utf8', offsets: 2, length: 2 }
+          },
+          data: []
+        }
+      }
+    };
+
+    const decoded = decodeMessage(msg, buffers);
+    expect(decoded.event).toBe('overlayCatalogue');
+    expect(decoded.msgId).toBe('1');
+    expect(decoded.content.overlaySet.skyObjectList).toEqual([
+      { ra: 10, name: 'a', data: [] },
+      { ra: 20, name: 'b', data: [] }
+    ]);
+  });
+
+  it('rebuilds columnar overlays sent without buffers', () => {
+    // Batched messages, their columns are plain lists
+    const msg = {
+      event: 'overlayCatalogue',
+      content: {
+        overlaySet: {
+          overlayName: 'cat',
+          skyObjectCount: 1,
+          columns: { ra: [10], name: ['a'] },
+          data: []
+        }
+      }
+    };
+
+    expect(decodeMessage(msg).content.overlaySet.skyObjectList).toEqual([
+      { ra: 10, name: 'a', data: [] }
+    ]);
+  });
+
+  it('leaves other messages unchanged', () => {
+    const msg = { event: 'goToRaDec', content: { ra: 10, dec: 20 } };
+    expect(decodeMessage(msg)).toBe(msg);
+    expect(decodeMessage(msg, [])).toBe(msg);
+  });
+});
@@ -0,0 +1,173 @@
+import {
+  APPEND_OVERLAY_EVENT,
+  OverlayStore,
+  REMOVE_FROM_OVERLAY_EVENT,
+  UPDATE_OVERLAY_EVENT
+} from '../overlays';
+
+function skyObject(id: number, mag: number): any {
+  return {
+    id,
+    name: 'star' + id,
+    ra: id,
+    dec: -id,
+    data: [{ name: 'mag', value: mag, type: 'DOUBLE' }]
+  };
+}
+
+function overlayMessage(objects: any[], updatable = true): any {
+  return {
+    event: 'overlayCatalogueWithDetails',
+    msgId: '1',
+    updatable,
+    content: {
+      overlaySet: {
+        overlayName: 'cat',
+        color: 'red',
+        skyObjectList: objects
+      }
+    }
+  };
+}
+
+function changeMessage(event: string, msgId: string, content: any): any {
+  return { event, msgId, content: { overlayName: 'cat', ...content } };
+}
+
+function appendMessage(msgId: string, objects: any[]): any {
+  return {
+    event: APPEND_OVERLAY_EVENT,
+    msgId,
+    content: { overlaySet: { overlayName: 'cat', skyObjectList: objects } }
+  };
+}
+
+describe('OverlayStore', () => {
+  let post: jest.Mock;
+  let store: OverlayStore;
+
+  beforeEach(() => {
+    jest.useFakeTimers();
+    post = jest.fn();
+    store = new OverlayStore(post);
+    store.process(overlayMessage([skyObject(0, 10), skyObject(1, 11)]));
+    post.mockClear();
+  });
+
+  afterEach(() => {
+    jest.useRealTimers();
+  });
+
+  function sentObjects(): any[] {
+    expect(post).toHaveBeenCalledTimes(2);
+    const [deleted, added] = post.mock.calls.map(call => call[0]);
+    expect(deleted.event).toBe('deleteCatalogue');
+    expect(deleted.content).toEqual({ overlayName: 'cat' });
+    expect(added.event).toBe('overlayCatalogueWithDetails');
+    return added.content.overlaySet.skyObjectList;
+  }
+
+  it('forwards overlays without the updatable flag', () => {
+    const msg = overlayMessage([skyObject(5, 1)]);
+    store.process(msg);
+    const { updatable, ...forwarded } = msg;
+    expect(updatable).toBe(true);
+    expect(post).toHaveBeenCalledWith(forwarded);
+  });
+
+  it('forwards chunks appended to other overlays as additions', () => {
+    const msg = overlayMessage([skyObject(5, 1)], false);
+    store.process(msg);
+    expect(post).toHaveBeenCalledWith(msg);
+    post.mockClear();
+
+    const chunk = appendMessage('2', [skyObject(6, 2)]);
+    store.process(chunk);
+    expect(post).toHaveBeenCalledTimes(1);
+    expect(post.mock.calls[0][0]).toEqual({
+      event: 'overlayCatalogueWithDetails',
+      content: chunk.content,
+      msgId: '2',
+      origin: 'pyesasky'
+    });
+
+    // Nothing was kept to re-send
+    jest.advanceTimersByTime(100);
+    expect(post).toHaveBeenCalledTimes(1);
+  });
+
+  it('coalesces appended chunks into one re-send', () => {
+    store.process(appendMessage('2', [skyObject(2, 12)]));
+    store.process(appendMessage('3', [skyObject(3, 13)]));
+    expect(post).not.toHaveBeenCalled();
+
+    jest.advanceTimersByTime(100);
+    expect(sentObjects().map(obj => obj.id)).toEqual([0, 1, 2, 3]);
+    expect(post.mock.calls[1][0].msgId).toBe('3');
+  });
+
+  it('keeps the existing type of updated columns', () => {
+    store.process(
+      changeMessage(UPDATE_OVERLAY_EVENT, '2', {
+        ids: [1],
+        columns: { ra: [42] },
+        data: [
+          { name: 'mag', type: 'STRING', values: [20] },
+          { name: 'flag', type: 'STRING', values: ['x'] }
+        ]
+      })
+    );
+    jest.advanceTimersByTime(100);
+
+    const [first, second] = sentObjects();
+    expect(first).toEqual(skyObject(0, 10));
+    expect(second.ra).toBe(42);
+    expect(second.data).toEqual([
+      { name: 'mag', value: 20, type: 'DOUBLE' },
+      { name: 'flag', value: 'x', type: 'STRING' }
+    ]);
+  });
+
+  it('removes objects by id', () => {
+    store.process(changeMessage(REMOVE_FROM_OVERLAY_EVENT, '2', { ids: [0] }));
+    jest.advanceTimersByTime(100);
+    expect(sentObjects().map(obj => obj.id)).toEqual([1]);
+  });
+
+  it('only re-sends objects appended after a clear', () => {
+    store.process({ event: 'clearCatalogue', content: { overlayName: 'cat' } });
+    post.mockClear();
+
+    store.process(appendMessage('2', [skyObject(2, 12)]));
+    jest.advanceTimersByTime(100);
+    expect(sentObjects().map(obj => obj.id)).toEqual([2]);
+  });
+
+  it('flushes pending changes before other events', () => {
+    store.process(appendMessage('2', [skyObject(2, 12)]));
+    const other = { event: 'goToRaDec', content: { ra: 10, dec: 20 } };
+    store.process(other);
+
+    expect(post).toHaveBeenCalledTimes(3);
+    expect(post.mock.calls[2][0]).toBe(other);
+
+    // Nothing is left for the timer
+    post.mockClear();
+    jest.advanceTimersByTime(100);
+    expect(post).not.toHaveBeenCalled();
+  });
+
+  it('ignores changes to unknown overlays', () => {
+    const error = jest.spyOn(console, 'error').mockImplementation(() => {});
+    store.process({
+      event: REMOVE_FROM_OVERLAY_EVENT,
+      msgId: '2',
+      content: { overlayName: 'other', ids: [0] }
+    });
+    jest.advanceTimersByTime(100);
+
+    expect(post).not.toHaveBeenCalled();
+    expect(error).toHaveBeenCalled();
+    error.mockRestore();
+  });
+});
@@ -0,0 +1,147 @@
+const BUFFER_KEY = '__buffer__';
+const COMPRESSED_EVENT = 'pyesaskyCompressed';
+const CODECS = ['deflate'];
+
+interface IBufferRef {
+  __buffer__: number;
+  dtype: 'float64' | 'utf8';
+  length: number;
+  offsets?: number;
+}
+
+function isBufferRef(value: any): value is IBufferRef {
+  return value !== null && typeof value === 'object' && BUFFER_KEY in value;
+}
+
+function toArrayBuffer(view: DataView): ArrayBuffer {
+  // Copy, the view is not guaranteed to be aligned for typed arrays
+  return view.buffer.slice(view.byteOffset, view.byteOffset + view.byteLength);
+}
+
+function decodeFloat64(view: DataView, length: number): Float64Array {
+  return new Float64Array(toArrayBuffer(view), 0, length);
+}
+
+function decodeStrings(
+  data: DataView,
+  offsetsView: DataView,
+  length: number
+): string[] {
+  const text = new TextDecoder('utf-8').decode(data);
+  const offsets = decodeFloat64(offsetsView, length + 1);
+  const strings = new Array<string>(length);
+  for (let i = 0; i < length; i++) {
+    strings[i] = text.substring(offsets[i], offsets[i + 1]);
+  }
+  return strings;
+}
+
+function resolve(ref: IBufferRef, buffers: DataView[]): any {
+  if (ref.dtype === 'float64') {
+    return decodeFloat64(buffers[ref.__buffer__], ref.length);
+  }
+  return decodeStrings(
+    buffers[ref.__buffer__],
+    buffers[ref.offsets as number],
+    ref.length
+  );
+}
+
+/**
+ * Replaces the buffer references written by pyesasky.buffer_utils with the
+ * arrays they point to.
+ */
+export function unpackBuffers(value: any, buffers: DataView[]): any {
+  if (isBufferRef(value)) {
+    return resolve(value, buffers);
+  }
+  if (Array.isArray(value)) {
+    return value.map(item => unpackBuffers(item, buffers));
+  }
+  if (value !== null && typeof value === 'object') {
+    const result: { [key: string]: any } = {};
+    for (const key of Object.keys(value)) {
+      result[key] = unpackBuffers(value[key], buffers);
+    }
+    return result;
+  }
+  return value;
+}
+
+/**
+ * Turns a column based overlay set back into the skyObjectList that
+ * ESASky expects, one object per row.
+ */
+export function rebuildOverlaySet(overlaySet: any): any {
+  const { columns, data, skyObjectCount, ...settings } = overlaySet;
+  const fields = Object.keys(columns);
+  const skyObjectList = new Array(skyObjectCount);
+
+  for (let i = 0; i < skyObjectCount; i++) {
+    const obj: { [key: string]: any } = {};
+    for (const field of fields) {
+      obj[field] = columns[field][i];
+    }
+
+    obj.data = [];
+    for (const meta of data) {
+      const value = meta.values[i];
+      if (value !== null && value !== undefined) {
+        obj.data.push({ name: meta.name, value: value, type: meta.type });
+      }
+    }
+    skyObjectList[i] = obj;
+  }
+
+  return { ...settings, skyObjectList: skyObjectList };
+}
+
+export function decodeMessage(msg: any, buffers?: DataView[]): any {
+  if (buffers && buffers.length > 0) {
+    msg = unpackBuffers(msg, buffers);
+  }
+
+  const overlaySet = msg.content?.overlaySet;
+  if (overlaySet?.columns) {
+    msg = {
+      ...msg,
+      content: { ...msg.content, overlaySet: rebuildOverlaySet(overlaySet) }
+    };
+  }
+  return msg;
+}
+
+/**
+ * Codecs this browser can decompress, sent to pyesasky in the handshake.
+ */
+export function supportedCodecs(): string[] {
+  if (typeof DecompressionStream === 'undefined') {
+    return [];
+  }
+  return CODECS.filter(codec => {
+    try {
+      new DecompressionStream(codec as CompressionFormat);
+      return true;
+    } catch {
+      return false;
+    }
+  });
+}
+
+/**
+ * Unwraps a message pyesasky.kernel_comm compressed into its first buffer,
+ * resolves with the message and its remaining buffers.
+ */
+export async function decompressMessage(
+  msg: any,
+  buffers?: DataView[]
+): Promise<[any, DataView[] | undefined]> {
+  if (msg.event !== COMPRESSED_EVENT || !buffers || buffers.length === 0) {
+    return [msg, buffers];
+  }
+  const stream = new Blob([toArrayBuffer(buffers[0])])
+    .stream()
+    .pipeThrough(new DecompressionStream(msg.codec as CompressionFormat));
+  const text = await new Response(stream).text();
+  return [JSON.parse(text), buffers.slice(1)];
+}
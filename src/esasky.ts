@@ -1,4 +1,9 @@
 import { DOMWidgetModel, DOMWidgetView } from '@jupyter-widgets/base';
+import { decodeMessage, decompressMessage, supportedCodecs } from './buffers';
+import { OverlayStore } from './overlays';
+
+const BATCH_EVENT = 'pyesaskyBatch';
+const INIT_FLAG = 'initialised';
 
 export class IFrameModel extends DOMWidgetModel {
   defaults() {
@@ -24,6 +29,11 @@ export class IFrameView extends DOMWidgetView {
   sci: boolean = true;
   hideBannerInfo: boolean = true;
 
+  overlays: OverlayStore = new OverlayStore(msg => this.post_to_frame(msg));
+  // Compressed messages decompress asynchronously, every message waits for
+  // the previous ones so they still reach ESASky in order
+  incoming: Promise<void> = Promise.resolve();
+
   render(): void {
     this.modelId = 'esaskyFrame' + Math.random().toString(36).substring(2, 10);
     const params = new URLSearchParams({
@@ -69,7 +79,13 @@ export class IFrameView extends DOMWidgetView {
     this.listenTo(this.model, 'change:view_height', this.height_changed);
 
     window.addEventListener('message', e => {
-      const data = e.data;
+      let data = e.data;
+      if (data?.content?.[INIT_FLAG]) {
+        data = {
+          ...data,
+          content: { ...data.content, compression: supportedCodecs() }
+        };
+      }
       console.log('Recieved message from iFrame');
       console.log('Sending message to backend');
       if (this.prevMsgId !== data.msgId) {
@@ -93,7 +109,16 @@ export class IFrameView extends DOMWidgetView {
     }
   }
 
-  handle_custom_message(msg: any): void {
+  handle_custom_message(msg: any, buffers?: DataView[]): void {
+    this.incoming = this.incoming
+      .then(() => decompressMessage(msg, buffers))
+      .then(([message, messageBuffers]) =>
+        this.dispatch_message(message, messageBuffers)
+      )
+      .catch(error => console.error('Could not handle message', error));
+  }
+
+  dispatch_message(msg: any, buffers?: DataView[]): void {
     const modelIds = this.model.get('_view_module_ids');
 
     const currActiveId = modelIds.find(
@@ -105,14 +130,25 @@ export class IFrameView extends DOMWidgetView {
     }
 
     if (this.modelId === currActiveId) {
-      console.log('Sending message to iFrame');
-      const iFrameElement = document.getElementById(
-        this.modelId
-      ) as HTMLIFrameElement;
-      if (iFrameElement?.contentWindow) {
-        this.prevMsgIdToFront = msg.msgId;
-        iFrameElement.contentWindow.postMessage(msg, this.baseUrl);
+      this.prevMsgIdToFront = msg.msgId;
+      if (msg.event === BATCH_EVENT) {
+        // Entries carry no buffers but columnar overlays still need decoding
+        for (const event of msg.content.events) {
+          this.overlays.process(decodeMessage(event));
+        }
+      } else {
+        this.overlays.process(decodeMessage(msg, buffers));
       }
     }
   }
+
+  post_to_frame(msg: any): void {
+    console.log('Sending message to iFrame');
+    const iFrameElement = document.getElementById(
+      this.modelId
+    ) as HTMLIFrameElement;
+    if (iFrameElement?.contentWindow) {
+      iFrameElement.contentWindow.postMessage(msg, this.baseUrl);
+    }
+  }
 }
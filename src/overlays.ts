@@ -0,0 +1,223 @@
+export const APPEND_OVERLAY_EVENT = 'pyesaskyAppendOverlay';
+export const UPDATE_OVERLAY_EVENT = 'pyesaskyUpdateOverlay';
+export const REMOVE_FROM_OVERLAY_EVENT = 'pyesaskyRemoveFromOverlay';
+
+const FLUSH_DELAY_MS = 100;
+
+// Overlay events and the event deleting an overlay of that kind
+const OVERLAY_EVENTS: { [event: string]: string } = {
+  overlayCatalogue: 'deleteCatalogue',
+  overlayCatalogueWithDetails: 'deleteCatalogue',
+  overlayFootprints: 'deleteFootprintsOverlay',
+  overlayFootprintsWithDetails: 'deleteFootprintsOverlay'
+};
+
+const DELETE_EVENTS = ['deleteCatalogue', 'deleteFootprintsOverlay'];
+const CLEAR_EVENTS = ['clearCatalogue', 'clearFootprintsOverlay'];
+
+interface IStoredOverlay {
+  event: string;
+  content: any;
+  msgId: string;
+}
+
+function overlayName(msg: any): string | undefined {
+  return msg.content?.overlaySet?.overlayName ?? msg.content?.overlayName;
+}
+
+/**
+ * Applies the appended, changed and removed objects sent by the kernel.
+ *
+ * ESASky adds the objects of an overlay sent under an existing name, so
+ * appended chunks are forwarded on their own and nothing is kept for them.
+ * It has no API to change or remove single objects though: overlays sent
+ * with `updatable` set are kept here, and every change to them deletes the
+ * overlay in ESASky and sends it again whole. Changes arriving close
+ * together are coalesced into a single re-send.
+ */
+export class OverlayStore {
+  // Event of every overlay sent, by name
+  private kinds = new Map<string, string>();
+  // Updatable overlays, by name
+  private overlays = new Map<string, IStoredOverlay>();
+  private dirty = new Set<string>();
+  private flushTimer: ReturnType<typeof setTimeout> | undefined;
+
+  constructor(private post: (msg: any) => void) {}
+
+  process(msg: any): void {
+    const name = overlayName(msg);
+
+    if (msg.event === APPEND_OVERLAY_EVENT) {
+      this.append(name, msg);
+      return;
+    }
+    if (msg.event === UPDATE_OVERLAY_EVENT) {
+      this.update(name, msg);
+      return;
+    }
+    if (msg.event === REMOVE_FROM_OVERLAY_EVENT) {
+      this.remove(name, msg);
+      return;
+    }
+
+    // Keep ordering, anything else must see the pending updates first
+    this.flush();
+
+    if (msg.event in OVERLAY_EVENTS && name !== undefined) {
+      this.kinds.set(name, msg.event);
+      if (msg.updatable) {
+        msg = { ...msg };
+        delete msg.updatable;
+        this.overlays.set(name, {
+          event: msg.event,
+          content: msg.content,
+          msgId: msg.msgId
+        });
+      } else {
+        this.overlays.delete(name);
+      }
+    } else if (DELETE_EVENTS.includes(msg.event) && name !== undefined) {
+      this.kinds.delete(name);
+      this.overlays.delete(name);
+    } else if (CLEAR_EVENTS.includes(msg.event) && name !== undefined) {
+      this.clear(name);
+    } else if (msg.event === 'removeAllOverlays') {
+      this.kinds.clear();
+      this.overlays.clear();
+    }
+
+    this.post(msg);
+  }
+
+  flush(): void {
+    if (this.flushTimer !== undefined) {
+      clearTimeout(this.flushTimer);
+      this.flushTimer = undefined;
+    }
+
+    for (const name of this.dirty) {
+      const overlay = this.overlays.get(name);
+      if (!overlay) {
+        continue;
+      }
+      this.post({
+        event: OVERLAY_EVENTS[overlay.event],
+        content: { overlayName: name },
+        msgId: overlay.msgId + '-delete',
+        origin: 'pyesasky'
+      });
+      this.post({
+        event: overlay.event,
+        content: overlay.content,
+        msgId: overlay.msgId,
+        origin: 'pyesasky'
+      });
+    }
+    this.dirty.clear();
+  }
+
+  private stored(name: string | undefined): IStoredOverlay | undefined {
+    const overlay = name !== undefined ? this.overlays.get(name) : undefined;
+    if (!overlay) {
+      console.error('Cannot change unknown overlay ' + name);
+    }
+    return overlay;
+  }
+
+  private markDirty(name: string, overlay: IStoredOverlay, msg: any): void {
+    overlay.msgId = msg.msgId;
+    this.dirty.add(name);
+    if (this.flushTimer === undefined) {
+      this.flushTimer = setTimeout(() => this.flush(), FLUSH_DELAY_MS);
+    }
+  }
+
+  private append(name: string | undefined, msg: any): void {
+    const kind = name !== undefined ? this.kinds.get(name) : undefined;
+    if (kind !== undefined && !this.overlays.has(name as string)) {
+      // Added by ESASky to the overlay of the same name
+      this.post({
+        event: kind,
+        content: msg.content,
+        msgId: msg.msgId,
+        origin: 'pyesasky'
+      });
+      return;
+    }
+    const overlay = this.stored(name);
+    if (!overlay) {
+      return;
+    }
+
+    const objects = msg.content.overlaySet.skyObjectList ?? [];
+    for (const obj of objects) {
+      overlay.content.overlaySet.skyObjectList.push(obj);
+    }
+    this.markDirty(name as string, overlay, msg);
+  }
+
+  private update(name: string | undefined, msg: any): void {
+    const overlay = this.stored(name);
+    if (!overlay) {
+      return;
+    }
+
+    const byId = new Map<number, any>();
+    for (const obj of overlay.content.overlaySet.skyObjectList) {
+      byId.set(Number(obj.id), obj);
+    }
+
+    const { ids, columns, data } = msg.content;
+    for (let i = 0; i < ids.length; i++) {
+      const obj = byId.get(Number(ids[i]));
+      if (!obj) {
+        continue;
+      }
+      for (const field of Object.keys(columns)) {
+        obj[field] = columns[field][i];
+      }
+      for (const meta of data) {
+        // Existing columns keep their type, the given one is for new columns
+        const index = obj.data.findIndex(
+          (item: any) => item.name === meta.name
+        );
+        if (index >= 0) {
+          obj.data[index] = { ...obj.data[index], value: meta.values[i] };
+        } else {
+          obj.data.push({
+            name: meta.name,
+            value: meta.values[i],
+            type: meta.type
+          });
+        }
+      }
+    }
+    this.markDirty(name as string, overlay, msg);
+  }
+
+  private clear(name: string): void {
+    // The overlay stays, objects appended later are added to an empty one
+    const overlay = this.overlays.get(name);
+    if (overlay) {
+      overlay.content = {
+        ...overlay.content,
+        overlaySet: { ...overlay.content.overlaySet, skyObjectList: [] }
+      };
+    }
+  }
+
+  private remove(name: string | undefined, msg: any): void {
+    const overlay = this.stored(name);
+    if (!overlay) {
+      return;
+    }
+
+    const removed = new Set<number>(Array.from(msg.content.ids, Number));
+    const overlaySet = overlay.content.overlaySet;
+    overlaySet.skyObjectList = overlaySet.skyObjectList.filter(
+      (obj: any) => !removed.has(Number(obj.id))
+    );
+    this.markDirty(name as string, overlay, msg);
+  }
+}
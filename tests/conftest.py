@@ -0,0 +1,10 @@
+import pytest
+
+from fake_frontend import make_widget
+
+
+@pytest.fixture
+def widget():
+    widget, fake_comm = make_widget()
+    yield widget
+    fake_comm.close()
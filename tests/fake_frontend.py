@@ -0,0 +1,125 @@
+"""
+Simulated ESASky frontend for the tests and the benchmarks, so
+ESASkyWidget runs without a browser, a kernel or sky.esa.int.
+
+FakeComm stands in for the widget comm. It answers the handshake and every
+message after a configurable latency, keeps a minimal view state for
+getCenter and getFov, and counts the bytes it receives.
+"""
+import contextlib
+import io
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+import zlib
+from unittest import mock
+
+import comm
+
+import pyesasky.constants as const
+from pyesasky import ESASkyWidget
+
+EVENT_COMPRESSED = "pyesaskyCompressed"
+
+
+class FakeComm:
+    def __init__(self, latency=0.0, codecs=("deflate",), **kwargs):
+        self.comm_id = kwargs.get("comm_id") or uuid.uuid4().hex
+        self.latency = latency
+        self.codecs = list(codecs)
+        self.received_bytes = 0
+        self.received_messages = 0
+        self.center = dict(ra=0.0, dec=0.0)
+        self.fov = 1.0
+
+        self._handler = None
+        self._inbox = queue.Queue()
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def on_msg(self, callback):
+        self._handler = callback
+
+    def send(self, data=None, metadata=None, buffers=None):
+        # Answers are prepared on the frontend thread, like the browser would
+        self._inbox.put((time.perf_counter() + self.latency, data, buffers))
+
+    def close(self, data=None, metadata=None, buffers=None):
+        self._inbox.put(None)
+
+    def _serve(self):
+        while True:
+            item = self._inbox.get()
+            if item is None:
+                return
+            due, data, buffers = item
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            self._receive(data or {}, buffers or [])
+
+    def _receive(self, data, buffers):
+        self.received_messages += 1
+        self.received_bytes += len(json.dumps(data, default=str)) + sum(
+            memoryview(buffer).nbytes for buffer in buffers
+        )
+        if data.get("method") != "custom":
+            return  # Widget state updates
+
+        content = data["content"]
+        if content.get("event") == EVENT_COMPRESSED:
+            content = json.loads(zlib.decompress(buffers[0]))
+
+        event = content.get("event")
+        if event == "initTest":
+            self._reply({"initialised": True, "compression": self.codecs})
+        elif event == "pyesaskyBatch":
+            for batched in content["content"]["events"]:
+                self._answer(batched)
+        else:
+            self._answer(content)
+
+    def _answer(self, content):
+        event = content.get("event")
+        arguments = content.get("content") or {}
+        if event == "goToRaDec":
+            self.center = dict(ra=float(arguments["ra"]), dec=float(arguments["dec"]))
+        elif event == "setFov":
+            self.fov = float(arguments["fov"])
+
+        values = dict(
+            getCenter=self.center,
+            getFov=dict(fovRa=self.fov, fovDec=self.fov),
+            saveState=dict(session=dict(center=self.center, fov=self.fov)),
+        )
+        self._reply({"msgId": content.get("msgId"), "values": values.get(event, [])})
+
+    def _reply(self, content):
+        if self._handler is not None:
+            self._handler({"content": {"data": {"content": content}}})
+
+
+def make_widget(latency=0.0, codecs=("deflate",)):
+    """Returns an ESASkyWidget talking to a FakeComm, once its handshake is done"""
+    fake_comms = []
+
+    def create_comm(**kwargs):
+        fake_comms.append(FakeComm(latency, codecs, **kwargs))
+        return fake_comms[-1]
+
+    # The modal and spinner would print their reprs outside a notebook, and
+    # the release check would reach PyPI
+    with mock.patch.object(comm, "create_comm", create_comm), mock.patch.dict(
+        os.environ, {const.VERSION_CHECK_SKIP_ENV: "1"}
+    ), contextlib.redirect_stdout(io.StringIO()):
+        widget = ESASkyWidget()
+
+    deadline = time.perf_counter() + 5
+    while not widget.kernel_comm.comm_established:
+        if time.perf_counter() > deadline:
+            raise TimeoutError("The fake frontend did not answer the handshake")
+        time.sleep(0.001)
+    # The child widgets (layouts, spinner, ...) get fake comms too
+    return widget, widget.comm
@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+
+from pyesasky.aio import AsyncApi
+from pyesasky.legacy.legacy_api_interactions import LApiInteractionsMixin
+
+
+def legacy_aliases():
+    return [
+        (name, method.new_method_name)
+        for name, method in vars(LApiInteractionsMixin).items()
+        if hasattr(method, "new_method_name")
+    ]
+
+
+@pytest.mark.parametrize("alias, target", legacy_aliases())
+def test_aliases_run_like_their_target(widget, alias, target):
+    run = getattr(widget.aio, alias).func
+    threaded = run == widget.aio._run_threaded
+    assert threaded == (target in AsyncApi._THREADED_METHODS)
+
+
+def test_threaded_alias_returns_the_response(widget):
+    async def save():
+        return await widget.aio.saveSession()
+
+    assert asyncio.run(save()) == widget.save_session()
+
+
+@pytest.mark.parametrize(
+    "name",
+    [
+        "overlay_cat_csv",
+        "overlay_cat_astropy",
+        "overlay_cat_arrow",
+        "overlay_cat_dataframe",
+    ],
+)
+def test_table_ingestion_runs_in_a_thread(widget, name):
+    assert getattr(widget.aio, name).func == widget.aio._run_threaded
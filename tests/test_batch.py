@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+import pyesasky.constants as const
+from fake_frontend import make_widget
+from pyesasky.models import Catalogue
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    """The widget and the comm messages it sends, as lists of events"""
+    widget, fake_comm = make_widget()
+    messages = []
+    send = fake_comm.send
+
+    def recording_send(data=None, metadata=None, buffers=None):
+        content = data["content"]
+        if content["event"] == const.EVENT_BATCH:
+            events = content["content"]["events"]
+            messages.append([batched["event"] for batched in events])
+        else:
+            messages.append([content["event"]])
+        return send(data, metadata, buffers)
+
+    monkeypatch.setattr(fake_comm, "send", recording_send)
+    yield widget, messages
+    fake_comm.close()
+
+
+def catalogue():
+    catalogue = Catalogue("cat", "J2000", "red", 5)
+    catalogue.add_sources(np.array([10.0]), np.array([10.0]))
+    return catalogue
+
+
+def test_batch_is_one_message(sent):
+    widget, messages = sent
+    with widget.batch():
+        widget.set_overlay_color("cat", "red")
+        widget.go_to(10, 10)
+        assert messages == []
+    assert messages == [["setOverlayColor", "goToRaDec"]]
+
+
+def test_messages_with_buffers_keep_their_place(sent):
+    widget, messages = sent
+    with widget.batch():
+        widget.go_to(10, 10)
+        widget.overlay_cat(catalogue())
+        widget.set_fov(2)
+    assert messages == [["goToRaDec"], ["overlayCatalogue"], ["setFov"]]
+
+
+def test_nested_batches_are_sent_by_the_outermost(sent):
+    widget, messages = sent
+    with widget.batch():
+        widget.go_to(10, 10)
+        with widget.batch():
+            widget.set_fov(2)
+        assert messages == []
+        widget.set_overlay_color("cat", "red")
+    assert messages == [["goToRaDec", "setFov", "setOverlayColor"]]
+
+
+def test_requests_flush_the_batch_first(sent):
+    widget, messages = sent
+    with widget.batch():
+        widget.go_to(10, 10)
+        center = widget.get_center()
+    assert messages == [["goToRaDec"], ["getCenter"]]
+    assert center["ra"] == 10
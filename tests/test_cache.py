@@ -0,0 +1,139 @@
+import json
+import threading
+import time
+
+import pandas as pd
+
+from pyesasky.api_interactions import _dump_json, _load_json
+from pyesasky.cache_utils import HttpCache
+
+
+def test_clear_and_evict_keep_other_cached_files(tmp_path, monkeypatch):
+    monkeypatch.setenv("PYESASKY_CACHE_DIR", str(tmp_path))
+    (tmp_path / "archives").mkdir()
+    (tmp_path / "archives" / "index.json").write_text("{}")
+    (tmp_path / "latest-version.json").write_text("{}")
+
+    cache = HttpCache(max_size=0)
+    for url in ("https://sky.esa.int/a", "https://sky.esa.int/b"):
+        cache._write(cache._path(url, "body"), b"body")
+        cache._write_meta(url, {"fetched": 0, "version": 1})
+
+    cache._evict()
+    assert not any(cache.directory.iterdir())
+    cache._write(cache._path("https://sky.esa.int/a", "body"), b"body")
+    cache.clear()
+    cache.clear()
+
+    assert not any(cache.directory.iterdir())
+    assert (tmp_path / "archives" / "index.json").is_file()
+    assert (tmp_path / "latest-version.json").is_file()
+
+
+class Response:
+    status_code = 200
+    headers = {"ETag": '"1"'}
+    content = "Étoile".encode("utf-8")
+    # What requests guesses without a charset in the content type
+    text = content.decode("latin-1")
+
+    def raise_for_status(self):
+        pass
+
+
+def test_fetched_and_cached_bodies_read_the_same(tmp_path, monkeypatch):
+    import requests
+
+    monkeypatch.setattr(requests, "get", lambda *args, **kwargs: Response())
+    cache = HttpCache(tmp_path)
+    fetched, _ = cache.get("https://sky.esa.int/a", 1)
+    cached, _ = cache.get("https://sky.esa.int/a", 1)
+    assert fetched == cached == "Étoile"
+
+
+def test_concurrent_writers_use_their_own_temporary_files(tmp_path):
+    cache = HttpCache(tmp_path)
+    path = cache._path("https://sky.esa.int/a", "body")
+    contents = [bytes([index]) * 100_000 for index in range(8)]
+    errors = []
+
+    def write(content):
+        try:
+            cache._write(path, content)
+        except OSError as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=write, args=(content,)) for content in contents]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert path.read_bytes() in contents
+    assert [entry.name for entry in tmp_path.iterdir()] == [path.name]
+
+
+def cached_body(cache, url, body):
+    cache._write(cache._path(url, "body"), body.encode("utf-8"))
+    cache._write_meta(url, {"fetched": time.time(), "version": 1})
+
+
+def test_none_is_a_cached_parse_result(tmp_path):
+    cache = HttpCache(tmp_path)
+    cached_body(cache, "https://sky.esa.int/a", "null")
+    parses = []
+
+    def parse(text):
+        parses.append(text)
+        return json.loads(text)
+
+    for _ in range(2):
+        value = cache.get_parsed(
+            "https://sky.esa.int/a", parse, 1, _dump_json, _load_json, "json"
+        )
+        assert value is None
+        cache._memory.clear()
+    assert parses == ["null"]
+
+
+def test_hips_list_is_cached_as_json(widget, tmp_path, monkeypatch):
+    import pyesasky.api_interactions as api_interactions
+
+    rows = [
+        dict(
+            ID="CDS/P/DSS2/color",
+            obs_title="DSS colored",
+            moc_order=7,
+            moc_sky_fraction=1.0,
+            em_min=4.0e-7,
+            em_max=6.0e-7,
+            hips_service_url="https://alasky.cds.unistra.fr/DSS/DSSColor",
+            extra="x",
+        ),
+        dict(
+            ID="ESAVO/P/HST/ACS",
+            obs_title="HST ACS",
+            moc_order=11,
+            moc_sky_fraction=0.001,
+            em_min=None,
+            em_max=None,
+            hips_service_url="https://esahubble.org/hips",
+            extra="y",
+        ),
+    ]
+    cache = HttpCache(tmp_path)
+    cached_body(
+        cache, "http://skyint.esac.esa.int/esasky-tap/global-hipslist", json.dumps(rows)
+    )
+    monkeypatch.setattr(api_interactions, "get_cache", lambda: cache)
+
+    parsed = widget.browse_hips()
+    cache._memory.clear()
+    loaded = widget.browse_hips()
+
+    assert list(loaded.columns) == list(parsed.columns)
+    pd.testing.assert_frame_equal(loaded, parsed)
+    assert all(
+        path.read_bytes().startswith(b"{") for path in tmp_path.glob("*.hipslist-*")
+    )
@@ -0,0 +1,108 @@
+import asyncio
+import contextlib
+import io
+
+import numpy as np
+import pandas as pd
+
+import pyesasky.constants as const
+from pyesasky.descriptors import FootprintSetDescriptor
+from pyesasky.models import Catalogue, FootprintSet
+
+
+def make_catalogue(n_sources=20000):
+    rng = np.random.default_rng(0)
+    catalogue = Catalogue("culled", "J2000", "red", 5)
+    catalogue.add_sources(
+        rng.uniform(0, 360, n_sources),
+        np.degrees(np.arcsin(rng.uniform(-1, 1, n_sources))),
+    )
+    return catalogue
+
+
+def sent_sources(widget):
+    return widget._culled_overlays["culled"]["sent"]
+
+
+def test_culling_sends_the_view_only(widget):
+    widget.set_fov(1)
+    widget.go_to(10, 10)
+    widget.overlay_cat(make_catalogue(), cull=True, max_sources=100)
+
+    columns, _ = widget._culled_overlays["culled"]["catalogue"]._columns()
+    sent = sent_sources(widget)
+    separation = np.degrees(
+        np.arccos(
+            np.clip(
+                np.sin(np.radians(10)) * np.sin(np.radians(columns["dec"][sent]))
+                + np.cos(np.radians(10))
+                * np.cos(np.radians(columns["dec"][sent]))
+                * np.cos(np.radians(columns["ra"][sent] - 10)),
+                -1,
+                1,
+            )
+        )
+    )
+    assert len(sent) < 100
+    assert (separation <= 1).all()
+
+
+def test_aio_culling_matches_sync(widget):
+    widget.set_fov(1)
+    widget.go_to(200, -30)
+    widget.overlay_cat(make_catalogue(), cull=True, max_sources=100)
+    widget.go_to(10, 10)
+    expected = sent_sources(widget)
+
+    async def cull():
+        await widget.aio.go_to(200, -30)
+        await widget.aio.overlay_cat(make_catalogue(), cull=True, max_sources=100)
+        await widget.aio.go_to(10, 10)
+
+    asyncio.run(cull())
+    np.testing.assert_array_equal(sent_sources(widget), expected)
+
+
+def test_aio_level_of_detail_matches_sync(widget):
+    footprints = FootprintSet("lod", "J2000", "red", 2)
+    footprints.add_footprints(["POLYGON ICRS 10 10 11 10 11 11 10 11"])
+
+    widget.set_fov(2)
+    widget.overlay_footprints(footprints, lod=True)
+    expected = widget._lod_overlays["lod"]["tolerance"]
+
+    async def overlay():
+        await widget.aio.overlay_footprints(footprints, lod=True)
+
+    asyncio.run(overlay())
+    assert expected == 2 / const.LOD_VIEW_PIXELS
+    assert widget._lod_overlays["lod"]["tolerance"] == expected
+
+
+def test_streamed_level_of_detail_keeps_no_chunks(widget, tmp_path, monkeypatch):
+    path = tmp_path / "footprints.csv"
+    pd.DataFrame(
+        {
+            "id": np.arange(10),
+            "stcs": [
+                f"POLYGON ICRS {i} 10 {i + 1} 10 {i + 1} 11 {i} 11" for i in range(10)
+            ],
+        }
+    ).to_csv(path, index=False)
+    descriptor = FootprintSetDescriptor("lod", "red", 2, "id", "id", "stcs", "", "", [])
+
+    widget.set_fov(2)
+    with contextlib.redirect_stdout(io.StringIO()):
+        widget.overlay_footprints_csv(
+            str(path), ",", descriptor, chunk_size=3, lod=True
+        )
+    assert widget._lod_overlays["lod"]["sets"] is None
+
+    events = []
+    monkeypatch.setattr(
+        widget,
+        "_send_ignore",
+        lambda content, buffers=None: events.append(content["event"]),
+    )
+    widget._refine_lod_overlays(0.01)
+    assert events == []
@@ -0,0 +1,102 @@
+import io
+import tarfile
+import zipfile
+
+import pytest
+import tornado.web
+from tornado.testing import AsyncHTTPTestCase
+
+from pyesasky.hips_archive import HiPSArchive
+from pyesasky.hips_server import HiPSArchiveHandler
+
+FILES = {
+    "hips/properties": b"hips_tile_format = png\n",
+    "hips/Norder3/Dir0/Npix1.png": b"\x89PNG" + bytes(range(256)) * 40,
+    "hips/Norder3/Dir0/Npix2.png": b"\x89PNG" + b"\0" * 5000,
+    "outside.txt": b"not part of the HiPS",
+}
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("PYESASKY_CACHE_DIR", str(tmp_path / "cache"))
+
+
+def write_tar(path):
+    with tarfile.open(path, "w") as archive:
+        for name, data in FILES.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return path
+
+
+def write_zip(path):
+    with zipfile.ZipFile(path, "w") as archive:
+        for index, (name, data) in enumerate(FILES.items()):
+            # Stored and deflated members
+            method = zipfile.ZIP_DEFLATED if index % 2 else zipfile.ZIP_STORED
+            archive.writestr(name, data, compress_type=method)
+    return path
+
+
+@pytest.fixture(params=["tar", "zip"])
+def archive(request, tmp_path):
+    write = write_tar if request.param == "tar" else write_zip
+    return HiPSArchive(write(tmp_path / f"hips.{request.param}"))
+
+
+def test_members_are_relative_to_the_properties(archive):
+    for name, data in FILES.items():
+        if name.startswith("hips/"):
+            assert archive.read(name[len("hips/") :]) == data
+    assert archive.member("hips/properties") is None
+
+
+def test_missing_member(archive):
+    assert archive.member("Norder3/Dir0/Npix3.png") is None
+    with pytest.raises(FileNotFoundError):
+        archive.read("Norder3/Dir0/Npix3.png")
+
+
+def test_no_member_outside_the_hips(archive):
+    assert archive.member("../outside.txt") is None
+    assert archive.member("Norder3/../../outside.txt") is None
+    assert archive.member("outside.txt") is None
+
+
+def test_index_is_reused(archive):
+    reopened = HiPSArchive(archive.path)
+    assert reopened._members == archive._members
+    assert reopened.read("properties") == FILES["hips/properties"]
+
+
+class ArchiveHandlerTest(AsyncHTTPTestCase):
+    @pytest.fixture(autouse=True)
+    def tmp(self, tmp_path):
+        self.tmp_path = tmp_path
+
+    def get_app(self):
+        archive = HiPSArchive(write_zip(self.tmp_path / "hips.zip"))
+        return tornado.web.Application(
+            [(r"/hips/(.*)", HiPSArchiveHandler, dict(archive=archive))]
+        )
+
+    def fetch_tile(self, path, **headers):
+        return self.fetch(path, headers=dict(Host="localhost", **headers))
+
+    def test_members_are_served(self):
+        response = self.fetch_tile("/hips/Norder3/Dir0/Npix1.png")
+        assert response.code == 200
+        assert response.body == FILES["hips/Norder3/Dir0/Npix1.png"]
+        assert response.headers["Content-Type"] == "image/png"
+
+        etag = response.headers["Etag"]
+        response = self.fetch_tile(
+            "/hips/Norder3/Dir0/Npix1.png", **{"If-None-Match": etag}
+        )
+        assert response.code == 304
+
+    def test_missing_and_outside_members_are_not_found(self):
+        assert self.fetch_tile("/hips/Norder3/Dir0/Npix3.png").code == 404
+        assert self.fetch_tile("/hips/%2E%2E/outside.txt").code == 404
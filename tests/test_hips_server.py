@@ -0,0 +1,61 @@
+import pytest
+import tornado.web
+from tornado.testing import AsyncHTTPTestCase
+
+from fake_frontend import make_widget
+
+TILE = b"\x89PNG" + bytes(range(256)) * 40
+
+
+class FileHandlerTest(AsyncHTTPTestCase):
+    @pytest.fixture(autouse=True)
+    def hips_dir(self, tmp_path):
+        self.hips_dir = tmp_path / "hips"
+        (self.hips_dir / "Norder3" / "Dir0").mkdir(parents=True)
+        (self.hips_dir / "Norder3" / "Dir0" / "Npix1.png").write_bytes(TILE)
+        (tmp_path / "hips2").mkdir()
+        (tmp_path / "hips2" / "properties").write_text("hips_tile_format = png\n")
+        (tmp_path / "outside.txt").write_text("not part of the HiPS")
+
+    def get_app(self):
+        return tornado.web.Application([])
+
+    def add_hips(self):
+        """Registers the HiPS directory like add_hips_local, returns its url"""
+        widget, fake_comm = make_widget()
+        self.addCleanup(fake_comm.close)
+        widget.tornadoserver = self._app
+        return widget.add_hips_local(str(self.hips_dir) + "/")
+
+    def fetch_tile(self, path, **headers):
+        return self.fetch(path, headers=dict(Host="localhost", **headers))
+
+    def test_tiles_are_served_under_the_root(self):
+        url = self.add_hips()
+        assert url == str(self.hips_dir) + "/"
+
+        response = self.fetch_tile(url + "Norder3/Dir0/Npix1.png")
+        assert response.code == 200
+        assert response.body == TILE
+        assert response.headers["Content-Type"] == "image/png"
+
+        etag = response.headers["Etag"]
+        response = self.fetch_tile(
+            url + "Norder3/Dir0/Npix1.png", **{"If-None-Match": etag}
+        )
+        assert response.code == 304
+        assert self.fetch_tile(url + "Norder3/Dir0/Npix2.png").code == 404
+        assert self.fetch_tile(url + "Norder3").code == 404
+
+    def test_paths_outside_the_root_are_refused(self):
+        url = self.add_hips()
+        assert self.fetch_tile(url + "%2E%2E/outside.txt").code == 403
+        # A sibling directory sharing the root as a prefix
+        assert self.fetch_tile(url + "%2E%2E/hips2/properties").code == 403
+
+    def test_only_localhost_is_served(self):
+        url = self.add_hips()
+        response = self.fetch(
+            url + "Norder3/Dir0/Npix1.png", headers=dict(Host="example.org")
+        )
+        assert response.code == 403
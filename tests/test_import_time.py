@@ -0,0 +1,37 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+IMPORTS = ("import pyesasky", "from pyesasky import ESASkyWidget")
+# Modules only imported by the methods that use them
+LAZY_MODULES = ("jupyter_server", "pandas", "requests", "tornado", "ipyfilechooser")
+
+
+def imported_modules(statement):
+    """Top level packages in sys.modules once statement ran in a fresh
+    interpreter"""
+    code = f"import json, sys; {statement}; print(json.dumps(sorted(sys.modules)))"
+    output = subprocess.check_output([sys.executable, "-c", code], text=True)
+    return {module.split(".")[0] for module in json.loads(output)}
+
+
+@pytest.mark.parametrize("statement", IMPORTS)
+def test_heavy_dependencies_are_not_imported(statement):
+    assert imported_modules(statement).isdisjoint(LAZY_MODULES)
+
+
+def test_import_pyesasky_skips_the_widget():
+    modules = imported_modules("import pyesasky")
+    assert modules.isdisjoint(("ipywidgets", "IPython", "numpy"))
+
+
+def test_file_handler_alias_is_imported_on_access():
+    pytest.importorskip("tornado")
+    modules = imported_modules(
+        "import pyesasky.api_interactions as api; "
+        "from pyesasky.hips_server import HiPSFileHandler; "
+        "assert api.FileHandler is HiPSFileHandler"
+    )
+    assert "tornado" in modules
@@ -0,0 +1,131 @@
+import contextlib
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pyesasky.descriptors import CatalogueDescriptor, MetadataDescriptor
+from pyesasky.table_utils import column_to_str, row_ids
+
+ROWS = {
+    "id": [1, 2, 3],
+    "name": ["a", "b", "c"],
+    "ra": [10.0, 20.0, 30.0],
+    "dec": [-5.0, 0.0, 5.0],
+    "mag": [12.5, 13.0, 14.25],
+    "kind": ["star", "galaxy", "star"],
+}
+
+
+def descriptor():
+    return CatalogueDescriptor(
+        "cat",
+        "red",
+        5,
+        "id",
+        "name",
+        "ra",
+        "dec",
+        [MetadataDescriptor("mag", "DOUBLE", 2)],
+    )
+
+
+def ingest_csv(widget, tmp_path):
+    path = tmp_path / "cat.csv"
+    pd.DataFrame(ROWS).to_csv(path, index=False)
+    widget.overlay_cat_csv(str(path), ",", descriptor(), "J2000")
+
+
+def ingest_astropy(widget, tmp_path):
+    Table = pytest.importorskip("astropy.table").Table
+    widget.overlay_cat_astropy("cat", "J2000", "red", 5, Table(ROWS), "ra", "dec", "id")
+
+
+def ingest_dataframe(widget, tmp_path):
+    widget.overlay_cat_dataframe(pd.DataFrame(ROWS), descriptor())
+
+
+def ingest_arrow(widget, tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    widget.overlay_cat_arrow(pa.table(ROWS), descriptor(), columns="all")
+
+
+@pytest.mark.parametrize(
+    "ingest", [ingest_csv, ingest_astropy, ingest_dataframe, ingest_arrow]
+)
+def test_undescribed_columns_are_sent_by_every_path(
+    ingest, widget, tmp_path, monkeypatch
+):
+    catalogues = []
+    monkeypatch.setattr(
+        widget, "overlay_cat", lambda catalogue, **kwargs: catalogues.append(catalogue)
+    )
+    with contextlib.redirect_stdout(io.StringIO()):
+        ingest(widget, tmp_path)
+
+    _, data = catalogues[0]._columns()
+    assert "kind" in [column["name"] for column in data]
+
+
+def arrow_metadata_read(widget, tmp_path, monkeypatch, **options):
+    """Metadata column names sent from a Parquet file, and the columns read"""
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = tmp_path / "cat.parquet"
+    pq.write_table(pytest.importorskip("pyarrow").table(ROWS), path)
+
+    read = []
+    iter_batches = pq.ParquetFile.iter_batches
+
+    def recording_iter_batches(self, *args, columns=None, **kwargs):
+        read.append(columns)
+        return iter_batches(self, *args, columns=columns, **kwargs)
+
+    monkeypatch.setattr(pq.ParquetFile, "iter_batches", recording_iter_batches)
+    catalogues = []
+    monkeypatch.setattr(
+        widget, "overlay_cat", lambda catalogue, **kwargs: catalogues.append(catalogue)
+    )
+    with contextlib.redirect_stdout(io.StringIO()):
+        widget.overlay_cat_arrow(str(path), descriptor(), **options)
+
+    _, data = catalogues[0]._columns()
+    return [column["name"] for column in data], read[0]
+
+
+def test_arrow_reads_only_the_described_columns(widget, tmp_path, monkeypatch):
+    sent, read = arrow_metadata_read(widget, tmp_path, monkeypatch)
+    assert sent == ["mag"]
+    assert read == ["id", "name", "ra", "dec", "mag"]
+
+
+def test_arrow_reads_the_requested_columns(widget, tmp_path, monkeypatch):
+    sent, read = arrow_metadata_read(widget, tmp_path, monkeypatch, columns=["kind"])
+    assert sent == ["kind"]
+    assert read == ["id", "name", "ra", "dec", "kind"]
+
+
+def test_arrow_reads_every_column_on_request(widget, tmp_path, monkeypatch):
+    sent, read = arrow_metadata_read(widget, tmp_path, monkeypatch, columns="all")
+    assert sent == ["mag", "kind"]
+    assert read == list(ROWS)
+
+
+def test_multidimensional_cells_are_stringified_one_by_one():
+    table = pytest.importorskip("astropy.table")
+    column = table.MaskedColumn([[1, 2], [3, 4]], mask=[[False, True], [False, False]])
+    assert column_to_str(column).tolist() == ["[1 --]", "[3 4]"]
+    assert column_to_str(np.array([[1, 2], [3, 4]])).tolist() == ["[1 2]", "[3 4]"]
+
+
+def test_mixed_ids_do_not_collide_across_chunks():
+    # Row numbers of the second chunk are those of the integer ids
+    chunks = [["5", "obs_a", ""], ["obs_b", "1", "", "obs_a"]]
+    ids = np.concatenate([row_ids(chunks[0], 0), row_ids(chunks[1], 3)])
+
+    assert ids[0] == 5 and ids[4] == 1
+    assert ids[1] == ids[6]
+    assert len(np.unique(ids[:6])) == 6
+    assert (ids[[1, 2, 3, 5]] < 0).all()
+    np.testing.assert_array_equal(row_ids(np.array([3.0, 3.5]), 0)[:1], [3])
+    assert row_ids(np.array([3.0, 3.5]), 0)[1] < 0
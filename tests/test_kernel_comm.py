@@ -0,0 +1,129 @@
+import logging
+
+import pytest
+
+import pyesasky.kernel_comm as kernel_comm
+from fake_frontend import make_widget
+from pyesasky.log_utils import logger
+
+
+@pytest.fixture
+def encodes(monkeypatch):
+    calls = []
+
+    def counting_encode(content):
+        calls.append(content)
+        return encode(content)
+
+    encode = kernel_comm._encode
+    monkeypatch.setattr(kernel_comm, "_encode", counting_encode)
+    return calls
+
+
+def test_content_is_not_encoded_without_compression(encodes):
+    widget, fake_comm = make_widget(codecs=())
+    widget.kernel_comm.send_message({"event": "ping"}, buffers=[b"\0" * 100])
+    fake_comm.close()
+
+    assert encodes == []
+    record = widget.stats().iloc[-1]
+    assert record["serialize"] is None
+    assert record["payload_bytes"] is None
+
+
+def test_bytes_are_counted_for_callbacks_without_compression(encodes):
+    widget, fake_comm = make_widget(codecs=())
+    ended = []
+    widget.add_stats_callback(on_end=ended.append)
+    widget.kernel_comm.send_message({"event": "ping"}, buffers=[b"\0" * 100])
+    fake_comm.close()
+
+    record = widget.stats().iloc[-1]
+    assert record["serialize"] is not None
+    assert record["payload_bytes"] == len(kernel_comm._encode(encodes[-1])) + 100
+    assert record["sent_bytes"] == record["payload_bytes"]
+    assert ended[-1]["payload_bytes"] == record["payload_bytes"]
+
+
+def test_bytes_are_counted_from_the_compressed_payload(encodes):
+    widget, fake_comm = make_widget()
+    widget.kernel_comm.compression_threshold = 0
+    widget.kernel_comm.send_message({"event": "ping"}, buffers=[b"\0" * 100])
+    fake_comm.close()
+
+    content, wrapper = encodes[-2:]
+    payload = kernel_comm._encode(content)
+    compressed = kernel_comm.COMPRESSORS["deflate"](payload)
+    record = widget.stats().iloc[-1]
+    assert record["payload_bytes"] == len(payload) + 100
+    assert record["sent_bytes"] == (
+        len(kernel_comm._encode(wrapper)) + len(compressed) + 100
+    )
+
+
+class SilentComm:
+    """Comm whose frontend only answers the handshake when told to"""
+
+    kernel = object()
+
+    def __init__(self):
+        self.sent = []
+        self._handler = None
+
+    def on_msg(self, callback):
+        self._handler = callback
+
+    def send(self, data=None, metadata=None, buffers=None):
+        self.sent.append(data["content"].get("event"))
+
+    def answer_handshake(self):
+        self._handler(
+            {"content": {"data": {"content": {"initialised": True, "compression": []}}}}
+        )
+
+
+def test_queued_messages_keep_their_order(monkeypatch):
+    monkeypatch.setattr(kernel_comm, "HANDSHAKE_RETRY_INTERVAL", 60)
+    silent = SilentComm()
+    comm = kernel_comm.KernelComm(silent)
+    comm.send_message({"event": "first"})
+    comm.send_async({"event": "second"})
+    comm.send_message({"event": "third"})
+    assert silent.sent == ["initTest"]
+
+    silent.answer_handshake()
+    comm.send_message({"event": "fourth"})
+    assert silent.sent == ["initTest", "first", "second", "third", "fourth"]
+
+
+def test_unanswered_handshake_raises_and_drops_the_request():
+    silent = SilentComm()
+    comm = kernel_comm.KernelComm(silent)
+    comm.default_timeout = 0.01
+    with pytest.raises(kernel_comm.CommNotInitializedError):
+        comm.send_and_wait({"event": "getCenter"}, timeout=0.01)
+    assert comm._queue == []
+    assert comm.stats.records()[-1]["status"] == "not_established"
+
+    silent.answer_handshake()
+    assert "getCenter" not in silent.sent
+
+
+def test_queue_drops_fire_and_forget_messages_past_its_size(caplog):
+    caplog.set_level(logging.WARNING, logger=logger.name)
+    silent = SilentComm()
+    comm = kernel_comm.KernelComm(silent)
+    comm.queue_max_bytes = 250
+    for event in ("first", "second", "third"):
+        comm.send_message({"event": event}, buffers=[b"\0" * 100])
+    comm.send_async({"event": "request"}, buffers=[b"\0" * 100])
+    assert "Dropped third" in caplog.text
+    assert [record["status"] for record in comm.stats.records()] == [
+        "pending",
+        "pending",
+        "dropped",
+        "pending",
+    ]
+
+    silent.answer_handshake()
+    assert silent.sent[-3:] == ["first", "second", "request"]
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from pyesasky.moc import MOC, intervals_to_cells
+
+# Brute force checks work on sets of cells of this order
+ORDER = 4
+
+
+def random_cells(rng, fraction):
+    n_cells = 12 << (2 * ORDER)
+    return set(np.flatnonzero(rng.random(n_cells) < fraction).tolist())
+
+
+def cells_at(moc, order):
+    """Every cell of order covered by the MOC, expanding coarser cells"""
+    cells = set()
+    for cell_order, order_cells in intervals_to_cells(moc.intervals, order).items():
+        shift = 2 * (order - cell_order)
+        for cell in order_cells.tolist():
+            cells.update(range(cell << shift, (cell + 1) << shift))
+    return cells
+
+
+@pytest.mark.parametrize("text", ["0/0-11", "0/4-7", "0/8-11", "0/0 3"])
+def test_base_cells_round_trip(text):
+    moc = MOC.from_moc(text)
+    assert moc.max_order == 0
+    assert moc.cell_count() > 0
+    assert MOC.from_moc(moc.to_dict()) == moc
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_set_algebra_matches_cell_sets(seed):
+    rng = np.random.default_rng(seed)
+    first, second = random_cells(rng, 0.4), random_cells(rng, 0.6)
+    a = MOC.from_cells(ORDER, sorted(first))
+    b = MOC.from_cells(ORDER, sorted(second))
+
+    assert cells_at(a, ORDER) == first
+    assert cells_at(a | b, ORDER) == first | second
+    assert cells_at(a & b, ORDER) == first & second
+    assert cells_at(a - b, ORDER) == first - second
+    assert cells_at(b - a, ORDER) == second - first
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_degrade_matches_parent_cells(seed):
+    rng = np.random.default_rng(seed)
+    cells = random_cells(rng, 0.05)
+    moc = MOC.from_cells(ORDER, sorted(cells))
+
+    for order in range(ORDER + 1):
+        parents = {cell >> (2 * (ORDER - order)) for cell in cells}
+        degraded = moc.degrade(order)
+        assert cells_at(degraded, order) == parents
+        assert degraded.max_order <= order
+        assert degraded.cell_count(order) <= len(parents)
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from pyesasky.models import FootprintSet
+
+SQUARE = "POLYGON ICRS 10 10 11 10 11 11 10 11"
+
+
+@pytest.mark.parametrize(
+    "centers",
+    [([], []), ("", ""), (None, None)],
+    ids=["empty list", "empty string", "None"],
+)
+def test_missing_centers_become_centroids(centers):
+    footprints = FootprintSet("set", "J2000", "red", 2)
+    footprints.add_footprint("a", SQUARE, 1, *centers, [])
+    footprints.add_footprint("b", SQUARE, 2, *centers, [])
+
+    rows = footprints.to_dict()["overlaySet"]["skyObjectList"]
+    columns = footprints.to_columnar_dict()["overlaySet"]["columns"]
+    for ra, dec in [(row["ra_deg"], row["dec_deg"]) for row in rows]:
+        assert ra == pytest.approx(10.5)
+        assert dec == pytest.approx(10.5, abs=1e-3)
+    np.testing.assert_allclose(columns["ra_deg"], [10.5, 10.5])
+
+
+def test_mixed_missing_and_given_centers():
+    footprints = FootprintSet("set", "J2000", "red", 2)
+    footprints.add_footprint("a", SQUARE, 1, [], [], [])
+    footprints.add_footprint("b", SQUARE, 2, "", "", [])
+    footprints.add_footprint("c", SQUARE, 3, 5, 6, [])
+
+    columns = footprints.to_columnar_dict()["overlaySet"]["columns"]
+    np.testing.assert_allclose(columns["ra_deg"], [10.5, 10.5, 5])
+    np.testing.assert_allclose(columns["dec_deg"], [10.5, 10.5, 6], atol=1e-3)
@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+
+import pyesasky.constants as const
+from pyesasky.models import Catalogue
+
+
+@pytest.fixture
+def sent(widget, monkeypatch):
+    """Events sent by the widget, in order"""
+    events = []
+    send_ignore = widget._send_ignore
+
+    def recording_send_ignore(content, buffers=None):
+        events.append(content["event"])
+        return send_ignore(content, buffers)
+
+    monkeypatch.setattr(widget, "_send_ignore", recording_send_ignore)
+    return events
+
+
+def overlay(widget, ids=(1, 2, 3), updatable=True):
+    catalogue = Catalogue("alerts", "J2000", "red", 5)
+    catalogue.add_sources(np.arange(len(ids)) * 1.0, np.zeros(len(ids)), id=ids)
+    widget.overlay_cat(catalogue, updatable=updatable)
+
+
+def test_appended_ids_are_held(widget, sent):
+    overlay(widget)
+    widget.append_sources("alerts", [10.0, 11.0], [0.0, 1.0], ids=[7, 5])
+    widget.append_sources("alerts", [12.0], [2.0])
+
+    np.testing.assert_array_equal(widget._held_ids("alerts"), [1, 2, 3, 5, 7, 8])
+    assert sent[-2:] == [const.EVENT_APPEND_OVERLAY] * 2
+
+
+def test_append_rejects_held_ids(widget, sent):
+    overlay(widget)
+    with pytest.raises(ValueError, match="2 ids are already in alerts"):
+        widget.append_sources("alerts", [10.0, 11.0], [0.0, 1.0], ids=[2, 3])
+    assert sent == ["overlayCatalogue"]
+
+
+def test_update_rejects_unknown_ids(widget, sent):
+    overlay(widget)
+    widget.update_sources("alerts", [1, 3], mag=[17.2, 18.0])
+    with pytest.raises(ValueError, match="1 ids are not in alerts"):
+        widget.update_sources("alerts", [3, 4], mag=[17.2, 18.0])
+    assert sent[1:] == [const.EVENT_UPDATE_OVERLAY]
+
+
+def test_remove_ignores_ids_not_held(widget, sent):
+    overlay(widget)
+    widget.remove_sources("alerts", [2, 2, 9])
+    widget.remove_sources("alerts", [9])
+
+    np.testing.assert_array_equal(widget._held_ids("alerts"), [1, 3])
+    assert sent[1:] == [const.EVENT_REMOVE_FROM_OVERLAY]
+
+
+def test_clear_and_delete_forget_the_ids(widget):
+    overlay(widget)
+    widget.clear_cat("alerts")
+    assert len(widget._held_ids("alerts")) == 0
+    widget.append_sources("alerts", [10.0], [0.0])
+    np.testing.assert_array_equal(widget._held_ids("alerts"), [0])
+
+    widget.delete_cat("alerts")
+    with pytest.raises(ValueError, match="No overlay alerts"):
+        widget.update_sources("alerts", [0], mag=[1.0])
+
+
+def test_culled_overlays_can_not_be_changed(widget):
+    catalogue = Catalogue("alerts", "J2000", "red", 5)
+    catalogue.add_sources([10.0], [10.0])
+    widget.overlay_cat(catalogue, cull=True)
+    with pytest.raises(ValueError, match="culled to the view"):
+        widget.remove_sources("alerts", [0])
+
+
+def test_only_updatable_overlays_are_held(widget, monkeypatch):
+    messages = []
+    monkeypatch.setattr(
+        widget, "_send_ignore", lambda content, buffers=None: messages.append(content)
+    )
+    overlay(widget, updatable=False)
+    widget.append_sources("alerts", [10.0], [0.0], ids=[2])
+    widget.append_sources("alerts", [11.0], [0.0])
+
+    assert widget._overlay_ids == {}
+    assert "updatable" not in messages[0]
+    # Numbered after the highest id sent
+    assert widget._next_ids["alerts"] == 5
+    with pytest.raises(ValueError, match="overlay it with updatable=True"):
+        widget.update_sources("alerts", [1], mag=[1.0])
+
+    overlay(widget)
+    assert messages[-1]["updatable"] is True
+    np.testing.assert_array_equal(widget._held_ids("alerts"), [1, 2, 3])
+
+
+def test_culled_overlays_can_not_be_updatable(widget):
+    catalogue = Catalogue("alerts", "J2000", "red", 5)
+    catalogue.add_sources([10.0], [10.0])
+    with pytest.raises(ValueError, match="can not be updatable"):
+        widget.overlay_cat(catalogue, cull=True, updatable=True)
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from pyesasky.spatial_index import SkyIndex
+
+
+def random_sky(rng, n_sources):
+    # Sources on the edges the zones and cells have to handle come first
+    ra = np.concatenate(([0.0, 359.9999, 180.0, 0.0], rng.uniform(0, 360, n_sources)))
+    dec = np.concatenate(
+        ([90.0, -90.0, 0.0, -0.0], np.degrees(np.arcsin(rng.uniform(-1, 1, n_sources))))
+    )
+    return ra, dec
+
+
+def brute_force(ra, dec, ra0, dec0, radius):
+    """Indices within radius, and those too close to the edge to tell"""
+    distance = np.degrees(
+        np.arccos(
+            np.clip(
+                np.sin(np.radians(dec)) * np.sin(np.radians(dec0))
+                + np.cos(np.radians(dec))
+                * np.cos(np.radians(dec0))
+                * np.cos(np.radians(ra - ra0)),
+                -1,
+                1,
+            )
+        )
+    )
+    return set(np.flatnonzero(distance <= radius)), set(
+        np.flatnonzero(np.abs(distance - radius) < 1e-6)
+    )
+
+
+@pytest.mark.parametrize("n_sources", [0, 500, 20000])
+def test_query_matches_brute_force(n_sources):
+    rng = np.random.default_rng(n_sources)
+    ra, dec = random_sky(rng, n_sources)
+    index = SkyIndex(ra, dec)
+
+    centers = [(0, 0), (359.5, 10), (0.2, -45), (120, 89.5), (300, -89.9)]
+    centers += list(zip(rng.uniform(0, 360, 20), rng.uniform(-90, 90, 20)))
+    for ra0, dec0 in centers:
+        for radius in (0.01, 0.5, 3, 20, 95, 180):
+            found = index.query(ra0, dec0, radius)
+            expected, edge = brute_force(ra, dec, ra0, dec0, radius)
+            assert np.all(np.diff(found) > 0)
+            assert set(found.tolist()) - edge == expected - edge
+
+
+def test_query_of_empty_index():
+    assert len(SkyIndex([], []).query(10, 10, 5)) == 0
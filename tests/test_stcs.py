@@ -0,0 +1,166 @@
+import numpy as np
+import pytest
+
+from pyesasky.stcs import parse_stcs, simplify_stcs
+
+
+def unit_vector(ra, dec):
+    ra, dec = np.radians(ra), np.radians(dec)
+    return np.array([np.cos(dec) * np.cos(ra), np.cos(dec) * np.sin(ra), np.sin(dec)])
+
+
+def angle(a, b):
+    return np.degrees(np.arctan2(np.linalg.norm(np.cross(a, b)), np.dot(a, b)))
+
+
+def great_circle_distance(point, a, b):
+    """Distance in degrees from point to the great circle through a and b"""
+    normal = np.cross(a, b)
+    return np.degrees(abs(np.arcsin(np.dot(point, normal) / np.linalg.norm(normal))))
+
+
+def wiggly_polygon(rng, ra, dec, radius, n_vertices):
+    """Vertices around a circle with their distance to the center jittered"""
+    angles = np.linspace(0, 2 * np.pi, n_vertices, endpoint=False)
+    distance = radius * (1 + 0.1 * rng.standard_normal(n_vertices))
+    vertex_dec = dec + distance * np.sin(angles)
+    vertex_ra = (ra + distance * np.cos(angles) / np.cos(np.radians(dec))) % 360
+    return list(zip(vertex_ra.tolist(), vertex_dec.tolist()))
+
+
+def polygon_stcs(vertices):
+    return "POLYGON ICRS " + " ".join(f"{ra!r} {dec!r}" for ra, dec in vertices)
+
+
+def polygon_vertices(stcs):
+    kind, frame, *numbers = stcs.split()
+    assert kind == "POLYGON"
+    return [(float(ra), float(dec)) for ra, dec in zip(numbers[0::2], numbers[1::2])]
+
+
+def area_centroid(vertices, subdivisions=16):
+    """First moment of the area of a polygon, summed over a fine grid of
+    small triangles that cover each triangle of a fan from the first vertex"""
+    points = [unit_vector(ra, dec) for ra, dec in vertices]
+    steps = np.arange(subdivisions + 1) / subdivisions
+    moment = np.zeros(3)
+    for b, c in zip(points[1:-1], points[2:]):
+        a = points[0]
+        # Corners of the small triangles, on the plane of a, b, c
+        grid = {
+            (i, j): a + (b - a) * steps[i] + (c - a) * steps[j]
+            for i in range(subdivisions + 1)
+            for j in range(subdivisions + 1 - i)
+        }
+        triangles = [
+            (grid[i, j], grid[i + 1, j], grid[i, j + 1])
+            for i, j in grid
+            if i + j < subdivisions
+        ] + [
+            (grid[i + 1, j], grid[i + 1, j + 1], grid[i, j + 1])
+            for i, j in grid
+            if i + j < subdivisions - 1
+        ]
+        for corners in triangles:
+            p, q, r = (corner / np.linalg.norm(corner) for corner in corners)
+            area = 2 * np.arctan2(
+                np.dot(p, np.cross(q, r)),
+                1 + np.dot(p, q) + np.dot(q, r) + np.dot(r, p),
+            )
+            moment += area * (p + q + r) / np.linalg.norm(p + q + r)
+    return moment
+
+
+def make_polygons(seed, n_polygons=20):
+    rng = np.random.default_rng(seed)
+    return [
+        wiggly_polygon(
+            rng, rng.uniform(0, 360), rng.uniform(-80, 80), rng.uniform(0.5, 5), 200
+        )
+        for _ in range(n_polygons)
+    ]
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_centroids_and_boxes_match_brute_force(seed):
+    polygons = make_polygons(seed)
+    parsed = parse_stcs([polygon_stcs(vertices) for vertices in polygons])
+    # The brute force centroid is slow, it is checked on fewer vertices
+    coarse = [vertices[::10] for vertices in polygons[:5]]
+    coarse_parsed = parse_stcs([polygon_stcs(vertices) for vertices in coarse])
+    for row, vertices in enumerate(coarse):
+        found = unit_vector(coarse_parsed.ra[row], coarse_parsed.dec[row])
+        assert angle(found, area_centroid(vertices)) < 1e-5
+
+    for row, vertices in enumerate(polygons):
+
+        ra_min, ra_max = parsed.ra_min[row], parsed.ra_max[row]
+        for ra, dec in vertices:
+            assert parsed.dec_min[row] <= dec <= parsed.dec_max[row]
+            # Boxes crossing RA 0 wrap, rounding is allowed on both sides
+            assert (ra - ra_min + 1e-9) % 360 <= (ra_max - ra_min) % 360 + 2e-9
+
+
+@pytest.mark.parametrize("tolerance", [0.001, 0.05, 0.5])
+def test_simplified_polygons_stay_within_tolerance(tolerance):
+    polygons = make_polygons(int(tolerance * 1000))
+    simplified = simplify_stcs(
+        [polygon_stcs(vertices) for vertices in polygons], tolerance
+    )
+
+    for vertices, stcs in zip(polygons, simplified):
+        kept = polygon_vertices(stcs)
+        assert len(kept) >= 3
+        # Kept vertices are a subsequence of the original ones
+        positions = [vertices.index(vertex) for vertex in kept]
+        assert positions == sorted(positions)
+
+        points = [unit_vector(ra, dec) for ra, dec in vertices]
+        ring = positions + [positions[0] + len(vertices)]
+        for start, end in zip(ring[:-1], ring[1:]):
+            a, b = points[start], points[end % len(points)]
+            for index in range(start + 1, end):
+                assert great_circle_distance(points[index % len(points)], a, b) <= (
+                    tolerance + 1e-9
+                )
+
+
+def test_small_tolerance_keeps_every_vertex():
+    polygons = make_polygons(0, n_polygons=3)
+    simplified = simplify_stcs([polygon_stcs(vertices) for vertices in polygons], 1e-9)
+    for vertices, stcs in zip(polygons, simplified):
+        assert polygon_vertices(stcs) == vertices
+
+
+def test_tiny_footprints_become_covering_circles():
+    polygons = make_polygons(1, n_polygons=5)
+    simplified = simplify_stcs([polygon_stcs(vertices) for vertices in polygons], 20)
+
+    for vertices, stcs in zip(polygons, simplified):
+        kind, frame, ra, dec, radius = stcs.split()
+        assert kind == "CIRCLE"
+        center = unit_vector(float(ra), float(dec))
+        for vertex in vertices:
+            assert angle(unit_vector(*vertex), center) <= float(radius) + 1e-9
+
+
+def test_centroids_do_not_depend_on_edge_sampling():
+    square = "POLYGON ICRS 0 0 10 0 10 10 0 10"
+    bottom = " ".join(f"{ra:g} 0" for ra in np.linspace(0, 10, 101)[:-1])
+    dense = f"POLYGON ICRS {bottom} 10 0 10 10 0 10"
+    clockwise = "POLYGON ICRS 0 10 10 10 10 0 0 0"
+    parsed = parse_stcs([square, dense, clockwise])
+
+    np.testing.assert_allclose(parsed.ra, 5, atol=1e-9)
+    np.testing.assert_allclose(parsed.dec, parsed.dec[0], atol=1e-9)
+    assert 5 < parsed.dec[0] < 5.1
+
+
+def test_union_parts_are_weighted_by_area():
+    small = "POLYGON 0 -1 2 -1 2 1 0 1"
+    big = "POLYGON 10 -1 14 -1 14 1 10 1"
+    parsed = parse_stcs([f"UNION ({small} {big})", f"UNION ({big} CIRCLE 1 0 0)"])
+    # Twice the area at RA 12 as at RA 1
+    assert parsed.ra[0] == pytest.approx((1 + 2 * 12) / 3, abs=0.05)
+    # A circle without area does not move the centroid
+    assert parsed.ra[1] == pytest.approx(12)
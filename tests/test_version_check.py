@@ -0,0 +1,82 @@
+import contextlib
+import io
+import threading
+
+import pytest
+import requests
+
+import pyesasky.constants as const
+import pyesasky.widgets as widgets_module
+
+
+class Response:
+    status_code = 200
+    text = "<rss><title>pyesasky</title><title>2.1.0</title></rss>"
+
+
+@pytest.fixture
+def pypi(tmp_path, monkeypatch):
+    """Requests made to PyPI, with the version cache in a temporary directory"""
+    monkeypatch.setenv("PYESASKY_CACHE_DIR", str(tmp_path))
+    calls = []
+
+    def get(url, timeout):
+        calls.append(url)
+        return Response()
+
+    monkeypatch.setattr(requests, "get", get)
+    return calls
+
+
+def test_pypi_is_asked_once_per_interval(pypi, monkeypatch):
+    now = 1_000_000.0
+    monkeypatch.setattr(widgets_module.time, "time", lambda: now)
+    assert widgets_module._latest_version(1) == "2.1.0"
+    assert widgets_module._latest_version(1) == "2.1.0"
+    assert len(pypi) == 1
+
+    now += const.VERSION_CHECK_INTERVAL + 1
+    assert widgets_module._latest_version(1) == "2.1.0"
+    assert len(pypi) == 2
+
+
+def test_failures_are_cached_too(pypi, monkeypatch):
+    def unreachable(url, timeout):
+        pypi.append(url)
+        raise requests.ConnectionError()
+
+    monkeypatch.setattr(requests, "get", unreachable)
+    assert widgets_module._latest_version(1) is None
+    assert widgets_module._latest_version(1) is None
+    assert len(pypi) == 1
+
+
+def outputs_after_check(widget):
+    started = []
+    start = threading.Thread.start
+
+    def recording_start(thread):
+        started.append(thread)
+        start(thread)
+
+    with contextlib.redirect_stdout(io.StringIO()), pytest.MonkeyPatch.context() as m:
+        m.setattr(threading.Thread, "start", recording_start)
+        widget._check_server_version()
+    for thread in started:
+        thread.join(5)
+    return started
+
+
+def test_outdated_installs_are_warned(widget, pypi, monkeypatch):
+    monkeypatch.delenv(const.VERSION_CHECK_SKIP_ENV, raising=False)
+    monkeypatch.setattr(widgets_module, "get_version", lambda name: "2.0.0")
+    assert len(outputs_after_check(widget)) == 1
+    assert len(widget._version_output.outputs) == 1
+    assert len(pypi) == 1
+
+
+def test_skip_variable_disables_the_check(widget, pypi, monkeypatch):
+    monkeypatch.setenv(const.VERSION_CHECK_SKIP_ENV, "1")
+    monkeypatch.setattr(widgets_module, "get_version", lambda name: "2.0.0")
+    assert outputs_after_check(widget) == []
+    assert pypi == []